@@ -0,0 +1,129 @@
+"""Benchmark crawling posts with contents parsed on the reactor thread and in a process pool.
+
+Runs the posts spider of --users users at once against synthetic showPosts pages of
+--pages pages each, served by a downloader middleware after --latency seconds instead
+of the forum. Pages a second are printed for each amount of POST_PARSE_PROCESSES.
+Run from the repository root: python3 benchmarks/bench_parse_offload.py"""
+import argparse
+import asyncio
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPOSITORY_PATH = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPOSITORY_PATH))
+sys.path.insert(0, str(REPOSITORY_PATH / 'bitcointalk_scraper'))
+
+from scrapy.http import HtmlResponse  # noqa: E402
+
+from bitcointalk_scraper.bitcointalk.parse_pool import shutdown_parse_pool  # noqa: E402
+
+FIRST_POST = 1700000000
+POSTS_PER_PAGE = 20
+POST_TEXT = ("<b>Bitcoin</b> is a peer-to-peer electronic cash system. " * 8 + "<br/>") * 4
+QUOTE = ('<div class="quoteheader"><a href="https://bitcointalk.org/index.php?topic=1.msg1'
+         '#msg1">Quote from: satoshi on January 01, 2024</a></div>'
+         f'<div class="quote">{POST_TEXT}</div>')
+
+
+def post_table(message_id, timestamp):
+    """Post table of a showPosts page"""
+    posted = datetime.utcfromtimestamp(timestamp)
+    return f"""<table><tr><td>{message_id}</td>
+<td><a href="https://bitcointalk.org/index.php?topic=1.msg{message_id}#msg{message_id}">Re: topic</a></td>
+<td>on: {posted.strftime("%B %d, %Y, %I:%M:%S %p")}</td></tr>
+<tr><td colspan="3"><div class="post">{QUOTE}{POST_TEXT}</div></td></tr></table>"""
+
+
+class FakeForumMiddleware:
+    """Downloader middleware answering showPosts requests with synthetic pages of
+    BENCH_PAGES pages after BENCH_LATENCY seconds"""
+    def __init__(self, pages, latency):
+        self.pages = pages
+        self.latency = latency
+
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings.getint('BENCH_PAGES'),
+                   crawler.settings.getfloat('BENCH_LATENCY'))
+
+
+    async def process_request(self, request, spider):
+        await asyncio.sleep(self.latency)
+        start = int(match.group(1)) if (match := re.search(r';start=(\d+)', request.url)) else 0
+        tables = ''
+        if start < self.pages * POSTS_PER_PAGE:
+            # Posts are an hour apart, newest first
+            newest = FIRST_POST + self.pages * POSTS_PER_PAGE * 3600
+            tables = ''.join(post_table(index, newest - index * 3600)
+                             for index in range(start, start + POSTS_PER_PAGE))
+        body = f'<html><body><div id="bodyarea">{tables}</div></body></html>'
+        return HtmlResponse(url=request.url, body=body.encode(), encoding='utf-8',
+                            request=request)
+
+
+async def crawl_posts(settings, users):
+    """Run posts spiders of users at once. Returns amount of pages and seconds taken."""
+    from scrapy.crawler import CrawlerRunner
+    from scrapy.utils.defer import deferred_to_future
+    runner = CrawlerRunner(settings)
+    crawlers = [runner.create_crawler('posts') for _ in range(users)]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        deferred_to_future(runner.crawl(crawler, uid=str(uid), start_timestamp=str(FIRST_POST)))
+        for uid, crawler in enumerate(crawlers, 1)))
+    elapsed = time.perf_counter() - start
+    return sum(crawler.stats.get_value('response_received_count', 0)
+               for crawler in crawlers), elapsed
+
+
+async def run(ns):
+    from scrapy.settings import Settings
+    from scrapy.utils.reactor import install_reactor
+    base = Settings()
+    base.setmodule('bitcointalk_scraper.settings', priority='project')
+    install_reactor(base['TWISTED_REACTOR'])
+    from twisted.internet import reactor
+    reactor.fireSystemEvent('startup')
+    print(f"{ns.users} users, {ns.pages} pages of {POSTS_PER_PAGE} posts each, "
+          f"{ns.latency * 1000:.0f} ms latency")
+    for processes in ns.processes:
+        settings = base.copy()
+        overrides = {
+            'POST_PARSE_PROCESSES': processes,
+            'BENCH_PAGES': ns.pages,
+            'BENCH_LATENCY': ns.latency,
+            'DOWNLOADER_MIDDLEWARES': {'bench_parse_offload.FakeForumMiddleware': 1},
+            'ROBOTSTXT_OBEY': False,
+            'AUTOTHROTTLE_ENABLED': False,
+            'CONCURRENT_REQUESTS': ns.users * 2,
+            'LOG_LEVEL': 'ERROR',
+        }
+        # Spider settings of the posts spider would enable autothrottle
+        settings.setdict(overrides, priority='cmdline')
+        if processes:
+            # Pool is started before timing, as it is started once per process
+            await crawl_posts(settings, 1)
+        pages, elapsed = await crawl_posts(settings, ns.users)
+        print(f"{processes} parse processes: {pages} pages in {elapsed:.2f} s, "
+              f"{pages / elapsed:.1f} pages/s")
+        shutdown_parse_pool()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--users', type=int, default=4)
+    arg_parser.add_argument('--pages', type=int, default=25)
+    arg_parser.add_argument('--latency', type=float, default=0.05,
+                            help='seconds each page takes to download')
+    arg_parser.add_argument('--processes', type=int, nargs='+', default=[0, 1, 2, 4],
+                            help='amounts of parse processes to compare')
+    ns = arg_parser.parse_args()
+    asyncio.run(run(ns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark loading and saving a round with many participants.
+
+Compares the standard json module with records.dumps/loads (orjson if installed)
+and memory of participants kept as dicts with participants kept as records.
+Run from the repository root: python3 benchmarks/bench_records.py"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import records  # noqa: E402
+from records import round_participants_from_dict, round_participants_to_dict  # noqa: E402
+
+
+def synthetic_round(participants):
+    """Round dict of an ended round with given amount of participants"""
+    return {
+        'campaign_name': 'benchmark',
+        'round_number': 1,
+        'ended': True,
+        'round_start': 1700000000,
+        'round_end': 1700604800,
+        'participants': {
+            str(uid): {
+                'uid': uid, 'name': f"user{uid}", 'rank': 'Full Member',
+                'payment_address': f"bc1q{uid:038d}", 'start_time': 1700000000,
+                'known_start_info': True, 'start_post_count': 500 + uid % 1000,
+                'start_activity': 300, 'start_merit': 50, 'end_post_count': 530 + uid % 1000,
+                'end_activity': 314, 'end_merit': 53, 'post_count_difference': 30,
+                'activity_gained': 14, 'merit_gained': 3, 'posts_made': 30,
+                'accepted_posts': 28, 'rejected_posts': 2,
+                'rejection_reasons': {'min_length': 2},
+            }
+            for uid in range(1, participants + 1)
+        },
+    }
+
+
+def best_time(function, repeat):
+    """Best wall clock time of calling function repeat times"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def allocated_size(function):
+    """Memory still allocated by the result of function"""
+    tracemalloc.start()
+    result = function()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--participants', type=int, default=10000)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    ns = arg_parser.parse_args()
+
+    round_dict = synthetic_round(ns.participants)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'round.json'
+        path.write_text(json.dumps(round_dict))
+        print(f"{ns.participants} participants, round.json {path.stat().st_size} bytes, "
+              f"fast JSON: {'orjson' if records.orjson else 'not installed'}")
+
+        def save(dumps):
+            return lambda: path.write_text(dumps(round_dict))
+
+        def load(loads):
+            return lambda: loads(path.read_text())
+
+        results = [
+            ('save json', best_time(save(json.dumps), ns.repeat)),
+            ('save records.dumps', best_time(save(records.dumps), ns.repeat)),
+            ('load json', best_time(load(json.loads), ns.repeat)),
+            ('load records.loads', best_time(load(records.loads), ns.repeat)),
+            ('dicts to records', best_time(
+                lambda: round_participants_from_dict(round_dict['participants']), ns.repeat)),
+            ('records to dicts', best_time(
+                lambda: round_participants_to_dict(
+                    round_participants_from_dict(round_dict['participants'])), ns.repeat)),
+        ]
+        for name, seconds in results:
+            print(f"{name:<24}{seconds * 1000:10.1f} ms")
+
+        text = path.read_text()
+        dict_size = allocated_size(lambda: json.loads(text)['participants'])
+        record_size = allocated_size(
+            lambda: round_participants_from_dict(json.loads(text)['participants']))
+        print(f"{'participants as dicts':<24}{dict_size / 2**20:10.1f} MiB")
+        print(f"{'participants as records':<24}{record_size / 2**20:10.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
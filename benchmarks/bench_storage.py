@@ -0,0 +1,315 @@
+"""Benchmark command line operations of core.py on a large synthetic campaign.
+
+Generates a data folder with a campaign of --participants participants and --rounds
+ended rounds of --round_participants participants each, the last round still running.
+Each operation is then called --repeat times the way main.py calls it, in a process of
+its own so that its peak RSS can be measured. Crawling is replaced with synthetic
+profiles, so only reading and writing the data folder is measured.
+
+Results are appended to --results with the commit they were measured at and compared
+with the previous results of a campaign of the same size.
+Run from the repository root: python3 benchmarks/bench_storage.py"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPOSITORY_PATH = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPOSITORY_PATH))
+
+import records  # noqa: E402
+
+CAMPAIGN_NAME = 'benchmark'
+ROUND_SECONDS = 604800
+FIRST_ROUND_START = 1500000000
+DEFAULT_RESULTS_FILE = Path(__file__).resolve().parent / 'storage_results.jl'
+PERCENTILES = (50, 90, 99)
+
+
+def synthetic_participant(uid, round_start, ended):
+    """Round participant dict of a round starting at round_start"""
+    participant = {
+        'uid': uid, 'name': f"user{uid}", 'rank': 'Full Member',
+        'payment_address': f"bc1q{uid:038d}", 'start_time': round_start,
+        'known_start_info': True, 'start_post_count': 500 + uid % 1000,
+        'start_activity': 300, 'start_merit': 50,
+    }
+    if ended:
+        participant.update({
+            'end_post_count': 530 + uid % 1000, 'end_activity': 314, 'end_merit': 53,
+            'post_count_difference': 30, 'activity_gained': 14, 'merit_gained': 3,
+            'posts_made': 30, 'accepted_posts': 28, 'rejected_posts': 2,
+            'rejection_reasons': {'min_length': 2},
+        })
+    return participant
+
+
+def round_uids(round_number, participants, round_participants):
+    """UIDs of round participants. Rounds go through the campaign participants in turn."""
+    first = (round_number - 1) * round_participants
+    return sorted({(first + index) % participants + 1
+                   for index in range(min(round_participants, participants))})
+
+
+def generate_campaign(data_folder, participants, rounds, round_participants):
+    """Write a synthetic campaign to data_folder. Rounds are written one at a time
+    so that generating does not take the memory of the whole campaign."""
+    campaign_path = data_folder / CAMPAIGN_NAME
+    campaign_path.mkdir(parents=True)
+    metadata = {
+        'campaign_name': CAMPAIGN_NAME,
+        'current_round': rounds,
+        'participants': {
+            str(uid): {'name': f"user{uid}", 'payment_address': f"bc1q{uid:038d}"}
+            for uid in range(1, participants + 1)
+        },
+    }
+    (campaign_path / 'metadata.json').write_text(records.dumps(metadata))
+    for round_number in range(1, rounds + 1):
+        round_start = FIRST_ROUND_START + (round_number - 1) * ROUND_SECONDS
+        ended = round_number < rounds
+        round_dict = {
+            'campaign_name': CAMPAIGN_NAME,
+            'round_number': round_number,
+            'ended': ended,
+            'round_start': round_start,
+            'round_start_utc': datetime.fromtimestamp(round_start, timezone.utc).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"),
+            'participants': {
+                str(uid): synthetic_participant(uid, round_start, ended)
+                for uid in round_uids(round_number, participants, round_participants)
+            },
+        }
+        if ended:
+            round_dict['round_end'] = round_start + ROUND_SECONDS
+            round_dict['round_end_utc'] = datetime.fromtimestamp(
+                round_start + ROUND_SECONDS, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        (campaign_path / str(round_number)).mkdir()
+        (campaign_path / str(round_number) / 'round.json').write_text(records.dumps(round_dict))
+    return campaign_path
+
+
+def folder_size(path):
+    """Size of files in a folder in bytes"""
+    return sum(file.stat().st_size for file in path.rglob('*') if file.is_file())
+
+
+def install_offline_spiders():
+    """Replace crawling of CampaignManager with synthetic profiles"""
+    import manager
+    from bitcointalk_scraper.bitcointalk.forum_health import FORUM_OK
+
+    class OfflineSpiderRunner(manager.SpiderRunner):
+        """Spider runner answering profile crawls without the network"""
+        async def crawl(self, spider_name, on_item, kwargs):
+            if spider_name != 'profile':
+                raise manager.ScrapingError(f"{spider_name} is not benchmarked offline")
+            uid = int(kwargs['uid'])
+            return [{'uid': uid, 'name': f"user{uid}", 'post_count': 500 + uid % 1000,
+                     'activity': 300, 'merit': 50, 'rank': 'Full Member'}], FORUM_OK
+
+
+        async def probe(self):
+            return FORUM_OK
+
+    manager.SpiderRunner = OfflineSpiderRunner
+
+
+def operations(ns, data_folder):
+    """Functions of benchmarked operations taking the index of the call. Operations
+    adding participants use UIDs after the synthetic ones, which are removed again
+    by remove_participant."""
+    import core
+    campaign_path = data_folder / CAMPAIGN_NAME
+    last_ended = max(ns.rounds - 1, 1)
+
+    def args(**kwargs):
+        return argparse.Namespace(data_folder=data_folder, campaign_name=CAMPAIGN_NAME,
+                                  lock_timeout=60, max_pause=0, **kwargs)
+
+    def new_uid(index):
+        return ns.participants + 1 + index
+
+    def existing_uid(index):
+        return round_uids(last_ended, ns.participants, ns.round_participants)[
+            index % min(ns.round_participants, ns.participants)]
+
+    return {
+        'read_metadata': lambda index: core.read_metadata(data_folder, CAMPAIGN_NAME),
+        'read_round_data': lambda index: core.read_round_data(campaign_path, last_ended),
+        'add_payment_address': lambda index: core.add_payment_address(
+            args(uid=existing_uid(index), payment_address=f"bc1qnew{index}")),
+        'add_round_payment_address': lambda index: core.add_round_payment_address(
+            args(round_number=last_ended, uid=existing_uid(index),
+                 payment_address=f"bc1qnew{index}")),
+        'add_participant': lambda index: core.add_participant(
+            args(uid=new_uid(index), payment_address=None)),
+        'add_round_participant': lambda index: core.add_round_participant(
+            args(round_number=ns.rounds, uid=new_uid(index), payment_address=None)),
+        'remove_participant': lambda index: core.remove_participant(args(uid=new_uid(index))),
+        'round_to_csv': lambda index: core.round_to_csv(args(round_number=last_ended)),
+    }
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes or None if not known"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_operation(ns, data_folder, name, connection):
+    """Call an operation repeat times and send back its latencies and peak RSS"""
+    os.chdir(REPOSITORY_PATH)
+    install_offline_spiders()
+    operation = operations(ns, data_folder)[name]
+    baseline_rss = peak_rss()
+    latencies = []
+    for index in range(ns.repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            operation(index)
+            latencies.append(time.perf_counter() - start)
+    connection.send((latencies, baseline_rss, peak_rss()))
+    connection.close()
+
+
+def measure(ns, data_folder, name):
+    """Latencies, RSS before the first call and peak RSS of an operation
+    measured in a new process"""
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_operation, args=(ns, data_folder, name, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None:
+        raise RuntimeError(f"Benchmarking {name} failed with exit code {process.exitcode}")
+    return result
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of values"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(latencies, baseline_rss, rss):
+    """Result of an operation as saved to the results file"""
+    summary = {f"p{percent}_ms": round(percentile(latencies, percent) * 1000, 3)
+               for percent in PERCENTILES}
+    summary['max_ms'] = round(max(latencies) * 1000, 3)
+    summary['baseline_rss'] = baseline_rss
+    summary['peak_rss'] = rss
+    return summary
+
+
+def git_commit():
+    """Commit of the repository, marked dirty if there are changes, or None"""
+    def git(*git_args):
+        return subprocess.run(['git', *git_args], cwd=REPOSITORY_PATH, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    try:
+        commit = git('rev-parse', '--short', 'HEAD')
+        return commit + ('-dirty' if git('status', '--porcelain', '--untracked-files=no')
+                         else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_result(results_path, size):
+    """Latest saved result of a campaign of the same size or None"""
+    if not results_path.is_file():
+        return None
+    previous = None
+    with results_path.open() as f:
+        for line in f:
+            if line.strip() and (result := json.loads(line))['size'] == size:
+                previous = result
+    return previous
+
+
+def mib(size):
+    return '' if size is None else f"{size / 2**20:.1f}"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--participants', type=int, default=10000)
+    arg_parser.add_argument('--rounds', type=int, default=500)
+    arg_parser.add_argument('--round_participants', type=int, default=1000)
+    arg_parser.add_argument('--repeat', type=int, default=20)
+    arg_parser.add_argument('--operations', nargs='+', help='operations to benchmark, '
+                            'by default all of them')
+    arg_parser.add_argument('--data_folder', type=Path, help='folder where the campaign is '
+                            'generated, by default a temporary folder')
+    arg_parser.add_argument('--results', type=Path, default=DEFAULT_RESULTS_FILE)
+    ns = arg_parser.parse_args()
+
+    known = list(operations(ns, Path()).keys())
+    if unknown := set(ns.operations or ()) - set(known):
+        arg_parser.error(f"unknown operations {', '.join(sorted(unknown))}, "
+                         f"choose from {', '.join(known)}")
+    names = ns.operations or known
+    size = {'participants': ns.participants, 'rounds': ns.rounds,
+            'round_participants': ns.round_participants}
+    with tempfile.TemporaryDirectory(dir=ns.data_folder) as tmp:
+        data_folder = Path(tmp)
+        start = time.perf_counter()
+        campaign_path = generate_campaign(data_folder, ns.participants, ns.rounds,
+                                          ns.round_participants)
+        print(f"Generated {ns.rounds} rounds of {ns.round_participants} out of "
+              f"{ns.participants} participants in {time.perf_counter() - start:.1f} s, "
+              f"{folder_size(campaign_path) / 2**20:.1f} MiB, "
+              f"fast JSON: {'orjson' if records.orjson else 'not installed'}")
+        results = {name: summarize(*measure(ns, data_folder, name)) for name in names}
+
+    previous = previous_result(ns.results, size)
+    print(f"{'operation':<28}" + ''.join(f"{f'p{percent} ms':>10}" for percent in PERCENTILES) +
+          f"{'max ms':>10}{'RSS MiB':>10}{'peak MiB':>10}" +
+          (f"  p50 vs {previous['commit']}" if previous else ''))
+    for name, result in results.items():
+        line = (f"{name:<28}" +
+                ''.join(f"{result[f'p{percent}_ms']:>10.1f}" for percent in PERCENTILES) +
+                f"{result['max_ms']:>10.1f}{mib(result['baseline_rss']):>10}"
+                f"{mib(result['peak_rss']):>10}")
+        if previous and (earlier := previous['operations'].get(name)) and earlier['p50_ms']:
+            line += f"  {result['p50_ms'] / earlier['p50_ms']:>8.2f}x"
+        print(line)
+
+    with ns.results.open('a') as f:
+        f.write(json.dumps({
+            'commit': git_commit(),
+            'measured_at': datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            'python': platform.python_version(),
+            'fast_json': bool(records.orjson),
+            'size': size,
+            'repeat': ns.repeat,
+            'operations': results,
+        }) + '\n')
+    print(f"Results appended to {ns.results}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Classifying responses of the forum by whether it can be crawled at the moment"""
+
+FORUM_OK = 'ok'
+# Anti-bot challenge, e.g. Cloudflare's "Just a moment..." page
+FORUM_CHALLENGE = 'challenge'
+FORUM_RATE_LIMITED = 'rate_limited'
+FORUM_MAINTENANCE = 'maintenance'
+FORUM_DOWN = 'down'
+# No response at all, e.g. connection refused or timed out
+FORUM_UNREACHABLE = 'unreachable'
+
+FORUM_STATE_DESCRIPTIONS = {
+    FORUM_OK: "working",
+    FORUM_CHALLENGE: "serving an anti-bot challenge page",
+    FORUM_RATE_LIMITED: "limiting requests",
+    FORUM_MAINTENANCE: "in maintenance",
+    FORUM_DOWN: "down",
+    FORUM_UNREACHABLE: "unreachable",
+}
+
+CHALLENGE_MARKERS = ('cf-chl', 'challenge-platform', 'just a moment...',
+                     'attention required! | cloudflare', 'you have been blocked',
+                     'ddos protection by')
+MAINTENANCE_MARKERS = ('maintenance mode', 'forum is in maintenance')
+RATE_LIMIT_MARKERS = ('you are making requests too quickly',)
+# Every page of the forum has the body area, pages served instead of the forum do not
+FORUM_PAGE_MARKER = 'id="bodyarea"'
+# Markers are looked for in the beginning of the page only
+MARKER_SEARCH_LENGTH = 20000
+
+
+def classify_response(status, text):
+    """State of the forum judging by status and text of a response. Markers are only
+    looked for in pages without the body area of the forum, so that posts mentioning
+    them do not count."""
+    text = text or ''
+    if status < 500 and status != 429 and FORUM_PAGE_MARKER in text:
+        return FORUM_OK
+    lowered = text[:MARKER_SEARCH_LENGTH].lower()
+    if any(marker in lowered for marker in CHALLENGE_MARKERS):
+        return FORUM_CHALLENGE
+    if status == 429 or any(marker in lowered for marker in RATE_LIMIT_MARKERS):
+        return FORUM_RATE_LIMITED
+    if any(marker in lowered for marker in MAINTENANCE_MARKERS):
+        return FORUM_MAINTENANCE
+    if status >= 500:
+        return FORUM_DOWN
+    return FORUM_OK
@@ -72,6 +72,16 @@ class PostContentParser:
                 'type': 'image',
                 'src': node.get('src')
             }
+        # Quote divs are processed together with their headers
+        if is_quotediv(node):
+            return None
+        # Formatting elements e.g. bold text or font size
+        if node.contents:
+            element = {
+                'type': 'element',
+                'tag': node.name
+            }
+            return self.process_children(node, element)
         return None
 
 
@@ -0,0 +1,74 @@
+"""Store of items scraped by the spiders of a crawler worker.
+
+Items which passed validation of the item pipelines are written in batches into a
+SQLite database instead of a JSON Lines feed for each spider, so the process reading
+results of the worker gets them as they were validated. Each finished crawl is
+recorded too, with the amount of items dropped as invalid."""
+import json
+import sqlite3
+
+ITEM_STORE_FILE = 'items.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    spider TEXT NOT NULL,
+    uid INTEGER,
+    item TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_spider_uid ON items (spider, uid);
+CREATE TABLE IF NOT EXISTS crawls (
+    spider TEXT NOT NULL,
+    uid INTEGER,
+    items INTEGER NOT NULL,
+    dropped INTEGER NOT NULL,
+    PRIMARY KEY (spider, uid)
+);
+"""
+
+
+class ItemStore:
+    """Scraped items stored in a SQLite database"""
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=60)
+        # Store only lives as long as the crawl reading it, so it is not synced to disk
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=OFF")
+        self.connection.executescript(SCHEMA)
+
+
+    def close(self):
+        """Close database connection"""
+        self.connection.close()
+
+
+    def add_items(self, spider_name, uid, items):
+        """Save items scraped by a spider in one transaction"""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO items (spider, uid, item) VALUES (?, ?, ?)",
+                [(spider_name, uid, json.dumps(item)) for item in items])
+
+
+    def finish_crawl(self, spider_name, uid, items, dropped):
+        """Record that a crawl finished having scraped items and dropped invalid ones"""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO crawls (spider, uid, items, dropped) VALUES (?, ?, ?, ?)",
+                (spider_name, uid, items, dropped))
+
+
+    def crawl(self, spider_name, uid):
+        """(items, dropped) of a finished crawl or None if it did not finish"""
+        return self.connection.execute(
+            "SELECT items, dropped FROM crawls WHERE spider = ? AND uid = ?",
+            (spider_name, uid)).fetchone()
+
+
+    def items(self, spider_name, uid):
+        """Lazily read items scraped by a spider in the order they were scraped"""
+        for item, in self.connection.execute(
+                "SELECT item FROM items WHERE spider = ? AND uid = ? ORDER BY id",
+                (spider_name, uid)):
+            yield json.loads(item)
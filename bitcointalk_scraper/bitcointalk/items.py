@@ -19,4 +19,35 @@ class PostItem(scrapy.Item):
     content = scrapy.Field()
     datetime_utc = scrapy.Field()
     link = scrapy.Field()
-    
\ No newline at end of file
+    message_id = scrapy.Field()
+    
+class RecentPostItem(scrapy.Item):
+    uid = scrapy.Field()
+    name = scrapy.Field()
+    content = scrapy.Field()
+    datetime_utc = scrapy.Field()
+    link = scrapy.Field()
+    message_id = scrapy.Field()
+
+class PostCountItem(scrapy.Item):
+    uid = scrapy.Field()
+    posts_made = scrapy.Field()
+    pages_requested = scrapy.Field()
+
+class VerifiedPageItem(scrapy.Item):
+    uid = scrapy.Field()
+    page = scrapy.Field()
+    page_hash = scrapy.Field()
+    unchanged = scrapy.Field()
+    posts = scrapy.Field()
+    last = scrapy.Field()
+
+class TopicPostItem(scrapy.Item):
+    uid = scrapy.Field()
+    name = scrapy.Field()
+    content = scrapy.Field()
+    datetime_utc = scrapy.Field()
+    link = scrapy.Field()
+    message_id = scrapy.Field()
+    page_start = scrapy.Field()
+    position = scrapy.Field()
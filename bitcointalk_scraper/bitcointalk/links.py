@@ -0,0 +1,11 @@
+"""Links of bitcointalk posts"""
+import re
+
+MESSAGE_ID_PATTERN = re.compile(r"msg=?(\d+)")
+
+
+def message_id_from_link(link):
+    """Get message ID from link of a post e.g. index.php?topic=5.msg123#msg123"""
+    if link and (match := MESSAGE_ID_PATTERN.search(link)):
+        return int(match.group(1))
+    return None
@@ -3,12 +3,22 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import asyncio
+
 from scrapy import signals
-from scrapy.exceptions import CloseSpider
+from scrapy.core.downloader.handlers.http11 import TunnelError
+from scrapy.exceptions import CloseSpider, NotConfigured
+from twisted.internet.error import ConnectError
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from .proxy_pool import shared_pool, ProxyPoolError
+from .forum_health import classify_response, FORUM_OK, FORUM_UNREACHABLE
+
+# Exceptions of connecting to a proxy, which are failures of the proxy and not the forum
+PROXY_CONNECTION_ERRORS = (ConnectError, TunnelError)
+
 
 class BitcointalkSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -42,6 +52,12 @@ class BitcointalkSpiderMiddleware:
         for i in result:
             yield i
 
+    async def process_spider_output_async(self, response, result, spider):
+        # Same as process_spider_output() but for spiders with
+        # asynchronous callbacks.
+        async for i in result:
+            yield i
+
     def process_spider_exception(self, response, exception, spider):
         # Called when a spider or process_spider_input() method
         # (from other spider middleware) raises an exception.
@@ -63,47 +79,85 @@ class BitcointalkSpiderMiddleware:
 
 
 class BitcointalkDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    """Send requests through the proxies of PROXY_POOL setting. Disabled if the
+    setting is empty. See proxy_pool for how proxies are chosen."""
+
+    def __init__(self, pool, failure_codes):
+        self.pool = pool
+        self.failure_codes = set(failure_codes)
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
+        settings = crawler.settings
+        proxies = settings.getlist('PROXY_POOL')
+        if not proxies:
+            raise NotConfigured("PROXY_POOL is empty")
+        try:
+            pool = shared_pool(proxies, settings.getfloat('PROXY_REQUESTS_PER_MINUTE'),
+                               settings.getint('PROXY_MAX_FAILURES'),
+                               settings.getfloat('PROXY_COOLDOWN'))
+        except ProxyPoolError as error:
+            raise NotConfigured(str(error)) from error
+        s = cls(pool, settings.getlist('PROXY_FAILURE_CODES'))
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
-    def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+    async def process_request(self, request, spider):
+        # Retried requests come here again and may get another proxy
+        proxy, delay = self.pool.reserve(getattr(spider, 'uid', None))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # HttpProxyMiddleware removes credentials from proxy meta, so the pool's URL is kept too
+        request.meta['proxy'] = request.meta['pool_proxy'] = proxy
+        # Each proxy gets its own download slot so AutoThrottle adjusts delays per proxy
+        request.meta['download_slot'] = proxy
         return None
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        if proxy := request.meta.get('pool_proxy'):
+            if response.status in self.failure_codes:
+                self.record_failure(proxy, f"status {response.status}", spider)
+            else:
+                self.pool.record_success(proxy)
         return response
 
     def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+        if proxy := request.meta.get('pool_proxy'):
+            self.record_failure(proxy, repr(exception), spider)
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    def record_failure(self, proxy, reason, spider):
+        if self.pool.record_failure(proxy):
+            spider.logger.warning("Proxy %s ejected from the pool after %s", proxy, reason)
 
     def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+        spider.logger.info("Spider opened: %s, proxies %s", spider.name, self.pool.healthy())
+
+
+class ForumHealthMiddleware:
+    """Keep the state of the forum judged by the latest response in the forum/state
+    stat, so that whoever runs the spider can tell a crawl cut short by a challenge
+    page or an outage from one which found nothing. Responses through proxies of
+    PROXY_POOL are judged the same way. Only failing to connect through a proxy is
+    left to the pool, which moves requests to other proxies."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def process_response(self, request, response, spider):
+        if request.url.endswith('/robots.txt'):
+            return response
+        text = response.text if hasattr(response, 'text') else ''
+        state = classify_response(response.status, text)
+        self.stats.set_value('forum/state', state, spider=spider)
+        if state != FORUM_OK:
+            self.stats.inc_value(f"forum/responses/{state}", spider=spider)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if request.meta.get('pool_proxy') and isinstance(exception, PROXY_CONNECTION_ERRORS):
+            return
+        self.stats.set_value('forum/state', FORUM_UNREACHABLE, spider=spider)
@@ -0,0 +1,52 @@
+"""Galloping/binary search over randomly addressable pages of posts"""
+
+
+class PageBoundarySearch:
+    """Search for the first page of posts (newest first) which reaches back past
+    a point in time. Pages before it only contain posts newer than that point.
+
+    A page is recorded with the amount of posts on it and how many of them are newer
+    than the point in time. The boundary page is the first page which is not full of
+    newer posts. The amount of newer posts is then page_size * page + offset, where
+    offset is the amount of newer posts on the boundary page.
+    """
+    def __init__(self, page_size=20):
+        self.page_size = page_size
+        # Highest page known to only have newer posts
+        self.low = -1
+        # Lowest page known to be the boundary or past it
+        self.high = None
+        self.offsets = {}
+
+
+    def record(self, page, newer, total):
+        """Record result of a fetched page"""
+        if page in self.offsets:
+            return
+        self.offsets[page] = newer
+        if total == self.page_size and newer == total:
+            self.low = max(self.low, page)
+        elif self.high is None or page < self.high:
+            self.high = page
+
+
+    def done(self):
+        """Check if boundary page has been found"""
+        return self.high is not None and self.high - self.low == 1
+
+
+    def next_page(self):
+        """Page that should be fetched next or None if search is done"""
+        if self.done():
+            return None
+        if self.high is None:
+            # Gallop: 0, 1, 2, 4, 8...
+            return self.low + 1 if self.low < 1 else self.low * 2
+        return (self.low + self.high) // 2
+
+
+    def result(self):
+        """Amount of posts newer than the point in time"""
+        if not self.done():
+            raise ValueError("Search has not found the boundary page yet")
+        return self.page_size * self.high + self.offsets.get(self.high, 0)
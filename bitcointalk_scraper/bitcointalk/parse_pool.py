@@ -0,0 +1,58 @@
+"""Parsing post contents in a process pool instead of on the reactor thread.
+
+BeautifulSoup parsing of post contents takes most of the CPU time of crawling posts.
+Done on the reactor thread it stalls downloads of every spider of the process, so
+spiders can hand it to a pool of POST_PARSE_PROCESSES processes shared by all spiders
+of the process and carry on downloading while pages are parsed. The pool is started
+on first use and shut down when the process exits."""
+import asyncio
+import atexit
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .html_parser import PostContentParser
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+def parse_post_contents(post_divs):
+    """Parse contents of HTML strings of post divs"""
+    parser = PostContentParser()
+    return [parser.parse_post_content(post_div) for post_div in post_divs]
+
+
+def parse_pool(processes):
+    """Process pool of this process. Its size is given by the first caller."""
+    global _pool
+    if _pool is None:
+        # Processes are spawned as forking a process running the reactor's threads is unsafe
+        _pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def shutdown_parse_pool():
+    """Stop processes of the pool. A new pool is started if it is needed again."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+atexit.register(shutdown_parse_pool)
+
+
+async def parse_post_contents_async(post_divs, processes):
+    """Parse contents of post divs in the pool without blocking the event loop.
+    With 0 processes or if the pool has broken they are parsed right away."""
+    if processes > 0 and post_divs:
+        try:
+            return await asyncio.wrap_future(
+                parse_pool(processes).submit(parse_post_contents, post_divs))
+        except BrokenProcessPool as error:
+            logger.warning("Post parsing pool broke, parsing on the reactor thread: %s", error)
+            shutdown_parse_pool()
+    return parse_post_contents(post_divs)
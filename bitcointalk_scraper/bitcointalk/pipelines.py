@@ -1,13 +1,115 @@
-# Define your item pipelines here
-#
-# Don't forget to add your pipeline to the ITEM_PIPELINES setting
-# See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
+"""Item pipelines validating scraped items and writing them into an ItemStore.
 
+BitcointalkPipeline converts numeric fields to int, checks that posts have a link and
+a UTC datetime and fills in message ID of posts from the link. Invalid items are
+dropped, which consumers of the crawl see in the item_dropped_count stat.
+ItemStorePipeline is enabled by setting ITEM_STORE to the path of an ItemStore."""
+from datetime import datetime
 
-# useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem, NotConfigured
+
+from .item_store import ItemStore
+from .links import message_id_from_link
+
+INT_FIELDS = ('uid', 'post_count', 'activity', 'merit', 'posts_made', 'pages_requested',
+              'page', 'page_start', 'position')
+# Fields which items declaring them must have
+REQUIRED_FIELDS = ('uid', 'posts_made', 'datetime_utc', 'link')
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def to_int(value):
+    """Convert a scraped number, which may have thousands separators, to int"""
+    if isinstance(value, bool):
+        raise ValueError(f"{value!r} is not a number")
+    if isinstance(value, str):
+        value = value.strip().replace(',', '')
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"{value!r} is not a whole number")
+    return int(value)
+
+
+def normalize_item(adapter):
+    """Validate fields of an item and convert them in place. Raises ValueError."""
+    fields = adapter.field_names()
+    for field in REQUIRED_FIELDS:
+        if field in fields and adapter.get(field) is None:
+            raise ValueError(f"{field} is missing")
+    for field in INT_FIELDS:
+        if adapter.get(field) is not None:
+            try:
+                adapter[field] = to_int(adapter[field])
+            except (TypeError, ValueError) as error:
+                raise ValueError(f"{field} {adapter[field]!r} is not a number") from error
+    if 'datetime_utc' in fields:
+        datetime.strptime(adapter['datetime_utc'], DATETIME_FORMAT)
+    if 'link' in fields:
+        if not isinstance(adapter['link'], str):
+            raise ValueError(f"link {adapter['link']!r} is not a string")
+        if 'message_id' in fields:
+            adapter['message_id'] = message_id_from_link(adapter['link'])
 
 
 class BitcointalkPipeline:
+    """Validates and normalizes items as they are scraped"""
+    def process_item(self, item, spider):
+        try:
+            normalize_item(ItemAdapter(item))
+        except (TypeError, ValueError) as error:
+            spider.logger.error("Dropped invalid %s: %s", type(item).__name__, error)
+            raise DropItem(f"Invalid {type(item).__name__}: {error}") from error
+        return item
+
+
+class ItemStorePipeline:
+    """Writes items of each spider into the ItemStore at ITEM_STORE in transactions
+    of ITEM_STORE_BATCH_SIZE items"""
+    def __init__(self, path, batch_size, stats):
+        self.path = path
+        self.batch_size = batch_size
+        self.stats = stats
+        self.store = None
+        self.batch = []
+        self.items = 0
+
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('ITEM_STORE')
+        if not path:
+            raise NotConfigured("ITEM_STORE is not set")
+        return cls(str(path), max(1, crawler.settings.getint('ITEM_STORE_BATCH_SIZE', 100)),
+                   crawler.stats)
+
+
+    def open_spider(self, spider):
+        self.store = ItemStore(self.path)
+
+
+    def close_spider(self, spider):
+        self.flush(spider)
+        self.store.finish_crawl(spider.name, spider_uid(spider), self.items,
+                                self.stats.get_value('item_dropped_count', 0, spider=spider))
+        self.store.close()
+
+
     def process_item(self, item, spider):
+        self.batch.append(ItemAdapter(item).asdict())
+        if len(self.batch) >= self.batch_size:
+            self.flush(spider)
         return item
+
+
+    def flush(self, spider):
+        """Write items waiting in the batch"""
+        if self.batch:
+            self.store.add_items(spider.name, spider_uid(spider), self.batch)
+            self.items += len(self.batch)
+            self.batch = []
+
+
+def spider_uid(spider):
+    """UID a spider crawls as an int or None if it has no UID"""
+    uid = getattr(spider, 'uid', None)
+    return int(uid) if uid is not None else None
@@ -0,0 +1,118 @@
+"""Pool of proxies requests to bitcointalk are spread over.
+
+Each proxy may be used for at most requests_per_minute requests, so the pool as a whole
+makes that many requests per proxy without any of its IPs going over what the forum
+tolerates. Requests of the same user go through the same proxy as long as it is healthy,
+chosen with rendezvous hashing so that ejecting a proxy only moves the users it had.
+A proxy failing max_failures times in a row is ejected for cooldown seconds, after which
+a single request is let through it as a health check. If it succeeds, the proxy is back
+in the pool, otherwise it is ejected again."""
+import hashlib
+import time
+
+PROXY_SCHEMES = ('http', 'https')
+
+
+class ProxyPoolError(Exception):
+    """Raised for proxies which cannot be used"""
+
+
+class ProxyState:
+    """Rate budget and health of a proxy"""
+    def __init__(self, url):
+        self.url = url
+        self.next_request = 0.0
+        self.failures = 0
+        self.ejected_until = None
+        self.probing = False
+
+
+    def available(self, now):
+        """Check if requests can be sent through the proxy"""
+        if self.ejected_until is None:
+            return True
+        return not self.probing and now >= self.ejected_until
+
+
+class ProxyPool:
+    """Chooses proxies for requests and keeps track of how they work"""
+    def __init__(self, proxies, requests_per_minute=30, max_failures=3, cooldown=300,
+                 clock=time.monotonic):
+        if not proxies:
+            raise ProxyPoolError("Proxy pool needs at least one proxy")
+        for url in proxies:
+            if url.split('://', 1)[0] not in PROXY_SCHEMES:
+                raise ProxyPoolError(
+                    f"Proxy {url} is not supported. Scrapy can only use http and https proxies.")
+        self.proxies = {url: ProxyState(url) for url in proxies}
+        self.interval = 60 / requests_per_minute
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.clock = clock
+
+
+    def sticky_proxy(self, key, candidates):
+        """Proxy of candidates with the highest hash with key"""
+        def weight(state):
+            return hashlib.sha1(f"{key}|{state.url}".encode()).digest()
+        return max(candidates, key=weight)
+
+
+    def reserve(self, key=None):
+        """Choose a proxy for a request and reserve a slot of its budget. Requests with
+        the same key, e.g. UID of a user, go through the same proxy while it is healthy.
+        Returns the proxy and seconds to wait before sending the request."""
+        now = self.clock()
+        candidates = [state for state in self.proxies.values() if state.available(now)]
+        if not candidates:
+            # Every proxy is ejected, wait for the one coming back first
+            state = min((state for state in self.proxies.values() if not state.probing),
+                        key=lambda state: state.ejected_until, default=None)
+            if state is None:
+                state = min(self.proxies.values(), key=lambda state: state.next_request)
+        elif key is not None:
+            state = self.sticky_proxy(key, candidates)
+        else:
+            state = min(candidates, key=lambda state: state.next_request)
+        start = max(now, state.next_request)
+        if state.ejected_until is not None:
+            start = max(start, state.ejected_until)
+            state.probing = True
+        state.next_request = start + self.interval
+        return state.url, start - now
+
+
+    def record_success(self, url):
+        """Record a request through the proxy which got a response from the forum"""
+        state = self.proxies[url]
+        state.failures = 0
+        state.ejected_until = None
+        state.probing = False
+
+
+    def record_failure(self, url):
+        """Record a failed request through the proxy. Returns True if it was ejected."""
+        state = self.proxies[url]
+        state.failures += 1
+        if state.probing or state.failures >= self.max_failures:
+            state.ejected_until = self.clock() + self.cooldown
+            state.probing = False
+            return True
+        return False
+
+
+    def healthy(self):
+        """Proxies which are not ejected"""
+        return [url for url, state in self.proxies.items() if state.ejected_until is None]
+
+
+_shared_pools = {}
+
+
+def shared_pool(proxies, requests_per_minute, max_failures, cooldown):
+    """Pool shared by all crawlers of the process using the same settings, so that
+    spiders running at the same time share the budgets of the proxies"""
+    key = (tuple(proxies), requests_per_minute, max_failures, cooldown)
+    if key not in _shared_pools:
+        _shared_pools[key] = ProxyPool(proxies, requests_per_minute, max_failures, cooldown)
+    return _shared_pools[key]
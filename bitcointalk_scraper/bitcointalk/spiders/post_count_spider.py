@@ -0,0 +1,77 @@
+"""Bitcointalk user post count spider"""
+import scrapy
+from scrapy.exceptions import CloseSpider
+
+from ..items import PostCountItem
+from ..page_search import PageBoundarySearch
+from .posts_spider import (BitcointalkPostsSpider, POSTS_PER_PAGE, find_post_tables,
+                           post_table_datetime_string, post_table_link, parse_post_datetime)
+
+
+class BitcointalkPostCountSpider(BitcointalkPostsSpider):
+    """Count posts made after start timestamp without walking every page of posts.
+    showPosts pages can be requested in any order so the page containing the start
+    timestamp is searched for by galloping and then binary searching."""
+    name = 'post_count'
+
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.search = PageBoundarySearch(POSTS_PER_PAGE)
+        self.first_links = {}
+        # First page is requested in start_requests
+        self.pages_requested = 1
+
+
+    def page_request(self, page):
+        """Request a page of posts"""
+        self.pages_requested += 1
+        url = f"{self.base_url};start={page * POSTS_PER_PAGE}" if page else self.base_url
+        return scrapy.Request(url=url, callback=self.parse, cb_kwargs={'page': page})
+
+
+    def parse(self, response, page=0):
+        """Count posts newer than start of round on page and choose next page"""
+        self.log(f"Counting posts on page {page}...")
+        post_tables = find_post_tables(response)
+        if not post_tables and page == 0:
+            raise CloseSpider(
+                "No posts found on page. "
+                "Stopping spider incase wrong page or something else wrong.")
+        newer, total = self.count_newer_posts(post_tables, page)
+        self.search.record(page, newer, total)
+        if (next_page := self.search.next_page()) is not None:
+            yield self.page_request(next_page)
+        else:
+            count_item = PostCountItem()
+            count_item['uid'] = int(self.uid)
+            count_item['posts_made'] = self.search.result()
+            count_item['pages_requested'] = self.pages_requested
+            yield count_item
+
+
+    def count_newer_posts(self, post_tables, page, boundary=None):
+        """Return amount of posts newer than boundary, by default start of round,
+        and total amount of posts"""
+        boundary = boundary or self.start_datetime
+        if not post_tables:
+            return 0, 0
+        # Forum may show the last page for offsets past the last post.
+        # Such a page is a repeat of a page already seen so it is considered empty.
+        first_link = post_table_link(post_tables[0])
+        for seen_page, link in self.first_links.items():
+            if link == first_link and seen_page != page:
+                return 0, 0
+        self.first_links[page] = first_link
+        newer = 0
+        for post_table in post_tables:
+            datetime_string = post_table_datetime_string(post_table)
+            try:
+                post_datetime = parse_post_datetime(datetime_string)
+            except ValueError as err:
+                raise CloseSpider(
+                    "Datetime of post could not be parsed. Stopping spider.") from err
+            if post_datetime < boundary:
+                break
+            newer += 1
+        return newer, len(post_tables)
@@ -8,7 +8,46 @@ from scrapy.exceptions import CloseSpider
 
 
 from ..items import PostItem
-from ..html_parser import PostContentParser
+from ..parse_pool import parse_post_contents_async
+
+
+POSTS_PER_PAGE = 20
+
+
+def parse_post_datetime(datetime_string):
+    """Parse datetime string found on a showPosts page e.g. 'on: Today at 01:02:03 PM'.
+    Raises ValueError if string cannot be parsed."""
+    # Regex for matching different datetimes
+    today_pattern = re.compile(r"on: Today at (\d{2}:\d{2}:\d{2} (?:AM|PM))")
+    other_days  = re.compile(
+        r"on: ([A-Z][a-z]{2,8} \d{2}, \d{4}, \d{2}:\d{2}:\d{2} (?:AM|PM))")
+    # If date of post other than today
+    if match := other_days.match(datetime_string):
+        return datetime.strptime(match.group(1), "%B %d, %Y, %I:%M:%S %p")
+    # If date is today
+    if match := today_pattern.match(datetime_string):
+        today_string = date.today().isoformat()
+        time_string = f"{today_string} {match.group(1)}"
+        return datetime.strptime(time_string, "%Y-%m-%d %I:%M:%S %p")
+    raise ValueError(f"Unknown post datetime format: {datetime_string}")
+
+
+def find_post_tables(response):
+    """Find tables wherein are divs with class "post" """
+    return response.xpath(
+        '//div[contains(@id, "bodyarea")]//table[./tr/td/div[contains(@class, "post")]]')
+
+
+def post_table_datetime_string(post_table):
+    """Combine different parts which make up the datetime and strip newlines etc."""
+    # Locate the cell in the table where datetime of the post is
+    datetime_cell = post_table.xpath('./tr[1]/td[3]')
+    return ''.join(datetime_cell.xpath('.//text()').getall()).strip()
+
+
+def post_table_link(post_table):
+    """Locate the cell of post link"""
+    return post_table.xpath('./tr[1]/td[2]/a[last()]/@href').get()
 
 
 class BitcointalkPostsSpider(scrapy.Spider):
@@ -52,60 +91,50 @@ class BitcointalkPostsSpider(scrapy.Spider):
             raise CloseSpider("Timestamp TypeError. Needs to be integer or float.") from err
 
 
-    def parse(self, response):
-        """Parser"""
+    async def parse(self, response):
+        """Parser. Request for the next page is made before contents of posts are
+        parsed, so that the page is downloaded while they are parsed."""
         self.log("Scraping a page of posts...")
-        # Find tables wherein are divs with class "post"
-        post_tables = response.xpath(
-            '//div[contains(@id, "bodyarea")]//table[./tr/td/div[contains(@class, "post")]]')
+        post_tables = find_post_tables(response)
         if not post_tables:
             raise CloseSpider(
                 "No posts found on page. "
                 "Stopping spider incase wrong page or something else wrong.")
-        for item in self.parse_post(post_tables):
-            yield item
-        self.start_post_no += 20
-        new_url = f"{self.base_url};start={self.start_post_no}"
-        yield scrapy.Request(url=new_url, callback=self.parse)
+        posts, close_reason = self.page_posts(post_tables)
+        if close_reason is None:
+            self.start_post_no += POSTS_PER_PAGE
+            new_url = f"{self.base_url};start={self.start_post_no}"
+            yield scrapy.Request(url=new_url, callback=self.parse)
+        contents = await parse_post_contents_async(
+            [post_div for post_div, _, _ in posts], self.settings.getint('POST_PARSE_PROCESSES'))
+        for (_, post_datetime, post_link), content in zip(posts, contents):
+            post_item = PostItem()
+            post_item['content'] = content
+            post_item['datetime_utc'] = post_datetime.strftime("%Y-%m-%dT%H:%M:%SZ")
+            post_item['link'] = post_link
+            yield post_item
+        if close_reason is not None:
+            raise CloseSpider(close_reason)
 
 
-    def parse_post(self, post_tables):
-        """Post parser"""
+    def page_posts(self, post_tables):
+        """Post divs, datetimes and links of posts of a page made after the start date.
+        Second value is the reason to stop the spider after them or None
+        if the next page should be crawled."""
+        posts = []
         for post_table in post_tables:
-            post_item = PostItem()
-            # Locate the cell in the table where datetime of the post is
-            datetime_cell = post_table.xpath('./tr[1]/td[3]')
-            # Locate the cell of post link
-            post_link = post_table.xpath('./tr[1]/td[2]/a[last()]/@href').get()
-            # combine different parts which make up the datetime and strip newlines etc.
-            datetime_string = ''.join(datetime_cell.xpath('.//text()').getall()).strip()
+            post_link = post_table_link(post_table)
+            datetime_string = post_table_datetime_string(post_table)
             # Div containing actual post content
             post_div = post_table.xpath('.//div[contains(@class, "post")]').get()
-            if post_link and post_div and datetime_string:
-                # Regex for matching different datetimes
-                today_pattern = re.compile(r"on: Today at (\d{2}:\d{2}:\d{2} (?:AM|PM))")
-                other_days  = re.compile(
-                    r"on: ([A-Z][a-z]{2,8} \d{2}, \d{4}, \d{2}:\d{2}:\d{2} (?:AM|PM))")
-                try:
-                    # If date of post other than today
-                    if match := other_days.match(datetime_string):
-                        post_datetime = datetime.strptime(match.group(1), "%B %d, %Y, %I:%M:%S %p")
-                    # If date is today
-                    elif match := today_pattern.match(datetime_string):
-                        today_string = date.today().isoformat()
-                        time_string = f"{today_string} {match.group(1)}"
-                        post_datetime = datetime.strptime(time_string, "%Y-%m-%d %I:%M:%S %p")
-                    post_datetime.replace(tzinfo=timezone.utc)
-                    if post_datetime < self.start_datetime:
-                        raise CloseSpider("Found a post older than start date.")
-                except ValueError as err:
-                    raise CloseSpider(
-                        "Datetime of post could not be parsed. Stopping spider.") from err
-                post_item['content'] = PostContentParser().parse_post_content(post_div)
-                post_item['datetime_utc'] = post_datetime.strftime("%Y-%m-%dT%H:%M:%SZ")
-                post_item['link'] = post_link
-                yield post_item
-            else:
-                raise CloseSpider(
-                    "Something was wrong on the page and not all information was "
-                    "successfully scraped. Stopping spider.")
+            if not (post_link and post_div and datetime_string):
+                return posts, ("Something was wrong on the page and not all information was "
+                               "successfully scraped. Stopping spider.")
+            try:
+                post_datetime = parse_post_datetime(datetime_string)
+            except ValueError:
+                return posts, "Datetime of post could not be parsed. Stopping spider."
+            if post_datetime < self.start_datetime:
+                return posts, "Found a post older than start date."
+            posts.append((post_div, post_datetime, post_link))
+        return posts, None
@@ -0,0 +1,34 @@
+"""Bitcointalk forum health probe spider"""
+import scrapy
+
+from ..forum_health import classify_response, FORUM_UNREACHABLE
+
+PROBE_URL = "https://bitcointalk.org/index.php"
+
+
+class BitcointalkProbeSpider(scrapy.Spider):
+    """Fetch the board index once without retries and yield the state of the forum"""
+    allowed_domains = ['bitcointalk.org']
+    name = 'probe'
+    custom_settings = {
+        'RETRY_ENABLED': False,
+        'ROBOTSTXT_OBEY': False,
+        'DOWNLOAD_TIMEOUT': 30,
+    }
+
+
+    def start_requests(self):
+        """Request the board index"""
+        yield scrapy.Request(url=PROBE_URL, callback=self.parse, errback=self.unreachable,
+                             meta={'handle_httpstatus_all': True}, dont_filter=True)
+
+
+    def parse(self, response):
+        """Classify the response"""
+        yield {'state': classify_response(response.status, response.text),
+               'status': response.status}
+
+
+    def unreachable(self, failure):
+        """No response was received"""
+        yield {'state': FORUM_UNREACHABLE, 'status': None, 'error': repr(failure.value)}
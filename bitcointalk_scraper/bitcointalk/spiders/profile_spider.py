@@ -1,4 +1,5 @@
 """Bitcointalk user profile spider"""
+from urllib.parse import quote
 
 import scrapy
 from scrapy.exceptions import CloseSpider
@@ -15,10 +16,13 @@ class BitcointalkProfileSpider(scrapy.Spider):
 
 
     def start_requests(self):
-        """Start actual scraping"""
+        """Start actual scraping. Profile is fetched by uid or, if not given, username."""
         if uid := getattr(self, 'uid', None):
             url = f"https://bitcointalk.org/index.php?action=profile;u={uid}"
             yield scrapy.Request(url=url, callback=self.parse, meta={'uid': uid})
+        elif username := getattr(self, 'username', None):
+            url = f"https://bitcointalk.org/index.php?action=profile;user={quote(username)}"
+            yield scrapy.Request(url=url, callback=self.parse)
 
     def parse(self, response):
         """Parse the scraped page"""
@@ -52,9 +56,15 @@ class BitcointalkProfileSpider(scrapy.Spider):
         if not rank:
             errors["profile_errors"].append("rank not found")
 
+        # Profile fetched by username has the UID only in links to the user
+        uid = response.meta.get('uid') or response.xpath(
+            '//a[contains(@href, "sa=showPosts")]/@href').re_first(r'u=(\d+)')
+        if not uid:
+            errors["profile_errors"].append("uid not found")
+
         if errors["profile_errors"]:
             raise CloseSpider(errors)
-        profile_item["uid"] = int(response.meta.get('uid'))
+        profile_item["uid"] = int(uid)
         profile_item["name"] = name
         profile_item["post_count"] = int(post_count)
         profile_item["activity"] = int(activity)
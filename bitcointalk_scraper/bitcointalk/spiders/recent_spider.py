@@ -0,0 +1,104 @@
+"""Bitcointalk forum-wide recent posts spider"""
+import re
+from datetime import datetime
+
+import scrapy
+from scrapy.exceptions import CloseSpider
+
+from ..items import RecentPostItem
+from ..html_parser import PostContentParser
+from .posts_spider import (find_post_tables, post_table_datetime_string, post_table_link,
+                           parse_post_datetime)
+
+RECENT_POSTS_PER_PAGE = 10
+RECENT_URL = "https://bitcointalk.org/index.php?action=recent"
+UID_PATTERN = re.compile(r"action=profile;u=(\d+)")
+
+
+def post_table_author(post_table):
+    """UID and name of the author of a post on the recent posts page. Author link
+    is the last profile link of the post header, after the topic starter."""
+    links = post_table.xpath(
+        './tr[position() < 3]//a[contains(@href, "action=profile;u=")]')
+    if not links:
+        return None, None
+    link = links[-1]
+    match = UID_PATTERN.search(link.xpath('./@href').get())
+    return int(match.group(1)), link.xpath('normalize-space(.)').get()
+
+
+class BitcointalkRecentSpider(scrapy.Spider):
+    """Walk the recent posts of the whole forum from newest to oldest until a post
+    older than start_timestamp is found. That post is also yielded so that the
+    caller knows that nothing between it and the newest post was missed. Forum
+    only lists a limited amount of recent posts, so the walk can end before."""
+    allowed_domains = ['bitcointalk.org']
+    name = 'recent'
+    custom_settings = {
+        'AUTOTHROTTLE_ENABLED': True,
+        'SPIDER_MIDDLEWARES': {
+            "bitcointalk.middlewares.BitcointalkSpiderMiddleware": 543,
+        }
+    }
+
+
+    def start_requests(self):
+        """Start from the newest posts"""
+        try:
+            self.start_datetime = datetime.utcfromtimestamp(
+                float(getattr(self, 'start_timestamp', 0)))
+        except (TypeError, ValueError, OverflowError) as err:
+            raise CloseSpider("Timestamp needs to be integer or float.") from err
+        self.seen_links = set()
+        yield scrapy.Request(url=RECENT_URL, callback=self.parse, cb_kwargs={'start': 0})
+
+
+    def parse(self, response, start=0):
+        """Yield posts of a page and continue to the next one"""
+        self.log(f"Scraping recent posts from {start}...")
+        post_tables = find_post_tables(response)
+        new_posts = 0
+        for post_table in post_tables:
+            link = post_table_link(post_table)
+            if link in self.seen_links:
+                continue
+            item, post_datetime = self.parse_post(post_table, link)
+            self.seen_links.add(link)
+            new_posts += 1
+            if item is None:
+                continue
+            yield item
+            if post_datetime < self.start_datetime:
+                raise CloseSpider("Found a post older than start timestamp.")
+        # Forum shows the last page again when start goes past the listed posts
+        if not new_posts:
+            raise CloseSpider("No more recent posts listed.")
+        yield scrapy.Request(url=f"{RECENT_URL};start={start + RECENT_POSTS_PER_PAGE}",
+                             callback=self.parse,
+                             cb_kwargs={'start': start + RECENT_POSTS_PER_PAGE})
+
+
+    def parse_post(self, post_table, link):
+        """Parse post and its author from a post table. Returns item and datetime of post,
+        or None and None if the post could not be parsed, which is logged and skipped
+        so that one odd post, e.g. of a deleted user, does not end the walk."""
+        uid, name = post_table_author(post_table)
+        datetime_string = post_table_datetime_string(post_table)
+        post_div = post_table.xpath('.//div[contains(@class, "post")]').get()
+        if not (link and post_div and datetime_string and uid):
+            self.logger.warning("Skipping recent post %s as not all of its information "
+                                "was found", link)
+            return None, None
+        try:
+            post_datetime = parse_post_datetime(datetime_string)
+        except ValueError:
+            self.logger.warning("Skipping recent post %s as its datetime %r could not be "
+                                "parsed", link, datetime_string)
+            return None, None
+        item = RecentPostItem()
+        item['uid'] = uid
+        item['name'] = name
+        item['content'] = PostContentParser().parse_post_content(post_div)
+        item['datetime_utc'] = post_datetime.strftime("%Y-%m-%dT%H:%M:%SZ")
+        item['link'] = link
+        return item, post_datetime
@@ -0,0 +1,103 @@
+"""Bitcointalk topic replies spider"""
+import scrapy
+from scrapy.exceptions import CloseSpider
+
+from ..items import TopicPostItem
+from ..links import message_id_from_link
+from ..html_parser import PostContentParser
+from .posts_spider import parse_post_datetime
+from .recent_spider import UID_PATTERN
+
+TOPIC_POSTS_PER_PAGE = 20
+
+
+def find_topic_posts(response):
+    """Find rows of a topic page with the author and the post"""
+    return response.xpath('//tr[td[contains(@class, "poster_info")]]')
+
+
+class BitcointalkTopicSpider(scrapy.Spider):
+    """Walk the replies of a topic from the page at offset start to the last page.
+    Posts up to message ID after_message are skipped so that a walk can continue
+    where a previous one stopped without going through the earlier pages again."""
+    allowed_domains = ['bitcointalk.org']
+    name = 'topic'
+    custom_settings = {
+        'AUTOTHROTTLE_ENABLED': True,
+    }
+
+
+    def start_requests(self):
+        """Start from the page at offset start"""
+        try:
+            self.topic = int(getattr(self, 'topic', None))
+            start = int(getattr(self, 'start', 0))
+            self.after_message = int(getattr(self, 'after_message', 0))
+        except (TypeError, ValueError) as err:
+            raise CloseSpider("Topic, start and after_message need to be integers.") from err
+        self.seen_links = set()
+        yield self.page_request(start - start % TOPIC_POSTS_PER_PAGE)
+
+
+    def page_request(self, start):
+        """Request a page of the topic"""
+        return scrapy.Request(url=f"https://bitcointalk.org/index.php?topic={self.topic}.{start}",
+                              callback=self.parse, cb_kwargs={'start': start})
+
+
+    def parse(self, response, start=0):
+        """Yield new posts of a page and continue to the next one"""
+        self.log(f"Scraping posts of topic {self.topic} from {start}...")
+        rows = find_topic_posts(response)
+        if not rows and start == 0:
+            raise CloseSpider(
+                "No posts found on page. "
+                "Stopping spider incase wrong page or something else wrong.")
+        new_posts = 0
+        for position, row in enumerate(rows, start):
+            link = row.xpath('.//div[contains(@class, "subject")]/a/@href').get()
+            if link in self.seen_links:
+                continue
+            self.seen_links.add(link)
+            new_posts += 1
+            if self.message_id(link) <= self.after_message:
+                continue
+            item = self.parse_post(row, link)
+            item['page_start'] = start
+            item['position'] = position
+            yield item
+        # Forum shows the last page again when start goes past the last reply
+        if new_posts and len(rows) == TOPIC_POSTS_PER_PAGE:
+            yield self.page_request(start + TOPIC_POSTS_PER_PAGE)
+
+
+    def message_id(self, link):
+        """Message ID of a post link"""
+        if (message_id := message_id_from_link(link)) is not None:
+            return message_id
+        raise CloseSpider(f"Unknown post link {link}. Stopping spider.")
+
+
+    def parse_post(self, row, link):
+        """Parse post and its author from a row of a topic page"""
+        author = row.xpath(
+            './td[contains(@class, "poster_info")]//a[contains(@href, "action=profile;u=")]')
+        datetime_string = row.xpath(
+            'normalize-space(.//div[contains(@class, "subject")]'
+            '/following-sibling::div[contains(@class, "smalltext")])').get()
+        post_div = row.xpath('.//div[@class="post"]').get()
+        if not (author and post_div and datetime_string):
+            raise CloseSpider(
+                "Something was wrong on the page and not all information was "
+                "successfully scraped. Stopping spider.")
+        try:
+            post_datetime = parse_post_datetime(f"on: {datetime_string}")
+        except ValueError as err:
+            raise CloseSpider("Datetime of post could not be parsed. Stopping spider.") from err
+        item = TopicPostItem()
+        item['uid'] = int(UID_PATTERN.search(author[0].xpath('./@href').get()).group(1))
+        item['name'] = author[0].xpath('normalize-space(.)').get()
+        item['content'] = PostContentParser().parse_post_content(post_div)
+        item['datetime_utc'] = post_datetime.strftime("%Y-%m-%dT%H:%M:%SZ")
+        item['link'] = link
+        return item
@@ -0,0 +1,106 @@
+"""Bitcointalk spider fetching the pages of posts a user made during a round"""
+import hashlib
+from datetime import datetime
+
+from scrapy.exceptions import CloseSpider
+
+from ..items import VerifiedPageItem
+from ..html_parser import PostContentParser
+from .posts_spider import (find_post_tables, post_table_datetime_string, post_table_link,
+                           parse_post_datetime)
+from .post_count_spider import BitcointalkPostCountSpider
+
+
+def page_hash(post_tables):
+    """Hash of the HTML of post tables"""
+    digest = hashlib.sha256()
+    for post_table in post_tables:
+        digest.update(post_table.get().encode())
+    return digest.hexdigest()
+
+
+class BitcointalkVerifyPostsSpider(BitcointalkPostCountSpider):
+    """Fetch only the showPosts pages with posts made between start_timestamp and
+    end_timestamp. The page where the round ended is searched for like the post count
+    spider does and pages are then walked until a post older than start of the round.
+    Contents of pages whose hash is in comma separated known_page_hashes are not parsed.
+    A page item is yielded for each walked page, the last one with last set."""
+    name = 'verify_posts'
+
+
+    def start_requests(self):
+        """Search for the page where the round ended"""
+        try:
+            self.end_datetime = datetime.utcfromtimestamp(float(self.end_timestamp))
+        except (AttributeError, TypeError, ValueError, OverflowError) as err:
+            raise CloseSpider("End timestamp needs to be integer or float.") from err
+        self.known_page_hashes = set(
+            filter(None, str(getattr(self, 'known_page_hashes', '') or '').split(',')))
+        self.searching = True
+        yield from super().start_requests()
+
+
+    def parse(self, response, page=0):
+        """Record pages of the search until the end page is found, then walk pages"""
+        post_tables = find_post_tables(response)
+        if not self.searching:
+            yield from self.walk_page(post_tables, page)
+            return
+        if not post_tables and page == 0:
+            raise CloseSpider(
+                "No posts found on page. "
+                "Stopping spider incase wrong page or something else wrong.")
+        newer, total = self.count_newer_posts(post_tables, page, self.end_datetime)
+        self.search.record(page, newer, total)
+        if (next_page := self.search.next_page()) is not None:
+            yield self.page_request(next_page)
+            return
+        self.searching = False
+        if self.search.high == page:
+            yield from self.walk_page(post_tables, page)
+        else:
+            yield self.page_request(self.search.high).replace(dont_filter=True)
+
+
+    def walk_page(self, post_tables, page):
+        """Yield posts of a page made during the round and request the next page
+        unless a post older than start of the round was found"""
+        item = VerifiedPageItem()
+        item['uid'] = int(self.uid)
+        item['page'] = page
+        item['posts'] = []
+        # Forum shows the last page again for offsets past the last post
+        first_link = post_table_link(post_tables[0]) if post_tables else None
+        item['last'] = not post_tables or any(
+            link == first_link and seen_page != page
+            for seen_page, link in self.first_links.items())
+        round_tables = []
+        if not item['last']:
+            self.first_links[page] = first_link
+            for post_table in post_tables:
+                try:
+                    post_datetime = parse_post_datetime(post_table_datetime_string(post_table))
+                except ValueError as err:
+                    raise CloseSpider(
+                        "Datetime of post could not be parsed. Stopping spider.") from err
+                if post_datetime >= self.end_datetime:
+                    continue
+                if post_datetime < self.start_datetime:
+                    item['last'] = True
+                    break
+                round_tables.append((post_table, post_datetime))
+        # Only posts of the round are hashed so that posts made after it do not change
+        # the hash of the page where the round ended
+        item['page_hash'] = page_hash(post_table for post_table, _ in round_tables)
+        item['unchanged'] = item['page_hash'] in self.known_page_hashes
+        for post_table, post_datetime in round_tables:
+            post = {'link': post_table_link(post_table),
+                    'datetime_utc': post_datetime.strftime("%Y-%m-%dT%H:%M:%SZ")}
+            if not item['unchanged']:
+                post['content'] = PostContentParser().parse_post_content(
+                    post_table.xpath('.//div[contains(@class, "post")]').get())
+            item['posts'].append(post)
+        yield item
+        if not item['last']:
+            # Page may have been fetched already while searching
+            yield self.page_request(page + 1).replace(dont_filter=True)
@@ -0,0 +1,52 @@
+if __name__ == '__main__':
+    import os
+    import argparse
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    from bitcointalk.item_store import ITEM_STORE_FILE
+
+    arg_parser = argparse.ArgumentParser(
+        description='Crawl profiles and posts of many users in a single reactor')
+    arg_parser.add_argument('output_dir', help='folder where crawler results are written')
+    arg_parser.add_argument('tasks', nargs='+', help=
+        'UID:START_TIMESTAMP to crawl profile and posts made after start timestamp '
+        'or only UID to crawl profile')
+    arg_parser.add_argument('--count_only', action='store_true', help=
+        'only count posts instead of crawling all of them')
+    arg_parser.add_argument('--verify_count', action='store_true', help=
+        'crawl all posts in addition to counting them')
+    arg_parser.add_argument('--concurrency', type=int, default=8, help=
+        'how many users are crawled at the same time')
+    ns = arg_parser.parse_args()
+
+    os.environ['SCRAPY_SETTINGS_MODULE'] =  'settings'
+    s = get_project_settings()
+    # Workers already run on every core, so posts are parsed in the worker itself
+    s['POST_PARSE_PROCESSES'] = 0
+    os.makedirs(ns.output_dir, exist_ok=True)
+    s['ITEM_STORE'] = os.path.join(ns.output_dir, ITEM_STORE_FILE)
+    process = CrawlerProcess(s)
+
+    from twisted.internet import defer
+
+    def stop_reactor(_):
+        """Stop reactor after all crawls are done"""
+        # Reactor is only imported here so that it gets installed by scrapy
+        from twisted.internet import reactor
+        reactor.callWhenRunning(reactor.stop)
+
+    semaphore = defer.DeferredSemaphore(ns.concurrency)
+    crawls = []
+    for task in ns.tasks:
+        uid, _, start_timestamp = task.partition(':')
+        crawls.append(semaphore.run(process.crawl, 'profile', uid=uid))
+        if start_timestamp:
+            if ns.count_only or ns.verify_count:
+                crawls.append(semaphore.run(
+                    process.crawl, 'post_count', uid=uid, start_timestamp=start_timestamp))
+            if not ns.count_only or ns.verify_count:
+                crawls.append(semaphore.run(
+                    process.crawl, 'posts', uid=uid, start_timestamp=start_timestamp))
+    defer.DeferredList(crawls).addBoth(stop_reactor)
+    process.start(stop_after_crawl=False)
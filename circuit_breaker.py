@@ -0,0 +1,110 @@
+"""Circuit breaker pausing all crawls of a run while the forum cannot be crawled.
+
+Crawls report whether the forum answered normally. After failure_threshold failed
+crawls in a row the breaker opens and crawls wait instead of failing one by one. After
+retry_seconds a single probe request checks the forum (half-open). If the forum works
+again, the breaker closes and the waiting crawls continue, otherwise the wait before the
+next probe is doubled. If the forum has not come back within max_pause seconds, waiting
+crawls fail with CircuitOpenError. With max_pause 0 the run stops as soon as the
+breaker opens."""
+import asyncio
+import time
+
+from bitcointalk_scraper.bitcointalk.forum_health import FORUM_OK, FORUM_STATE_DESCRIPTIONS
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+DEFAULT_MAX_PAUSE = 600
+
+
+class CircuitOpenError(Exception):
+    """Raised when the forum could not be crawled within the allowed pause"""
+
+
+def describe_forum_state(state):
+    """Human readable state of the forum"""
+    return FORUM_STATE_DESCRIPTIONS.get(state, state)
+
+
+class CircuitBreaker:
+    """Circuit breaker shared by the crawls of a CampaignManager"""
+    def __init__(self, failure_threshold=3, retry_seconds=15, max_retry_seconds=120,
+                 max_pause=DEFAULT_MAX_PAUSE, clock=time.monotonic, sleep=asyncio.sleep):
+        self.failure_threshold = failure_threshold
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.max_pause = max_pause
+        self.clock = clock
+        self.sleep = sleep
+        self.state = CLOSED
+        self.failures = 0
+        self.forum_state = FORUM_OK
+        self.opened_at = None
+        self.next_probe = None
+        self.retry_delay = retry_seconds
+        self.lock = None
+
+
+    def status(self):
+        """Status of the breaker for messages"""
+        if self.state == CLOSED:
+            return "Crawling is running"
+        return (f"Bitcointalk is {describe_forum_state(self.forum_state)}. Crawling has "
+                f"been paused for {int(self.clock() - self.opened_at)} seconds")
+
+
+    def record_success(self):
+        """Record a crawl or probe which found the forum working"""
+        if self.state != CLOSED:
+            print("Bitcointalk is working again, crawling continues")
+        self.state = CLOSED
+        self.failures = 0
+        self.forum_state = FORUM_OK
+        self.opened_at = None
+        self.retry_delay = self.retry_seconds
+
+
+    def record_failure(self, forum_state):
+        """Record a crawl or probe which found the forum in forum_state"""
+        now = self.clock()
+        self.failures += 1
+        self.forum_state = forum_state
+        if self.state == HALF_OPEN:
+            self.retry_delay = min(self.retry_delay * 2, self.max_retry_seconds)
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self.opened_at = now
+            print(f"Bitcointalk is {describe_forum_state(forum_state)}, pausing crawling")
+        else:
+            return
+        self.state = OPEN
+        self.next_probe = now + self.retry_delay
+
+
+    def trip(self, forum_state):
+        """Open the breaker at once, e.g. when a probe before crawling failed"""
+        self.failures = max(self.failures, self.failure_threshold - 1)
+        self.record_failure(forum_state)
+
+
+    async def wait(self, probe):
+        """Wait until the breaker is closed. While it is open, one waiting crawl at a
+        time probes the forum with probe(), a coroutine function returning the state
+        of the forum. Raises CircuitOpenError if the pause would go over max_pause."""
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        while self.state != CLOSED:
+            async with self.lock:
+                if self.state == CLOSED:
+                    break
+                if self.next_probe - self.opened_at > self.max_pause:
+                    raise CircuitOpenError(
+                        f"{self.status()} and it did not come back within {self.max_pause} "
+                        "seconds. Stopping.")
+                await self.sleep(max(0, self.next_probe - self.clock()))
+                self.state = HALF_OPEN
+                forum_state = await probe()
+                if forum_state == FORUM_OK:
+                    self.record_success()
+                else:
+                    self.record_failure(forum_state)
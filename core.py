@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import os
@@ -5,9 +6,26 @@ import time
 import csv
 
 from pathlib import Path
-from datetime import datetime
-
-from utils import validate_data_folder, fetch_bitcointalk_profile, fetch_user_posts, CrawlerResultError
+from dataclasses import asdict
+from functools import partial
+
+from utils import validate_data_folder
+from records import RoundParticipant, dumps, loads, json_chunks, UNKNOWN
+from crawl_pool import crawl_participants
+from work_queue import crawl_participants_via_queue, START_STAGE, END_STAGE, SNAPSHOT_STAGE
+from snapshots import take_snapshot, write_curves_csv
+from quote_graph import QuoteGraph, quote_graph_path, QUOTES_CSV_FILE
+from post_cache import VERIFICATION_CSV_FILE
+from enrollment import ENROLLED
+from participant_index import (ParticipantIndex, participant_index_path, open_participant_index,
+                               update_participant_index, participant_rows, collecting_rows)
+from post_sketch import (POSTING_SKETCH_KEY, SKETCHES_CSV_FILE, sketch_csv_header,
+                         sketch_csv_row)
+from estimate import WORKER_CONCURRENCY
+from locks import campaign_lock, round_lock, write_atomically, DEFAULT_LOCK_TIMEOUT
+from circuit_breaker import CircuitOpenError, DEFAULT_MAX_PAUSE
+from post_rules import (parse_rule_value, POST_RULES_KEY, ACCEPTED_POSTS_KEY,
+                        REJECTED_POSTS_KEY, REJECTION_REASONS_KEY)
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +63,7 @@ def read_metadata(data_folder, campaign_name):
     metadata_path = campaign_metadata_path(data_folder, campaign_name)
     with metadata_path.open('r') as f:
         try:
-            metadata = json.load(f)
+            metadata = loads(f.read())
             if (isinstance(metadata, dict) and
                 CAMPAIGN_NAME_KEY in metadata and
                     metadata.get(CAMPAIGN_NAME_KEY) == campaign_name):
@@ -56,13 +74,14 @@ def read_metadata(data_folder, campaign_name):
             raise
 
 
-def write_metadata(data_folder, campaign_name, json_string):
-    """Write campaign metadata to the metadata.json file at campaign folder"""
+def write_metadata(data_folder, campaign_name, metadata):
+    """Write campaign metadata dict to the metadata.json file at campaign folder"""
     metadata_path = campaign_metadata_path(data_folder, campaign_name)
-    with metadata_path.open('w') as f:
-        print(f"Writing campaign {campaign_name} data to file...")
-        f.write(json_string)
-        print("Campaign data written to file")
+    print(f"Writing campaign {campaign_name} data to file...")
+    write_atomically(metadata_path, dumps(metadata))
+    print("Campaign data written to file")
+    update_participant_index(data_folder, campaign_name, None,
+                             participant_rows(metadata.get(PARTICIPANTS_KEY) or {}))
 
 
 def read_round_data(campaign_path, round_number):
@@ -70,7 +89,7 @@ def read_round_data(campaign_path, round_number):
     round_path = round_metadata_path(campaign_path, round_number)
     with round_path.open('r') as f:
         try:
-            round_dict = json.load(f)
+            round_dict = loads(f.read())
             if (isinstance(round_dict, dict) and
                 'round_number' in round_dict and
                     round_dict.get('round_number') == round_number):
@@ -81,13 +100,21 @@ def read_round_data(campaign_path, round_number):
             raise
 
 
-def write_round_data(campaign_path, round_number, json_string):
-    """Write round data to the round.json file at round folder"""
+def write_round_data(campaign_path, round_number, round_dict, participants=None):
+    """Write round data dict to the round.json file at round folder. If participants
+    is given, round_dict has no participants and participants are (uid, participant)
+    items written one at a time so that they do not need to be in memory at once."""
     round_path = round_metadata_path(campaign_path, round_number)
-    with round_path.open('w') as f:
-        print(f"Writing round {round_number} data to file...")
-        f.write(json_string)
-        print("Round data written to file")
+    print(f"Writing round {round_number} data to file...")
+    if participants is None:
+        rows = participant_rows(round_dict.get(PARTICIPANTS_KEY) or {})
+        write_atomically(round_path, dumps(round_dict))
+    else:
+        rows = set()
+        write_atomically(round_path, json_chunks(round_dict, PARTICIPANTS_KEY,
+                                                 collecting_rows(participants, rows)))
+    print("Round data written to file")
+    update_participant_index(campaign_path.parent, campaign_path.name, round_number, rows)
 
 
 def data_folder_path(path_arg):
@@ -157,7 +184,7 @@ def campaign_participants(path, campaign_name):
     try:
         metadata_file = campaign_metadata_path(path, campaign_name)
         with metadata_file.open() as f:
-            metadata = json.load(f)
+            metadata = loads(f.read())
             if campaign_has_participants(path, campaign_name):
                 return metadata.get(PARTICIPANTS_KEY)
             return {}
@@ -196,7 +223,7 @@ def round_participant_ids(campaign_path, round_number):
     try:
         metadata_file = round_metadata_path(campaign_path, round_number)
         with metadata_file.open() as f:
-            metadata = json.load(f)
+            metadata = loads(f.read())
             if round_has_participants(campaign_path, round_number):
                 return metadata.get(PARTICIPANTS_KEY).keys()
             return []
@@ -204,75 +231,115 @@ def round_participant_ids(campaign_path, round_number):
         logger.error(error)
 
 
-def set_current_round(data_folder, campaign_name, current_round):
+def set_current_round(data_folder, campaign_name, current_round,
+                      lock_timeout=DEFAULT_LOCK_TIMEOUT):
     """Set current round to campaign metadata"""
-    metadata = read_metadata(data_folder, campaign_name)
-    metadata['current_round'] = current_round
-    write_metadata(data_folder, campaign_name, json.dumps(metadata))
-
-
-def initialize_round_participants(data_folder, campaign_name, start_time, known_start_info):
-    """Get participants from campaign metadata and add them to the round
-    as participants"""
-    if campaign_has_participants(data_folder, campaign_name):
-        participants = campaign_participants(data_folder, campaign_name)
-        results = {}
-        for uid in participants:
-            participant = participants[uid]
-            payment_address = participant.get(PAYMENT_ADDRESS_KEY)
-            results[uid] = fill_round_participant_info(
-                uid, payment_address, start_time, known_start_info)
-        return results
-    return {}
-
-
-def fill_round_participant_info(profile_id, payment_address, start_time, known_start_info):
-    profile = fetch_bitcointalk_profile(profile_id)
-    return {
-        UID_KEY: profile.get(UID_KEY),
-        'name': profile.get('name'),
-        'rank': profile.get('rank'),
-        PAYMENT_ADDRESS_KEY: payment_address,
-        'start_time': start_time,
-        'known_start_info': known_start_info,
-        'start_post_count': profile.get('post_count') if known_start_info else 'unknown',
-        'start_activity': profile.get('activity') if known_start_info else 'unknown',
-        'start_merit': profile.get('merit') if known_start_info else 'unknown',
-    }
-
-
-def finalize_round_participants(participants):
-    """Go through each participant in the round and update info and
+    with campaign_lock(data_folder / campaign_name, timeout=lock_timeout):
+        metadata = read_metadata(data_folder, campaign_name)
+        metadata['current_round'] = current_round
+        write_metadata(data_folder, campaign_name, metadata)
+
+
+def lock_timeout(args):
+    """Seconds to wait for a campaign or round used by another command"""
+    return getattr(args, 'lock_timeout', DEFAULT_LOCK_TIMEOUT)
+
+
+def campaign_manager(args):
+    """CampaignManager of the data folder given in args. Forum is probed before crawling."""
+    # Imported here because manager is built on the functions of this module
+    from manager import CampaignManager
+    return CampaignManager(data_folder_path(args.data_folder), lock_timeout=lock_timeout(args),
+                           max_pause=getattr(args, 'max_pause', DEFAULT_MAX_PAUSE),
+                           preflight=True)
+
+
+def run_manager(coroutine):
+    """Run a CampaignManager coroutine for a command line handler.
+    Errors such as a missing campaign are printed and None is returned."""
+    from manager import CampaignManagerError
+    try:
+        return asyncio.run(coroutine)
+    except (CampaignManagerError, CircuitOpenError) as error:
+        print(error)
+        return None
+
+
+def round_crawl_function(args, campaign_name, round_number, stage):
+    """Function crawling many participants at once using worker processes or
+    a work queue if requested in args. Returns None if participants should be
+    crawled on the event loop by CampaignManager. Returned function takes a list of
+    (uid, start_timestamp) and optionally evaluate(uid, posts) function and yields
+    (uid, profile, posts_result). CampaignManager gives the evaluate function, which
+    applies the post rules of the campaign."""
+    count_only = getattr(args, 'count_only', False)
+    verify_count = getattr(args, 'verify_count', False)
+    if queue_path := getattr(args, 'queue', None):
+        return partial(crawl_participants_via_queue, queue_path, campaign_name, round_number,
+                       stage, count_only=count_only, verify_count=verify_count)
+    if workers := getattr(args, 'workers', None):
+        return partial(crawl_participants, workers=workers, count_only=count_only,
+                       verify_count=verify_count)
+    return None
+
+
+def manager_crawl_function(args):
+    """Function crawling many participants at once on the event loop of a
+    CampaignManager, taking and yielding the same as round_crawl_function"""
+    manager = campaign_manager(args)
+    def crawl(tasks, evaluate=None):
+        results = asyncio.run(manager.crawl(tasks, evaluate=evaluate))
+        return ((result.uid, asdict(result.profile), result.posts_result)
+                for result in results)
+    return crawl
+
+
+def round_participant_from_profile(profile, payment_address, start_time, known_start_info):
+    """Create round participant from a crawled profile"""
+    return RoundParticipant(
+        uid=profile.get(UID_KEY),
+        name=profile.get(NAME_KEY),
+        rank=profile.get(RANK_KEY),
+        payment_address=payment_address,
+        start_time=start_time,
+        known_start_info=known_start_info,
+        start_post_count=profile.get('post_count') if known_start_info else UNKNOWN,
+        start_activity=profile.get('activity') if known_start_info else UNKNOWN,
+        start_merit=profile.get('merit') if known_start_info else UNKNOWN,
+    )
+
+
+def finalize_round_participant(round_participant, profile, posts_result):
+    """Update round participant with info at end of round and
     calculate difference from start"""
-    profiles = map(fetch_bitcointalk_profile, participants.keys())
-    for profile in profiles:
-        uid = str(profile.get(UID_KEY))
-        round_participant = participants.get(uid)
-        known_start_info = round_participant.get('known_start_info')
-        posts = fetch_user_posts(uid, round_participant.get('start_time'))
-        print(f"Calculating posts for {profile.get('name')}...")
-        participants[uid]['end_post_count'] = profile.get('post_count')
-        participants[uid]['end_activity'] = profile.get('activity')
-        participants[uid]['end_merit'] = profile.get('merit')
-
-        participants[uid]['post_count_difference'] = (
-            int(participants[uid]['end_post_count']) -
-            int(participants[uid]['start_post_count'])
-        ) if known_start_info else 'unknown'
-
-        participants[uid]['activity_gained'] = (
-            int(participants[uid]['end_activity']) -
-            int(participants[uid]['start_activity'])
-        ) if known_start_info else 'unknown'
-
-        participants[uid]['merit_gained'] = (
-            int(participants[uid]['end_merit']) -
-            int(participants[uid]['start_merit'])
-        ) if known_start_info else 'unknown'
-
-        participants[uid]['posts_made'] = len(posts)
-        print("Done")
-    return participants
+    known_start_info = round_participant.known_start_info
+    round_participant.end_post_count = profile.get('post_count')
+    round_participant.end_activity = profile.get('activity')
+    round_participant.end_merit = profile.get('merit')
+    round_participant.end_name = profile.get('name')
+    round_participant.end_rank = profile.get('rank')
+
+    round_participant.post_count_difference = (
+        int(round_participant.end_post_count) -
+        int(round_participant.start_post_count)
+    ) if known_start_info else UNKNOWN
+
+    round_participant.activity_gained = (
+        int(round_participant.end_activity) -
+        int(round_participant.start_activity)
+    ) if known_start_info else UNKNOWN
+
+    round_participant.merit_gained = (
+        int(round_participant.end_merit) -
+        int(round_participant.start_merit)
+    ) if known_start_info else UNKNOWN
+
+    round_participant.posts_made = posts_result.get(POSTS_MADE_KEY)
+    round_participant.accepted_posts = posts_result.get(ACCEPTED_POSTS_KEY)
+    round_participant.rejected_posts = posts_result.get(REJECTED_POSTS_KEY)
+    round_participant.rejection_reasons = posts_result.get(REJECTION_REASONS_KEY)
+    round_participant.posting_sketch = posts_result.get(POSTING_SKETCH_KEY)
+    return round_participant
 
 
 def add_campaign(args):
@@ -287,24 +354,45 @@ def add_campaign(args):
             CAMPAIGN_NAME_KEY: campaign_name,
             PARTICIPANTS_KEY: dict()
         }
-        write_metadata(path, campaign_name, json.dumps(metadata))
+        write_metadata(path, campaign_name, metadata)
         print("Campaign added and metadata written to the campaign folder")
     else:
         print("Campaign folder already exists")
 
 
+def set_post_rule(args):
+    """Set a post rule of campaign. Rule is removed if value is 0 or false."""
+    data_folder = data_folder_path(args.data_folder)
+    campaign_name = args.campaign_name
+    if not campaign_exists(data_folder, campaign_name):
+        print('Given campaign not found')
+        return
+    value = parse_rule_value(args.rule, args.value)
+    with campaign_lock(data_folder / campaign_name, timeout=lock_timeout(args)):
+        campaign_metadata = read_metadata(data_folder, campaign_name)
+        rules = campaign_metadata.get(POST_RULES_KEY, {})
+        if value:
+            rules[args.rule] = value
+        else:
+            rules.pop(args.rule, None)
+        campaign_metadata[POST_RULES_KEY] = rules
+        write_metadata(data_folder, campaign_name, campaign_metadata)
+    print(f"Post rules of {campaign_name}: {rules}")
+
+
 def add_payment_address(args):
     data_folder = data_folder_path(args.data_folder)
     campaign_name = args.campaign_name
     str_uid = str(args.uid)
     payment_address = args.payment_address
     if campaign_exists(data_folder, campaign_name):
-        campaign_metadata = read_metadata(data_folder, campaign_name)
-        if str_uid in campaign_metadata[PARTICIPANTS_KEY]:
-            campaign_metadata[PARTICIPANTS_KEY][str_uid][PAYMENT_ADDRESS_KEY] = payment_address
-            write_metadata(data_folder, campaign_name, json.dumps(campaign_metadata))
-        else:
-            print('User not in campaign')
+        with campaign_lock(data_folder / campaign_name, timeout=lock_timeout(args)):
+            campaign_metadata = read_metadata(data_folder, campaign_name)
+            if str_uid in campaign_metadata[PARTICIPANTS_KEY]:
+                campaign_metadata[PARTICIPANTS_KEY][str_uid][PAYMENT_ADDRESS_KEY] = payment_address
+                write_metadata(data_folder, campaign_name, campaign_metadata)
+            else:
+                print('User not in campaign')
     else:
         print('Given campaign not found')
 
@@ -320,64 +408,110 @@ def add_round_payment_address(args):
         if not round_exists(campaign_path, round_number):
             print('Given round not found... aborting')
             return
-        campaign_metadata = read_metadata(data_folder, campaign_name)
-        round_metadata = read_round_data(campaign_path, round_number)
-        camp_participants = campaign_metadata[PARTICIPANTS_KEY]
-        round_participants = round_metadata[PARTICIPANTS_KEY]
-        if str_uid not in camp_participants:
-            print(f'Participant {str_uid} not found in campaign... aborting')
-            return
-        if str_uid not in round_participants:
-            print(f'Participant {str_uid} not found in given round... aborting')
-            return
-        camp_participants[str_uid][PAYMENT_ADDRESS_KEY] = payment_address
-        round_participants[str_uid][PAYMENT_ADDRESS_KEY] = payment_address
-        campaign_metadata[PARTICIPANTS_KEY] = camp_participants
-        round_metadata[PARTICIPANTS_KEY] = round_participants
-        write_metadata(data_folder, campaign_name, json.dumps(campaign_metadata))
-        write_round_data(campaign_path, round_number, json.dumps(round_metadata))
+        timeout = lock_timeout(args)
+        with campaign_lock(campaign_path, timeout=timeout), \
+                round_lock(campaign_path, round_number, timeout=timeout):
+            campaign_metadata = read_metadata(data_folder, campaign_name)
+            round_metadata = read_round_data(campaign_path, round_number)
+            camp_participants = campaign_metadata[PARTICIPANTS_KEY]
+            round_participants = round_metadata[PARTICIPANTS_KEY]
+            if str_uid not in camp_participants:
+                print(f'Participant {str_uid} not found in campaign... aborting')
+                return
+            if str_uid not in round_participants:
+                print(f'Participant {str_uid} not found in given round... aborting')
+                return
+            camp_participants[str_uid][PAYMENT_ADDRESS_KEY] = payment_address
+            round_participants[str_uid][PAYMENT_ADDRESS_KEY] = payment_address
+            campaign_metadata[PARTICIPANTS_KEY] = camp_participants
+            round_metadata[PARTICIPANTS_KEY] = round_participants
+            write_metadata(data_folder, campaign_name, campaign_metadata)
+            write_round_data(campaign_path, round_number, round_metadata)
     else:
         print('Given campaign not found... aborting')
 
 
+def crawl_concurrency(args):
+    """How many participants are estimated to be crawled at the same time"""
+    if workers := getattr(args, 'workers', None):
+        return workers * WORKER_CONCURRENCY
+    if getattr(args, 'queue', None):
+        print("Estimate is for a single queue worker")
+        return 1
+    return None
+
+
+def print_crawl_estimate(estimate_function, *estimate_args, **estimate_kwargs):
+    """Print estimate of crawling a round instead of crawling it"""
+    from manager import CampaignManagerError
+    try:
+        estimate = estimate_function(*estimate_args, **estimate_kwargs)
+    except CampaignManagerError as error:
+        print(error)
+        return
+    print(f"Dry run: {estimate.describe()}")
+
+
 def add_round(args):
     """Add a new round"""
-    path = data_folder_path(args.data_folder)
-    campaign_name = args.campaign_name
-    if not campaign_exists(path, campaign_name):
-        print("Campaign with given name doesn't exist")
+    manager = campaign_manager(args)
+    if getattr(args, 'dry_run', False):
+        print_crawl_estimate(manager.estimate_add_round, args.campaign_name,
+                             concurrency=crawl_concurrency(args))
         return
-    campaign = campaign_folder_path(path, campaign_name)
-    round_number = args.round_number
-    known_start_info = False
-    if not round_exists(campaign, round_number):
-        print(f"Adding round number {round_number}")
-        round_folder = campaign / str(round_number)
-        os.makedirs(round_folder)
-        if not (round_start := args.round_start):
-            known_start_info = True
-            round_start = int(time.time())
-        if campaign_has_participants(path, campaign_name):
-            new_round = {
-                CAMPAIGN_NAME_KEY: campaign_name,
-                'round_number': round_number,
-                'ended': False,
-                'round_start': round_start,
-                'round_start_utc': datetime.utcfromtimestamp(round_start).strftime(
-                    "%Y-%m-%dT%H:%M:%SZ"),
-                PARTICIPANTS_KEY: initialize_round_participants(
-                    path, campaign_name, round_start, known_start_info)
-            }
-            write_round_data(campaign, round_number, json.dumps(new_round))
-            print("Round added and written to the campaign folder")
-        else:
-            print("Campaign doesn't have participants")
-    else:
-        print("Round already exists")
+    crawl = round_crawl_function(args, args.campaign_name, args.round_number, START_STAGE)
+    print(f"Adding round number {args.round_number}")
+    if run_manager(manager.add_round(
+            args.campaign_name, args.round_number, args.round_start, crawl=crawl,
+            max_requests=getattr(args, 'max_requests', None))):
+        print("Round added and written to the campaign folder")
 
 
 def end_round(args):
     """End an existing round"""
+    manager = campaign_manager(args)
+    count_only = getattr(args, 'count_only', False)
+    verify_count = getattr(args, 'verify_count', False)
+    if getattr(args, 'dry_run', False):
+        print_crawl_estimate(manager.estimate_end_round, args.campaign_name,
+                             args.round_number, count_only, verify_count,
+                             concurrency=crawl_concurrency(args))
+        return
+    crawl = round_crawl_function(args, args.campaign_name, args.round_number, END_STAGE)
+    print(f"Ending round {args.round_number} and calculating posts...")
+    if round_data := run_manager(manager.end_round(
+            args.campaign_name, args.round_number, count_only=count_only,
+            verify_count=verify_count, crawl=crawl,
+            max_requests=getattr(args, 'max_requests', None))):
+        print(f"Round ended and posts calculated for {round_data.participants} participants")
+
+
+def rollover_round(args):
+    """End a round and start the next one from the profiles crawled at its end"""
+    manager = campaign_manager(args)
+    count_only = getattr(args, 'count_only', False)
+    verify_count = getattr(args, 'verify_count', False)
+    next_round = args.round_number + 1
+    if getattr(args, 'dry_run', False):
+        print_crawl_estimate(manager.estimate_rollover_round, args.campaign_name,
+                             args.round_number, count_only, verify_count,
+                             concurrency=crawl_concurrency(args))
+        return
+    crawl = round_crawl_function(args, args.campaign_name, args.round_number, END_STAGE)
+    start_crawl = round_crawl_function(args, args.campaign_name, next_round, START_STAGE)
+    print(f"Ending round {args.round_number} and starting round {next_round}...")
+    if rounds := run_manager(manager.rollover_round(
+            args.campaign_name, args.round_number, count_only=count_only,
+            verify_count=verify_count, crawl=crawl, start_crawl=start_crawl,
+            max_requests=getattr(args, 'max_requests', None))):
+        ended, started = rounds
+        print(f"Round ended and posts calculated for {ended.participants} participants")
+        print(f"Round {next_round} started with {len(started.participants)} participants")
+
+
+def snapshot_round(args):
+    """Save current profile stats and posts made since previous snapshot
+    of each participant of a running round"""
     data_folder = data_folder_path(args.data_folder)
     campaign_name = args.campaign_name
     if not campaign_exists(data_folder, campaign_name):
@@ -385,100 +519,235 @@ def end_round(args):
         return
     campaign_path = campaign_folder_path(data_folder, campaign_name)
     round_number = args.round_number
-    if round_exists(campaign_path, round_number):
-        now = time.time()
-        round_dict = read_round_data(campaign_path, round_number)
+    if not round_exists(campaign_path, round_number):
+        print("No such round... aborting")
+        return
+    # Round is locked until the snapshot is saved so that it cannot end in between
+    with round_lock(campaign_path, round_number, timeout=lock_timeout(args)):
         if round_has_ended(campaign_path, round_number):
             print("Round has already ended")
             return
-        print(f"Ending round {round_number} and calculating posts...")
-        round_dict['ended'] = True
-        round_dict['round_end'] = int(now)
-        round_dict['round_end_utc'] = datetime.utcfromtimestamp(now).strftime("%Y-%m-%dT%H:%M:%SZ")
-        if round_has_participants(campaign_path, round_number):
-            round_dict[PARTICIPANTS_KEY] = finalize_round_participants(
-                round_dict.get(PARTICIPANTS_KEY))
+        round_dict = read_round_data(campaign_path, round_number)
+        participants = round_dict.get(PARTICIPANTS_KEY) or {}
+        if not participants:
+            print("No participants to take a snapshot of")
+            return
+        print(f"Taking a snapshot of round {round_number}...")
+        take_snapshot(
+            participants, round_folder_path(campaign_path, round_number), int(time.time()),
+            crawl=(round_crawl_function(args, campaign_name, round_number, SNAPSHOT_STAGE)
+                   or manager_crawl_function(args)))
+    print("Snapshot saved")
+
+
+def poll_round_feed(args):
+    """Save posts of round participants found in the recent posts of the forum"""
+    manager = campaign_manager(args)
+    print(f"Polling recent posts for round {args.round_number}...")
+    added = run_manager(manager.poll_feed(args.campaign_name, args.round_number))
+    if added is not None:
+        print(f"{added} new posts of participants saved")
+
+
+def verify_round_posts(args):
+    """Print participants whose posts were deleted or edited after the round ended
+    and write the deleted and edited posts to csv"""
+    manager = campaign_manager(args)
+    print(f"Verifying posts of round {args.round_number}...")
+    verifications = run_manager(manager.verify_round_posts(args.campaign_name,
+                                                           args.round_number))
+    if verifications is None:
+        return
+    campaign_path = campaign_folder_path(data_folder_path(args.data_folder), args.campaign_name)
+    rows = []
+    for verification in verifications:
+        if verification.deleted or verification.edited or verification.new:
+            print(f"{verification.uid}: {len(verification.deleted)} deleted, "
+                  f"{len(verification.edited)} edited, {len(verification.new)} not seen before")
+        rows.extend([verification.uid, message_id, change]
+                    for change, message_ids in (('deleted', verification.deleted),
+                                                ('edited', verification.edited),
+                                                ('new', verification.new))
+                    for message_id in message_ids)
+    print(f"{sum(verification.skipped_pages for verification in verifications)}/"
+          f"{sum(verification.pages for verification in verifications)} "
+          "pages were unchanged since the previous verification")
+    with (round_folder_path(campaign_path, args.round_number) / VERIFICATION_CSV_FILE).open(
+            'w', newline='') as f:
+        csv_writer = csv.writer(f, delimiter=';')
+        csv_writer.writerow(['uid', 'message_id', 'change'])
+        csv_writer.writerows(rows)
+    print(f"{len(rows)} changed posts of {len(verifications)} participants written to "
+          f"{VERIFICATION_CSV_FILE}")
+
+
+def round_curves(args):
+    """Write daily curves of posts, activity and merit of round participants
+    found by snapshots to csv"""
+    data_folder = data_folder_path(args.data_folder)
+    campaign_name = args.campaign_name
+    if campaign_exists(data_folder, campaign_name):
+        campaign_path = campaign_folder_path(data_folder, campaign_name)
+        round_number = args.round_number
+        if round_exists(campaign_path, round_number):
+            print("Writing daily curves to csv...")
+            with round_lock(campaign_path, round_number, exclusive=False,
+                            timeout=lock_timeout(args)):
+                round_data = read_round_data(campaign_path, round_number)
+            write_curves_csv(round_folder_path(campaign_path, round_number),
+                             round_data.get(PARTICIPANTS_KEY) or {})
+            print("Done")
         else:
-            print("No participants to count posts for")
-        write_round_data(campaign_path, round_number, json.dumps(round_dict))
+            print("Round does not exist")
     else:
-        print("No such round... aborting")
+        print("Campaign does not exist")
+
+
+def round_quotes(args):
+    """Print groups of round participants quoting each other and write
+    amount of posts quoting other participants to csv"""
+    data_folder = data_folder_path(args.data_folder)
+    campaign_name = args.campaign_name
+    if not campaign_exists(data_folder, campaign_name):
+        print("Campaign does not exist")
+        return
+    campaign_path = campaign_folder_path(data_folder, campaign_name)
+    round_number = args.round_number
+    if not round_exists(campaign_path, round_number):
+        print("Round does not exist")
+        return
+    if not quote_graph_path(campaign_path).is_file():
+        print("No posts indexed yet. Posts are indexed when a round ends.")
+        return
+    with round_lock(campaign_path, round_number, exclusive=False, timeout=lock_timeout(args)):
+        participants = read_round_data(campaign_path, round_number).get(PARTICIPANTS_KEY) or {}
+    def name(uid):
+        return participants.get(str(uid), {}).get(NAME_KEY, str(uid))
+    quote_graph = QuoteGraph(quote_graph_path(campaign_path))
+    try:
+        rings = quote_graph.rings(round_number, args.min_quotes)
+        print(f"{len(rings)} groups of participants quoting each other")
+        for ring in rings:
+            print(', '.join(name(uid) for uid in ring))
+        for first, second, first_quotes, second_quotes in quote_graph.mutual_pairs(
+                round_number, args.min_quotes):
+            print(f"{name(first)} quoted {name(second)} {first_quotes} times "
+                  f"and was quoted back {second_quotes} times")
+        shares = quote_graph.member_quote_shares(round_number)
+    finally:
+        quote_graph.close()
+    round_folder = round_folder_path(campaign_path, round_number)
+    with (round_folder / QUOTES_CSV_FILE).open('w', newline='') as f:
+        csv_writer = csv.writer(f, delimiter=';')
+        csv_writer.writerow(['uid', 'name', 'posts', 'posts_quoting_participants', 'share'])
+        for uid, (posts, quoting) in sorted(
+                shares.items(), key=lambda item: item[1][1] / item[1][0], reverse=True):
+            csv_writer.writerow([uid, name(uid), posts, quoting, round(quoting / posts, 3)])
+    print(f"Posts quoting other participants written to {QUOTES_CSV_FILE}")
+
+
+def enroll_from_topic(args):
+    """Enroll applicants from new replies of the signup topic of a campaign"""
+    manager = campaign_manager(args)
+    print("Reading new replies of the signup topic...")
+    applications = run_manager(manager.enroll_from_topic(args.campaign_name, args.topic))
+    if applications is None:
+        return
+    enrolled = 0
+    for application in applications:
+        if application['status'] == ENROLLED:
+            enrolled += 1
+        print(f"{application['name']} ({application['uid']}): {application['status']} "
+              f"{application['link']}")
+    print(f"{enrolled} of {len(applications)} new replies enrolled")
+
+
+def resolve_usernames(args):
+    """Print UIDs of usernames given as arguments or in a file, one per line"""
+    names = list(args.names)
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            names.extend(line.strip() for line in f if line.strip())
+    if not names:
+        print("No usernames given")
+        return
+    manager = campaign_manager(args)
+    if (resolved := run_manager(manager.resolve_usernames(names))) is None:
+        return
+    for name, uid in resolved.items():
+        print(f"{name};{uid if uid is not None else 'not found'}")
+
+
+def lookup_participant(args):
+    """Print campaigns and rounds of a UID and UIDs using a payment address"""
+    if args.uid is None and args.payment_address is None:
+        print("Give a UID or a payment address to look up")
+        return
+    index = open_participant_index(data_folder_path(args.data_folder))
+    try:
+        if args.uid is not None:
+            campaigns = index.campaigns(args.uid)
+            rounds = index.rounds(args.uid)
+            if not campaigns and not rounds:
+                print(f"UID {args.uid} is not in any campaign")
+            for campaign, payment_address in campaigns:
+                print(f"{args.uid} in campaign {campaign}, payment address {payment_address}")
+            for campaign, round_number, payment_address in rounds:
+                print(f"{args.uid} in round {round_number} of {campaign}, "
+                      f"payment address {payment_address}")
+        if args.payment_address is not None:
+            uses = index.address_uids(args.payment_address)
+            if not uses:
+                print(f"Payment address {args.payment_address} is not used")
+            for uid, campaign, round_number in uses:
+                where = f"campaign {campaign}" if round_number is None else \
+                    f"round {round_number} of {campaign}"
+                print(f"{args.payment_address} used by {uid} in {where}")
+            if len(uids := {uid for uid, _, _ in uses}) > 1:
+                print(f"Payment address is used by {len(uids)} different UIDs")
+    finally:
+        index.close()
+
+
+def shared_payment_addresses(args):
+    """Print payment addresses used by more than one UID"""
+    index = open_participant_index(data_folder_path(args.data_folder))
+    try:
+        shared = index.shared_addresses()
+    finally:
+        index.close()
+    for payment_address, uids in shared.items():
+        print(f"{payment_address};{','.join(str(uid) for uid in uids)}")
+    print(f"{len(shared)} payment addresses used by more than one UID")
+
+
+def rebuild_participant_index(args):
+    """Index participants of all campaigns and rounds from scratch"""
+    data_folder = data_folder_path(args.data_folder)
+    print("Rebuilding participant index...")
+    index = ParticipantIndex(participant_index_path(data_folder))
+    try:
+        print(f"{index.rebuild(data_folder)} campaign and round files indexed")
+    finally:
+        index.close()
 
 
 def add_participant(args):
     """Add a participant to campaign"""
-    path = data_folder_path(args.data_folder)
-    campaign_name = args.campaign_name
-    uid = args.uid
-    payment_address = args.payment_address
-    if campaign_exists(path, campaign_name):
-        metadata = read_metadata(path, campaign_name)
-        print("Adding participant...")
-        if PARTICIPANTS_KEY not in metadata:
-            metadata[PARTICIPANTS_KEY] = dict()
-        if str(uid) not in metadata[PARTICIPANTS_KEY]:
-            try:
-                profile = fetch_bitcointalk_profile(uid)
-                print(f"Adding participant {uid}...")
-                participant = dict()
-                participant['name'] = profile.get('name')
-                participant[PAYMENT_ADDRESS_KEY] = payment_address if payment_address else None
-                metadata["participants"][str(uid)] = participant
-            except (FileNotFoundError, CrawlerResultError) as error:
-                logger.error(error)
-                raise
-            write_metadata(path, campaign_name, json.dumps(metadata))
-            print("Participant added")
-        else:
-            print("Participant with given UID already exists")
-    else:
-        logger.error("Campaign with given name doesn't exist.")
+    manager = campaign_manager(args)
+    print(f"Adding participant {args.uid}...")
+    if profile := run_manager(manager.add_participant(
+            args.campaign_name, args.uid, args.payment_address)):
+        print(f"Participant {profile.name} added")
 
 
 def add_round_participant(args):
     """Add a participant to a round"""
-    data_folder = data_folder_path(args.data_folder)
-    campaign_name = args.campaign_name
-    payment_address = args.payment_address
-    uid = args.uid
-    campaign_path = campaign_folder_path(data_folder, campaign_name)
-    if campaign_exists(data_folder, campaign_name):
-        campaign_metadata = read_metadata(data_folder, campaign_name)
-        round_number = args.round_number
-        str_uid = str(uid)
-        if round_exists(campaign_path, round_number):
-            print("Adding participant to round (and campaign if not already present)")
-            round_metadata = read_round_data(campaign_path, round_number)
-            if PARTICIPANTS_KEY not in campaign_metadata:
-                campaign_metadata[PARTICIPANTS_KEY] = dict()
-            if PARTICIPANTS_KEY not in round_metadata:
-                round_metadata[PARTICIPANTS_KEY] = dict()
-            if str_uid in round_metadata[PARTICIPANTS_KEY]:
-                print("Participant already found in given round")
-                return
-            else:
-                current_time = int(time.time())
-                round_participant = fill_round_participant_info(uid, payment_address, current_time, True)
-                username = round_participant.get('name')
-                round_metadata[PARTICIPANTS_KEY][str_uid] = round_participant
-                write_round_data(campaign_path, round_number, json.dumps(round_metadata))
-                print(f"{username} added to round")
-            if str_uid in campaign_metadata[PARTICIPANTS_KEY]:
-                print("Participant already found in campaign. Doing nothing.")
-            else:
-                participant = dict()
-                participant['name'] = username
-                participant[PAYMENT_ADDRESS_KEY] = payment_address if payment_address else None
-                campaign_metadata[PARTICIPANTS_KEY][str_uid] = {
-                    'username': username,
-                    PAYMENT_ADDRESS_KEY: payment_address if payment_address else None
-                }
-                write_metadata(data_folder, campaign_name, json.dumps(campaign_metadata))
-                print(f"{username} added to campaign")
-        else:
-            print("Given round number doesn't exist... aborting")
-    else:
-        print("Campaign with given name doesn't exist... aborting")
+    manager = campaign_manager(args)
+    print("Adding participant to round (and campaign if not already present)")
+    if round_participant := run_manager(manager.add_round_participant(
+            args.campaign_name, args.round_number, args.uid, args.payment_address)):
+        print(f"{round_participant.name} added to round")
 
 
 def remove_participant(args):
@@ -487,17 +756,30 @@ def remove_participant(args):
     campaign_name = args.campaign_name
     uid = args.uid
     if campaign_exists(data_folder, campaign_name):
-        metadata = read_metadata(data_folder, campaign_name)
-        if PARTICIPANTS_KEY in metadata:
-            if str(uid) in metadata[PARTICIPANTS_KEY]:
-                print(f"Deleting participant with uid {uid}")
-                del metadata[PARTICIPANTS_KEY][str(uid)]
-                write_metadata(data_folder, campaign_name, json.dumps(metadata))
-                print("Participant deleted")
+        with campaign_lock(data_folder / campaign_name, timeout=lock_timeout(args)):
+            metadata = read_metadata(data_folder, campaign_name)
+            if PARTICIPANTS_KEY in metadata:
+                if str(uid) in metadata[PARTICIPANTS_KEY]:
+                    print(f"Deleting participant with uid {uid}")
+                    del metadata[PARTICIPANTS_KEY][str(uid)]
+                    write_metadata(data_folder, campaign_name, metadata)
+                    print("Participant deleted")
+                else:
+                    print("Participant with given UID is not a part of the campaign")
             else:
-                print("Participant with given UID is not a part of the campaign")
-        else:
-            print("No participants in the campaign")
+                print("No participants in the campaign")
+
+
+def write_sketches_csv(round_folder, participants):
+    """Write posting sketches of round participants to csv"""
+    with (round_folder / SKETCHES_CSV_FILE).open('w', newline='') as f:
+        csv_writer = csv.writer(f, delimiter=';')
+        csv_writer.writerow(sketch_csv_header())
+        for participant in participants:
+            csv_writer.writerow(sketch_csv_row(
+                participant.get(UID_KEY), participant.get(NAME_KEY),
+                participant[POSTING_SKETCH_KEY]))
+    print(f"Posting patterns written to {SKETCHES_CSV_FILE}")
 
 
 def round_to_csv(args):
@@ -509,7 +791,9 @@ def round_to_csv(args):
         round_number = args.round_number
         if round_exists(campaign_path, round_number):
             print("Writing round data to csv...")
-            round_data = read_round_data(campaign_path, round_number)
+            with round_lock(campaign_path, round_number, exclusive=False,
+                            timeout=lock_timeout(args)):
+                round_data = read_round_data(campaign_path, round_number)
             round_folder = round_folder_path(campaign_path, round_number)
             with (round_folder / 'round.csv').open('w', newline='') as f:
                 csv_writer = csv.writer(f, delimiter=';')
@@ -532,26 +816,31 @@ def round_to_csv(args):
                             'posts_made', 'rejected_posts', 'accepted_posts', 'payment_address', 'payment', 'txid']
                         )
                         for item in participants:
+                            item = RoundParticipant.from_dict(item)
                             csv_writer.writerow([
-                                item.get(UID_KEY),
-                                item.get(NAME_KEY),
-                                item.get(RANK_KEY),
-                                item.get(START_POST_COUNT_KEY),
-                                item.get(END_POST_COUNT_KEY),
-                                item.get(START_ACTIVITY_KEY),
-                                item.get(END_ACTIVITY_KEY),
-                                item.get(START_MERIT_KEY),
-                                item.get(END_MERIT_KEY),
-                                item.get(POST_COUNT_DIFFERENCE_KEY),
-                                item.get(ACTIVITY_GAINED_KEY),
-                                item.get(MERIT_GAINED_KEY),
-                                item.get(POSTS_MADE_KEY),
-                                '',
-                                '',
-                                item.get(PAYMENT_ADDRESS_KEY),
+                                item.uid,
+                                item.name,
+                                item.rank,
+                                item.start_post_count,
+                                item.end_post_count,
+                                item.start_activity,
+                                item.end_activity,
+                                item.start_merit,
+                                item.end_merit,
+                                item.post_count_difference,
+                                item.activity_gained,
+                                item.merit_gained,
+                                item.posts_made,
+                                '' if item.rejected_posts is None else item.rejected_posts,
+                                '' if item.accepted_posts is None else item.accepted_posts,
+                                item.payment_address,
                                 '',
                                 '',
                             ])
+                    sketched = [participant for participant in participants
+                                if participant.get(POSTING_SKETCH_KEY)]
+                    if sketched:
+                        write_sketches_csv(round_folder, sketched)
             print("Done")
         else:
             print("Round does not exist")
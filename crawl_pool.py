@@ -0,0 +1,159 @@
+"""Crawl many participants at once using several worker processes.
+
+Participants are split into shards and each shard is crawled by its own
+process running round_crawler.py, which has a reactor of its own. This way
+parsing of pages is spread over all CPU cores. Workers write the items validated
+by their item pipelines into an item store, from which the calling process reads
+them back and then updates the round."""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+from bitcointalk_scraper.bitcointalk.item_store import ItemStore, ITEM_STORE_FILE
+from utils import (try_uid_to_int, try_timestamp_to_int, profile_from_items,
+                   post_count_from_items, post_from_item, CrawlerResultError, ScrapingError)
+from post_rules import evaluate_posts, POSTS_MADE_KEY
+
+logger = logging.getLogger(__name__)
+
+# Each run of workers writes into a folder of its own in here
+WORKER_OUTPUT_PATH = Path('scraper_outputs/workers')
+
+
+def default_worker_count():
+    """Default amount of worker processes is the amount of CPU cores"""
+    return os.cpu_count() or 1
+
+
+def shard_tasks(tasks, workers):
+    """Split tasks into at most the given amount of shards. Tasks ordered longest
+    first are dealt out so that each shard gets its share of the long ones."""
+    shards = [[] for _ in range(max(1, min(workers, len(tasks))))]
+    for i, task in enumerate(tasks):
+        shards[i % len(shards)].append(task)
+    return shards
+
+
+def task_argument(uid, start_timestamp):
+    """Format a task as a command line argument of round_crawler.py"""
+    uid = try_uid_to_int(uid)
+    if start_timestamp is None:
+        return str(uid)
+    return f"{uid}:{try_timestamp_to_int(start_timestamp)}"
+
+
+def crawler_command(output_dir, tasks, count_only=False, verify_count=False):
+    """Command running round_crawler.py for tasks writing into output_dir"""
+    command = ["python3", "bitcointalk_scraper/round_crawler.py", str(output_dir)]
+    command.extend(task_argument(uid, start_timestamp) for uid, start_timestamp in tasks)
+    if count_only:
+        command.append('--count_only')
+    if verify_count:
+        command.append('--verify_count')
+    return command
+
+
+def run_crawler(output_dir, tasks, count_only=False, verify_count=False):
+    """Crawl tasks with round_crawler.py in a process of its own and wait for it.
+    Results of an earlier crawl in output_dir are removed first."""
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    if subprocess.run(crawler_command(output_dir, tasks, count_only, verify_count)).returncode:
+        logger.error("Crawler writing to %s failed", output_dir)
+        raise ScrapingError("Something went wrong during Scraping")
+
+
+def run_workers(run_dir, shards, count_only=False, verify_count=False):
+    """Start a worker process for each shard writing into run_dir and wait for all
+    of them to finish. Returns output folders of the workers."""
+    workers = []
+    for i, shard in enumerate(shards):
+        output_dir = run_dir / str(i)
+        workers.append((output_dir, subprocess.Popen(
+            crawler_command(output_dir, shard, count_only, verify_count))))
+    print(f"Started {len(workers)} crawler workers")
+    failed = False
+    for output_dir, worker in workers:
+        if worker.wait() != 0:
+            logger.error("Crawler worker writing to %s exited with code %s",
+                         output_dir, worker.returncode)
+            failed = True
+    if failed:
+        raise ScrapingError("Something went wrong during Scraping")
+    return [output_dir for output_dir, _ in workers]
+
+
+def crawled_items(store, spider_name, uid):
+    """Items a worker scraped crawling a participant with a spider. Raises
+    CrawlerResultError if the crawl did not finish or some items were invalid."""
+    crawl = store.crawl(spider_name, int(uid))
+    if crawl is None:
+        raise CrawlerResultError(
+            f"Crawling {spider_name} of {uid} did not finish. Scraping may have failed.")
+    _, dropped = crawl
+    if dropped:
+        raise CrawlerResultError(f"{dropped} items of {spider_name} of {uid} were invalid")
+    return store.items(spider_name, int(uid))
+
+
+def read_worker_result(store, uid, start_timestamp, count_only, verify_count,
+                       evaluate=None):
+    """Read the profile and posts result of a participant from the item store of
+    the worker which crawled it. Posts are given to evaluate(uid, posts) if given,
+    otherwise they are counted."""
+    profile = profile_from_items(list(crawled_items(store, 'profile', uid)), uid)
+    if profile is None:
+        raise CrawlerResultError(f"Profile of {uid} could not be crawled")
+    if start_timestamp is None:
+        return profile, None
+    posts_made = None
+    if count_only or verify_count:
+        posts_made = post_count_from_items(list(crawled_items(store, 'post_count', uid)))
+    if count_only and not verify_count:
+        return profile, {POSTS_MADE_KEY: posts_made}
+    walked_posts_made = 0
+    def walked_posts():
+        nonlocal walked_posts_made
+        for item in crawled_items(store, 'posts', uid):
+            walked_posts_made += 1
+            yield post_from_item(item)
+    if evaluate is not None:
+        posts_result = evaluate(str(uid), walked_posts())
+    else:
+        posts_result = evaluate_posts(walked_posts())
+    if posts_made is not None and posts_made != walked_posts_made:
+        logger.warning(
+            "Post count for uid %s was %s but walking all pages found %s posts",
+            uid, posts_made, walked_posts_made)
+    return profile, posts_result
+
+
+def crawl_participants(tasks, workers=None, count_only=False, verify_count=False,
+                       evaluate=None):
+    """Crawl participants using worker processes. Tasks are (uid, start_timestamp)
+    tuples where start_timestamp is None if only the profile is needed.
+    Yields (uid, profile, posts_result) for each task where posts_result is
+    what evaluate(uid, posts) returned or amount of posts if evaluate not given."""
+    tasks = list(tasks)
+    if not tasks:
+        return
+    shards = shard_tasks(tasks, workers or default_worker_count())
+    # Runs of other commands crawling at the same time have folders of their own
+    WORKER_OUTPUT_PATH.mkdir(parents=True, exist_ok=True)
+    run_dir = Path(tempfile.mkdtemp(dir=WORKER_OUTPUT_PATH))
+    try:
+        output_dirs = run_workers(run_dir, shards, count_only, verify_count)
+        for output_dir, shard in zip(output_dirs, shards):
+            store = ItemStore(output_dir / ITEM_STORE_FILE)
+            try:
+                for uid, start_timestamp in shard:
+                    profile, posts_result = read_worker_result(
+                        store, uid, start_timestamp, count_only, verify_count, evaluate)
+                    yield str(uid), profile, posts_result
+            finally:
+                store.close()
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
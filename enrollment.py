@@ -0,0 +1,108 @@
+"""Enrolling participants from the replies of a signup topic.
+
+Applicants reply to the signup topic of a campaign with a form such as
+
+    Bitcointalk username: satoshi
+    Profile link: https://bitcointalk.org/index.php?action=profile;u=3
+    BTC address: bc1q...
+
+Each reply is parsed into fields by the text before a colon on each line. The author
+of a reply is the applicant, so a profile link in the form has to point to them. The
+payment address is taken from the first field whose name mentions an address or a
+wallet. enrollment.json of the campaign folder records the topic and the last reply
+gone through, so the next run continues from the page of that reply."""
+import json
+import re
+
+from utils import post_message_id
+from locks import write_atomically
+
+ENROLLMENT_FILE = 'enrollment.json'
+APPLICATIONS_FILE = 'applications.jl'
+ADDRESS_FIELD_PATTERN = re.compile(r"address|wallet", re.IGNORECASE)
+PAYMENT_ADDRESS_PATTERN = re.compile(r"^[A-Za-z0-9]{20,110}$")
+PROFILE_UID_PATTERN = re.compile(r"action=profile;u=(\d+)")
+
+ENROLLED = 'enrolled'
+NOT_A_FORM = 'no signup form'
+ALREADY_PARTICIPATING = 'already participating'
+NO_PAYMENT_ADDRESS = 'no valid payment address'
+PROFILE_OF_ANOTHER_USER = 'profile link of another user'
+
+
+def read_enrollment(campaign_path):
+    """State of enrollment from the signup topic or None if not started"""
+    path = campaign_path / ENROLLMENT_FILE
+    if not path.is_file():
+        return None
+    with path.open('r') as f:
+        return json.load(f)
+
+
+def write_enrollment(campaign_path, enrollment):
+    """Save state of enrollment from the signup topic"""
+    write_atomically(campaign_path / ENROLLMENT_FILE, json.dumps(enrollment, indent=4))
+
+
+def post_text(content):
+    """Text of a post outside quotes, links written as their URLs"""
+    texts = []
+    nodes = list(reversed((content or {}).get('children', ())))
+    while nodes:
+        node = nodes.pop()
+        node_type = node.get('type')
+        if node_type == 'text':
+            texts.append(node.get('content', ''))
+        elif node_type == 'link':
+            texts.append(node.get('url') or '')
+        elif node_type != 'quote' and (children := node.get('children')):
+            nodes.extend(reversed(children))
+    return ''.join(texts)
+
+
+def form_fields(text):
+    """Fields of a signup form by lowercase name"""
+    fields = {}
+    for line in text.splitlines():
+        name, separator, value = line.partition(':')
+        name = ' '.join(name.split()).lower()
+        if separator and name and value.strip() and name not in fields:
+            fields[name] = value.strip()
+    return fields
+
+
+def parse_application(post):
+    """Parse a reply of the signup topic scraped by the topic spider into an application.
+    Status of the application is the reason if it cannot be enrolled."""
+    text = post_text(post.get('content'))
+    fields = form_fields(text)
+    application = {
+        'uid': post.get('uid'),
+        'name': post.get('name'),
+        'payment_address': None,
+        'link': post.get('link'),
+        'message_id': post_message_id(post),
+        'fields': fields,
+        'status': None,
+    }
+    for name, value in fields.items():
+        if ADDRESS_FIELD_PATTERN.search(name):
+            address = value.split()[0]
+            if PAYMENT_ADDRESS_PATTERN.match(address):
+                application['payment_address'] = address
+            break
+    profile_uids = {int(uid) for uid in PROFILE_UID_PATTERN.findall(text)}
+    if not fields:
+        application['status'] = NOT_A_FORM
+    elif profile_uids and profile_uids != {post.get('uid')}:
+        application['status'] = PROFILE_OF_ANOTHER_USER
+    elif application['payment_address'] is None:
+        application['status'] = NO_PAYMENT_ADDRESS
+    return application
+
+
+def append_applications(campaign_path, applications):
+    """Append applications gone through to applications.jl of the campaign folder"""
+    with (campaign_path / APPLICATIONS_FILE).open('a') as f:
+        for application in applications:
+            f.write(json.dumps(application) + '\n')
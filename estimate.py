@@ -0,0 +1,189 @@
+"""Estimates of how many requests and how much time crawling a round takes.
+
+Nothing is fetched. Posts of each participant are estimated from the rate they posted at
+in the latest ended round they took part in, or the median rate of the campaign if they
+have not taken part in an ended round. Time is estimated by simulating the AutoThrottle
+delays of each spider run, which starts from AUTOTHROTTLE_START_DELAY for every run and
+moves towards the latency of bitcointalk divided by AUTOTHROTTLE_TARGET_CONCURRENCY.
+
+The same estimates order crawls of a round longest first, so that a participant with
+pages and pages of posts does not start last and keep the whole round waiting while
+the other crawls have finished. Rates of a running round are taken from the post count
+of the latest snapshot of a participant when there is one."""
+import math
+import statistics
+from dataclasses import dataclass
+
+from records import loads
+
+POSTS_PER_PAGE = 20
+# Posts per day of participants if the campaign has no ended rounds
+DEFAULT_POSTS_PER_DAY = 5
+# Seconds a request to bitcointalk is assumed to take
+DEFAULT_LATENCY = 1.0
+# Scrapy defaults of the AutoThrottle settings unless set in bitcointalk_scraper/settings.py
+AUTOTHROTTLE_START_DELAY = 5.0
+AUTOTHROTTLE_MAX_DELAY = 60.0
+AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
+# Spiders crawled at the same time by one round_crawler.py worker
+WORKER_CONCURRENCY = 8
+
+
+@dataclass
+class CrawlEstimate:
+    """Estimated requests and time of crawling participants of a round"""
+    participants: int
+    requests: int
+    seconds: float
+    expected_posts: int
+    participants_without_history: int
+
+    def describe(self):
+        hours, rest = divmod(int(self.seconds), 3600)
+        return (f"{self.participants} participants, about {self.expected_posts} posts, "
+                f"{self.requests} requests and {hours}h {rest // 60}min "
+                f"({self.participants_without_history} participants estimated "
+                "from campaign median)")
+
+    def then(self, other):
+        """Estimate of crawling other after this crawl has finished"""
+        return CrawlEstimate(
+            participants=self.participants + other.participants,
+            requests=self.requests + other.requests,
+            seconds=self.seconds + other.seconds,
+            expected_posts=self.expected_posts + other.expected_posts,
+            participants_without_history=(self.participants_without_history +
+                                          other.participants_without_history))
+
+
+def ended_rounds(campaign_path):
+    """Yield data of ended rounds of a campaign from newest to oldest"""
+    round_numbers = sorted(
+        (int(path.name) for path in campaign_path.iterdir()
+         if path.is_dir() and path.name.isdigit() and (path / 'round.json').is_file()),
+        reverse=True)
+    for round_number in round_numbers:
+        round_dict = loads((campaign_path / str(round_number) / 'round.json').read_text())
+        if round_dict.get('ended'):
+            yield round_dict
+
+
+def post_rates(campaign_path):
+    """Posts per second of each participant in the latest ended round they took part in"""
+    rates = {}
+    for round_dict in ended_rounds(campaign_path):
+        duration = (round_dict.get('round_end') or 0) - (round_dict.get('round_start') or 0)
+        if duration <= 0:
+            continue
+        for uid, participant in (round_dict.get('participants') or {}).items():
+            if uid not in rates and isinstance(participant.get('posts_made'), int):
+                rates[uid] = participant['posts_made'] / duration
+    return rates
+
+
+def round_post_rates(participants, latest):
+    """Posts per second of round participants during the round so far judged by the
+    post count of their latest snapshot compared to the start of the round"""
+    rates = {}
+    for uid, snapshot in latest.items():
+        participant = participants.get(uid) or {}
+        start_post_count = participant.get('start_post_count')
+        duration = (snapshot.get('time') or 0) - (participant.get('start_time') or 0)
+        if (participant.get('known_start_info') and isinstance(start_post_count, int) and
+                isinstance(snapshot.get('post_count'), int) and duration > 0):
+            rates[uid] = max(0, snapshot['post_count'] - start_post_count) / duration
+    return rates
+
+
+def participant_post_rates(campaign_path, participants, latest):
+    """Posts per second of round participants judged by their latest snapshot of the
+    round, or else by the latest ended round they took part in"""
+    return {**post_rates(campaign_path), **round_post_rates(participants, latest)}
+
+
+def default_post_rate(rates):
+    """Posts per second of participants without a rate of their own"""
+    return statistics.median(rates.values()) if rates else DEFAULT_POSTS_PER_DAY / 86400
+
+
+def posts_pages(posts):
+    """Pages of posts requested by the posts spider, which stops at the first page
+    having a post older than start of the round"""
+    return posts // POSTS_PER_PAGE + 1
+
+
+def count_pages(posts):
+    """Pages requested by the post count spider galloping to the boundary page and
+    then searching it with binary search"""
+    return 2 * math.ceil(math.log2(posts_pages(posts) + 1)) + 1
+
+
+def spider_runs(posts, count_only=False, verify_count=False):
+    """Pages requested by each spider run of a participant expected to have made
+    posts, which is None if only the profile is crawled"""
+    runs = [1]
+    if posts is not None:
+        if count_only or verify_count:
+            runs.append(count_pages(posts))
+        if not count_only or verify_count:
+            runs.append(posts_pages(posts))
+    return runs
+
+
+def spider_seconds(requests, latency=DEFAULT_LATENCY):
+    """Seconds a spider takes to make requests one after another with AutoThrottle"""
+    delay = AUTOTHROTTLE_START_DELAY
+    seconds = 0.0
+    target_delay = latency / AUTOTHROTTLE_TARGET_CONCURRENCY
+    for i in range(requests):
+        seconds += latency if i == 0 else max(delay, latency)
+        delay = min(max(target_delay, (delay + target_delay) / 2), AUTOTHROTTLE_MAX_DELAY)
+    return seconds
+
+
+def estimate_crawl(tasks, now, rates=None, count_only=False, verify_count=False,
+                   concurrency=WORKER_CONCURRENCY, latency=DEFAULT_LATENCY):
+    """Estimate crawling (uid, start_timestamp) tasks where start_timestamp is None
+    if only profile is crawled. Rates are posts per second by UID. Every spider also
+    requests robots.txt of bitcointalk."""
+    rates = rates or {}
+    default_rate = default_post_rate(rates)
+    requests = 0
+    spider_time = 0.0
+    longest = 0.0
+    expected_posts = 0
+    without_history = 0
+    for uid, start_timestamp in tasks:
+        posts = None
+        if start_timestamp is not None:
+            if (rate := rates.get(str(uid))) is None:
+                without_history += 1
+                rate = default_rate
+            posts = int(rate * max(0, now - start_timestamp))
+            expected_posts += posts
+        for pages in spider_runs(posts, count_only, verify_count):
+            seconds = spider_seconds(pages + 1, latency)
+            requests += pages + 1
+            spider_time += seconds
+            longest = max(longest, seconds)
+    return CrawlEstimate(
+        participants=len(tasks), requests=requests,
+        seconds=max(spider_time / max(1, concurrency), longest),
+        expected_posts=expected_posts, participants_without_history=without_history)
+
+
+def longest_first(tasks, now, rates=None, count_only=False, verify_count=False,
+                  latency=DEFAULT_LATENCY):
+    """(uid, start_timestamp) tasks ordered by estimated seconds of crawling them,
+    longest first. Crawls started in this order and taken by whichever crawler is
+    free first end close to the same time. Tasks estimated equal keep their order."""
+    rates = rates or {}
+    default_rate = default_post_rate(rates)
+    def seconds(task):
+        uid, start_timestamp = task
+        posts = None
+        if start_timestamp is not None:
+            posts = int(rates.get(str(uid), default_rate) * max(0, now - start_timestamp))
+        return sum(spider_seconds(pages + 1, latency)
+                   for pages in spider_runs(posts, count_only, verify_count))
+    return sorted(tasks, key=seconds, reverse=True)
@@ -0,0 +1,137 @@
+"""Posts of round participants collected from the recent posts of the whole forum.
+
+Each poll walks the recent posts listing from the newest post back to the previous poll
+and appends posts of round participants into feed_posts/UID.jl of the round folder, so
+the amount of requests depends on how much the forum posts instead of how many
+participants the round has. Forum only lists a limited amount of recent posts, so a
+poll which could not reach the previous one leaves a gap. feed_polls.jl records what
+each poll covered. When the round ends, posts of participants are crawled one by one
+only from the first gap onwards, or not at all if the feed has no gaps."""
+import calendar
+import json
+import logging
+import time
+
+from snapshots import post_key
+from utils import post_from_item
+
+logger = logging.getLogger(__name__)
+
+FEED_POLLS_FILE = 'feed_polls.jl'
+FEED_POSTS_FOLDER = 'feed_posts'
+# Posts made this long before previous poll are looked for again incase
+# they were not yet listed when it was made
+FEED_OVERLAP_SECONDS = 300
+
+
+def utc_timestamp(datetime_utc):
+    """Timestamp of a datetime_utc string of a post"""
+    return calendar.timegm(time.strptime(datetime_utc, "%Y-%m-%dT%H:%M:%SZ"))
+
+
+def read_feed_polls(round_folder):
+    """Yield poll records of a round from oldest to newest"""
+    path = round_folder / FEED_POLLS_FILE
+    if not path.is_file():
+        return
+    with path.open('r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def has_feed(round_folder):
+    """Check if recent posts have been polled for the round"""
+    return (round_folder / FEED_POLLS_FILE).is_file()
+
+
+def feed_posts_path(round_folder, uid):
+    """Path of file containing posts of participant found by polls"""
+    return round_folder / FEED_POSTS_FOLDER / f"{uid}.jl"
+
+
+def feed_posts(round_folder, uid):
+    """Yield posts of participant found by polls"""
+    path = feed_posts_path(round_folder, uid)
+    if not path.is_file():
+        return
+    with path.open('r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def poll_start_timestamp(round_folder, round_start):
+    """Timestamp from which recent posts need to be walked by the next poll"""
+    polls = list(read_feed_polls(round_folder))
+    if not polls:
+        return round_start
+    return max(round_start, polls[-1]['time'] - FEED_OVERLAP_SECONDS)
+
+
+def covered_until(round_folder, round_start):
+    """Timestamp until which polls have found every post made since round_start"""
+    until = round_start
+    for poll in read_feed_polls(round_folder):
+        covered_from = poll['start_timestamp'] if poll['complete'] else poll['oldest']
+        if covered_from is None or covered_from > until:
+            break
+        until = max(until, poll['time'])
+    return until
+
+
+def feed_crawl_start_timestamp(start_timestamp, until, round_end):
+    """Timestamp from which posts of participant still need to be crawled one by one,
+    None if the feed has all of them"""
+    if until >= round_end:
+        return None
+    return max(start_timestamp, until - FEED_OVERLAP_SECONDS)
+
+
+def save_feed_poll(round_folder, participants, items, start_timestamp, now):
+    """Append posts of participants found by a poll and record what it covered.
+    Items are posts scraped by the recent spider. Returns amount of new posts."""
+    oldest = None
+    complete = False
+    new_posts = {}
+    for item in items:
+        timestamp = utc_timestamp(item['datetime_utc'])
+        if timestamp < start_timestamp:
+            complete = True
+            continue
+        oldest = timestamp if oldest is None else min(oldest, timestamp)
+        if (uid := str(item.get('uid'))) in participants:
+            new_posts.setdefault(uid, []).append(post_from_item(item))
+    added = 0
+    for uid, posts in new_posts.items():
+        seen = {post_key(post) for post in feed_posts(round_folder, uid)}
+        path = feed_posts_path(round_folder, uid)
+        path.parent.mkdir(exist_ok=True)
+        with path.open('a') as f:
+            for post in posts:
+                if (key := post_key(post)) not in seen:
+                    seen.add(key)
+                    f.write(json.dumps(post) + '\n')
+                    added += 1
+    if not complete:
+        logger.warning("Recent posts did not reach back to %s, posts before %s are "
+                       "crawled for each participant", start_timestamp, oldest)
+    with (round_folder / FEED_POLLS_FILE).open('a') as f:
+        f.write(json.dumps({'time': now, 'start_timestamp': start_timestamp,
+                            'oldest': oldest, 'complete': complete,
+                            'new_posts': added}) + '\n')
+    return added
+
+
+def merge_feed_posts(round_folder, uid, posts, start_time):
+    """Yield posts found by polls made after start_time of participant
+    followed by crawled posts not found by polls"""
+    seen = set()
+    for post in feed_posts(round_folder, uid):
+        if utc_timestamp(post['datetime_utc']) >= start_time:
+            seen.add(post_key(post))
+            yield post
+    for post in posts:
+        if (key := post_key(post)) not in seen:
+            seen.add(key)
+            yield post
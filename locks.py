@@ -0,0 +1,75 @@
+"""Advisory locks keeping commands run at the same time from losing each others updates.
+
+Each campaign and each round has a lock file in the campaign folder. Commands reading
+data take a shared lock and commands changing it take an exclusive lock for the whole
+read-modify-write, so different campaigns and rounds are never waited for. When both
+are needed, campaign lock is taken before round lock. A command waiting for a lock
+longer than the timeout fails with LockTimeoutError. Locks are not used on platforms
+without fcntl."""
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_LOCK_TIMEOUT = 60
+LOCK_POLL_INTERVAL = 0.05
+
+
+class LockTimeoutError(Exception):
+    """Raised when a lock could not be taken within the timeout"""
+
+
+@contextmanager
+def file_lock(path, exclusive=True, timeout=DEFAULT_LOCK_TIMEOUT, description=None):
+    """Hold a shared or exclusive lock of the file at path. Timeout 0 fails at once
+    if the lock is held by another command and None waits for as long as needed."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(f, operation | fcntl.LOCK_NB)
+                break
+            except BlockingIOError as error:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise LockTimeoutError(
+                        f"{description or path} is in use by another command. "
+                        "Try again after it has finished.") from error
+                time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def campaign_lock(campaign_path, exclusive=True, timeout=DEFAULT_LOCK_TIMEOUT):
+    """Lock of metadata.json of a campaign"""
+    return file_lock(campaign_path / '.campaign.lock', exclusive, timeout,
+                     f"Campaign {campaign_path.name}")
+
+
+def round_lock(campaign_path, round_number, exclusive=True, timeout=DEFAULT_LOCK_TIMEOUT):
+    """Lock of a round of a campaign. The lock file is in the campaign folder
+    so that it can be taken before the round folder is created."""
+    return file_lock(campaign_path / f".round_{round_number}.lock", exclusive, timeout,
+                     f"Round {round_number} of campaign {campaign_path.name}")
+
+
+def write_atomically(path, text):
+    """Write text into a temporary file and replace path with it so that
+    readers never see a partially written file. Text may also be an iterable
+    of strings written one after another."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open('w') as f:
+        for chunk in [text] if isinstance(text, str) else text:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
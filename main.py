@@ -2,7 +2,12 @@
 import logging
 from pathlib import Path
 
-from core import add_campaign, add_participant, remove_participant, add_round, end_round, round_to_csv, add_round_participant, add_payment_address, add_round_payment_address
+from crawl_pool import default_worker_count
+from work_queue import run_queue_worker, DEFAULT_LEASE_SECONDS
+from post_rules import RULES
+from locks import LockTimeoutError, DEFAULT_LOCK_TIMEOUT
+from circuit_breaker import DEFAULT_MAX_PAUSE
+from core import add_campaign, add_participant, remove_participant, add_round, end_round, rollover_round, round_to_csv, add_round_participant, add_payment_address, add_round_payment_address, set_post_rule, snapshot_round, round_curves, round_quotes, poll_round_feed, verify_round_posts, resolve_usernames, enroll_from_topic, lookup_participant, shared_payment_addresses, rebuild_participant_index
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +18,13 @@ if __name__ == '__main__':
     arg_parser.add_argument('--data_folder', type=Path, help=
                             'Folder where campaign related date is saved. '
                             'By default the current path.')
+    arg_parser.add_argument('--lock_timeout', type=float, default=DEFAULT_LOCK_TIMEOUT, help=
+                            'Seconds to wait for a campaign or round used by another '
+                            'command. 0 fails at once. Default %(default)s.')
+    arg_parser.add_argument('--max_pause', type=float, default=DEFAULT_MAX_PAUSE, help=
+                            'Seconds to pause crawling while bitcointalk is down or serving '
+                            'a challenge page before stopping. 0 stops at once. '
+                            'Default %(default)s.')
     subparsers = arg_parser.add_subparsers(dest='command', required=True,
                                            help="choose resource to work on")
 
@@ -43,19 +55,58 @@ if __name__ == '__main__':
         func=add_payment_address
     )
 
+    enroll_subparser = campaign_subparser.add_parser(
+        'enroll', parents=[campaign_common_args],
+        help='add applicants replying to the signup topic with a payment address')
+    enroll_subparser.add_argument('--topic', type=int, help=
+                                  'ID of the signup topic. Needed only the first time.')
+    enroll_subparser.set_defaults(func=enroll_from_topic)
+
     remove_participant_subparser = campaign_subparser.add_parser(
         'remove_participant', parents=[campaign_common_args])
     remove_participant_subparser.add_argument(
         'uid', type=int, help="bitcointalk uid of participant")
     remove_participant_subparser.set_defaults(func=remove_participant)
 
+    set_post_rule_subparser = campaign_subparser.add_parser(
+        'set_post_rule', parents=[campaign_common_args])
+    set_post_rule_subparser.add_argument('rule', choices=RULES.keys(), help='name of the rule')
+    set_post_rule_subparser.add_argument(
+        'value', help='value of the rule. 0 or false removes the rule')
+    set_post_rule_subparser.set_defaults(func=set_post_rule)
+
     round_parser = subparsers.add_parser('round', help='round related actions')
     round_common_args = argparse.ArgumentParser(add_help=False)
     round_common_args.add_argument('campaign_name', help='name of the campaign')
     round_common_args.add_argument('round_number', type=int, help='number of the round')
     round_subparser = round_parser.add_subparsers(dest='action', required=True)
 
-    add_round_subparser = round_subparser.add_parser('add', parents=[round_common_args])
+    round_workers_args = argparse.ArgumentParser(add_help=False)
+    round_workers_args.add_argument('--workers', type=int, nargs='?', const=default_worker_count(),
+                                    help='crawl participants using this many worker processes. '
+                                    'Amount of CPU cores used if no number is given.')
+    round_workers_args.add_argument('--queue', type=Path, help=
+                                    'crawl participants by putting tasks into the work queue at '
+                                    'this path and waiting for workers (main.py worker) to do them')
+
+    round_budget_args = argparse.ArgumentParser(add_help=False)
+    round_budget_args.add_argument('--dry_run', action='store_true', help=
+                                   'only estimate amount of requests and time needed '
+                                   'without fetching anything')
+    round_budget_args.add_argument('--max_requests', type=int, help=
+                                   'stop after this many requests and save progress so that '
+                                   'running the command again continues from there')
+
+    round_count_args = argparse.ArgumentParser(add_help=False)
+    round_count_args.add_argument('--count_only', action='store_true', help=
+                                  'only count posts made during round by searching for '
+                                  'the page where round started instead of fetching all posts')
+    round_count_args.add_argument('--verify_count', action='store_true', help=
+                                  'with --count_only, also fetch all posts and '
+                                  'use their amount if counts differ')
+
+    add_round_subparser = round_subparser.add_parser(
+        'add', parents=[round_common_args, round_workers_args, round_budget_args])
     add_round_subparser.set_defaults(func=add_round)
     add_round_subparser.add_argument('--round_start', type=int, help=
                                      'timestamp of when round started (seconds since epoch). '
@@ -71,9 +122,16 @@ if __name__ == '__main__':
     )
     add_round_participant_subparser.set_defaults(func=add_round_participant)
 
-    end_round_subparser = round_subparser.add_parser('end', parents=[round_common_args])
+    end_round_subparser = round_subparser.add_parser(
+        'end', parents=[round_common_args, round_workers_args, round_budget_args,
+                        round_count_args])
     end_round_subparser.set_defaults(func=end_round)
 
+    rollover_round_subparser = round_subparser.add_parser(
+        'rollover', parents=[round_common_args, round_workers_args, round_budget_args,
+                             round_count_args])
+    rollover_round_subparser.set_defaults(func=rollover_round)
+
     add_round_payment_address_subparser = round_subparser.add_parser(
         'add_payment_address', parents=[round_common_args]
     )
@@ -89,6 +147,77 @@ if __name__ == '__main__':
     round_csv_subparser = round_subparser.add_parser('round_to_csv', parents=[round_common_args])
     round_csv_subparser.set_defaults(func=round_to_csv)
 
+    snapshot_round_subparser = round_subparser.add_parser(
+        'snapshot', parents=[round_common_args, round_workers_args])
+    snapshot_round_subparser.set_defaults(func=snapshot_round)
+
+    round_feed_subparser = round_subparser.add_parser(
+        'feed', parents=[round_common_args],
+        help='save posts of participants from the recent posts of the whole forum')
+    round_feed_subparser.set_defaults(func=poll_round_feed)
+
+    round_verify_subparser = round_subparser.add_parser(
+        'verify_posts', parents=[round_common_args],
+        help='find posts of an ended round which were deleted or edited afterwards')
+    round_verify_subparser.set_defaults(func=verify_round_posts)
+
+    round_curves_subparser = round_subparser.add_parser('curves', parents=[round_common_args])
+    round_curves_subparser.set_defaults(func=round_curves)
+
+    round_quotes_subparser = round_subparser.add_parser('quotes', parents=[round_common_args])
+    round_quotes_subparser.add_argument('--min_quotes', type=int, default=1, help=
+                                        'quotes needed from one participant to another '
+                                        'for them to count as quoting each other')
+    round_quotes_subparser.set_defaults(func=round_quotes)
+
+    member_parser = subparsers.add_parser('member', help='bitcointalk member related actions')
+    member_subparser = member_parser.add_subparsers(dest='action', required=True)
+
+    resolve_subparser = member_subparser.add_parser(
+        'resolve', help='print UIDs of usernames, crawling only names not seen before')
+    resolve_subparser.add_argument('names', nargs='*', help='usernames to resolve')
+    resolve_subparser.add_argument('--file', type=Path, help='file with a username on each line')
+    resolve_subparser.set_defaults(func=resolve_usernames)
+
+    participant_parser = subparsers.add_parser(
+        'participant', help='participants across all campaigns of the data folder')
+    participant_subparser = participant_parser.add_subparsers(dest='action', required=True)
+
+    lookup_subparser = participant_subparser.add_parser(
+        'lookup', help='print campaigns and rounds of a UID and UIDs using a payment address')
+    lookup_subparser.add_argument('--uid', type=int, help='bitcointalk uid of participant')
+    lookup_subparser.add_argument('--payment_address', help='payment address to look up')
+    lookup_subparser.set_defaults(func=lookup_participant)
+
+    shared_addresses_subparser = participant_subparser.add_parser(
+        'shared_addresses', help='print payment addresses used by more than one UID')
+    shared_addresses_subparser.set_defaults(func=shared_payment_addresses)
+
+    rebuild_index_subparser = participant_subparser.add_parser(
+        'rebuild_index', help='index participants of all campaigns again, '
+                              'e.g. after editing files by hand')
+    rebuild_index_subparser.set_defaults(func=rebuild_participant_index)
+
+    worker_parser = subparsers.add_parser(
+        'worker', help='crawl tasks from a work queue shared with round add/end --queue')
+    worker_parser.add_argument('queue', type=Path, help='path of the work queue database')
+    worker_parser.add_argument('--worker_id', help='name of the worker. By default hostname-pid')
+    worker_parser.add_argument('--lease', type=int, default=DEFAULT_LEASE_SECONDS, help=
+                               'seconds a claimed task is reserved before other workers may take it')
+    worker_parser.add_argument('--poll_interval', type=int, default=10, help=
+                               'seconds to wait before checking the queue again when it is empty')
+    worker_parser.add_argument('--exit_when_empty', action='store_true', help=
+                               'stop when there are no tasks instead of waiting for more')
+    worker_parser.add_argument('--clear', nargs=3,
+                               metavar=('CAMPAIGN_NAME', 'ROUND_NUMBER', 'STAGE'), help=
+                               'remove tasks of a round from the queue instead of crawling, '
+                               'so that failed tasks can be tried again')
+    worker_parser.set_defaults(func=run_queue_worker)
+
     ns = arg_parser.parse_args()
-    ns.func(ns)
+    try:
+        ns.func(ns)
+    except LockTimeoutError as error:
+        print(error)
+        raise SystemExit(1)
     
\ No newline at end of file
@@ -0,0 +1,1046 @@
+"""Asynchronous API for using the campaign manager from other programs.
+
+CampaignManager runs the spiders in the calling process on the running asyncio event
+loop instead of starting a crawler subprocess for every profile, so participants are
+crawled concurrently while other tasks of the caller keep running. Scrapy uses the
+asyncio reactor which is installed on the event loop of the first crawl. A reactor
+cannot be restarted, so all crawls of a process need to be made on that event loop.
+Command line handlers of core are thin wrappers running these methods with asyncio.run."""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+
+from records import (Participant, RoundParticipant, dumps, loads,
+                     round_participants_from_dict)
+from estimate import estimate_crawl, longest_first, participant_post_rates
+from work_queue import START_STAGE
+from utils import (try_uid_to_int, try_timestamp_to_int, profile_from_items,
+                   post_count_from_items, post_from_item, post_message_id,
+                   CrawlerResultError, ScrapingError)
+from post_rules import compile_rules, evaluate_posts, POST_RULES_KEY, POSTS_MADE_KEY
+from quote_graph import QuoteGraph, quote_graph_path
+from post_cache import PostCache, post_cache_path
+from post_sketch import PostingSketch, sketching, POSTING_SKETCH_KEY
+from member_index import MemberIndex, member_index_path
+from enrollment import (read_enrollment, write_enrollment, parse_application,
+                        append_applications, ENROLLED, ALREADY_PARTICIPATING)
+from snapshots import latest_snapshots, crawl_start_timestamp, merge_snapshot_posts
+from feed import (has_feed, covered_until, poll_start_timestamp, feed_crawl_start_timestamp,
+                  save_feed_poll, merge_feed_posts)
+from locks import campaign_lock, round_lock, DEFAULT_LOCK_TIMEOUT
+from circuit_breaker import CircuitBreaker, describe_forum_state, DEFAULT_MAX_PAUSE
+from bitcointalk_scraper.bitcointalk.forum_health import FORUM_OK, FORUM_UNREACHABLE
+from core import (read_metadata, write_metadata, read_round_data, write_round_data,
+                  campaign_exists, campaign_folder_path, campaign_has_participants,
+                  campaign_participants, round_exists, round_folder_path,
+                  round_participant_from_profile, finalize_round_participant,
+                  PARTICIPANTS_KEY, CAMPAIGN_NAME_KEY)
+
+logger = logging.getLogger(__name__)
+
+SCRAPER_PATH = Path(__file__).resolve().parent / 'bitcointalk_scraper'
+DEFAULT_CONCURRENCY = 8
+FINALIZED_FILE = 'finalized.jl'
+# Times a spider is run again after the forum failed it before giving up
+MAX_CRAWL_ATTEMPTS = 3
+
+
+class CampaignManagerError(Exception):
+    """Represents errors such as adding a round that already exists"""
+
+
+class RequestBudgetExceeded(CampaignManagerError):
+    """Raised when a round could not be added or ended within the request budget.
+    Crawled participants are saved into a checkpoint and the next try continues from it."""
+
+
+@dataclass
+class Profile:
+    """Bitcointalk profile of a user"""
+    uid: int
+    name: str
+    rank: str
+    post_count: int
+    activity: int
+    merit: int
+
+    @classmethod
+    def from_dict(cls, profile):
+        return cls(uid=profile.get('uid'), name=profile.get('name'),
+                   rank=profile.get('rank'), post_count=profile.get('post_count'),
+                   activity=profile.get('activity'), merit=profile.get('merit'))
+
+
+@dataclass
+class CrawlResult:
+    """Profile of a participant and result of evaluating posts made after start
+    timestamp. posts_result is None if posts were not crawled."""
+    uid: str
+    profile: Profile
+    posts_result: dict | None
+
+
+@dataclass
+class Round:
+    """Round of a campaign. Participants are RoundParticipant records by UID."""
+    campaign_name: str
+    round_number: int
+    ended: bool
+    round_start: int
+    round_end: int | None
+    participants: dict
+
+    @classmethod
+    def from_dict(cls, round_dict):
+        return cls(campaign_name=round_dict.get(CAMPAIGN_NAME_KEY),
+                   round_number=round_dict.get('round_number'),
+                   ended=round_dict.get('ended'),
+                   round_start=round_dict.get('round_start'),
+                   round_end=round_dict.get('round_end'),
+                   participants=round_participants_from_dict(
+                       round_dict.get(PARTICIPANTS_KEY) or {}))
+
+
+@dataclass
+class RoundSummary:
+    """Ended round with totals of its participants counted while they were written,
+    so that participants do not need to be read back"""
+    campaign_name: str
+    round_number: int
+    round_start: int
+    round_end: int
+    participants: int = 0
+    posts_made: int = 0
+
+    @classmethod
+    def from_dict(cls, round_dict):
+        return cls(campaign_name=round_dict.get(CAMPAIGN_NAME_KEY),
+                   round_number=round_dict.get('round_number'),
+                   round_start=round_dict.get('round_start'),
+                   round_end=round_dict.get('round_end'))
+
+
+    def counting(self, participants):
+        """Yield (uid, round participant dict) of participants counting them"""
+        for uid, round_participant in participants:
+            self.participants += 1
+            self.posts_made += round_participant.get('posts_made') or 0
+            yield uid, round_participant
+
+
+def end_round_tasks(round_folder, round_dict, latest, use_feed, round_end):
+    """(uid, start_timestamp) crawl tasks of ending a round. Posts found by the latest
+    snapshot of a participant or by the recent posts feed are not crawled again.
+    Start is None if the feed has every post of the participant."""
+    participants = round_dict.get(PARTICIPANTS_KEY) or {}
+    until = covered_until(round_folder, round_dict.get('round_start')) if use_feed else None
+    tasks = []
+    for uid in participants:
+        start_timestamp = crawl_start_timestamp(participants[uid], latest.get(uid))
+        if until is not None:
+            start_timestamp = feed_crawl_start_timestamp(start_timestamp, until, round_end)
+        tasks.append((uid, start_timestamp))
+    return tasks
+
+
+def end_profiles(participants, profiles):
+    """Yield (uid, round participant dict) of participants of an ended round putting
+    their end profiles into profiles by UID"""
+    for uid, round_participant in participants:
+        if round_participant.get('end_post_count') is not None:
+            profiles[uid] = end_profile(round_participant)
+        yield uid, round_participant
+
+
+def end_profile(round_participant):
+    """Profile stats of a participant of an ended round at the end of the round.
+    Rounds ended before end name and rank were recorded have only the start ones."""
+    return {'uid': round_participant.get('uid'),
+            'name': round_participant.get('end_name') or round_participant.get('name'),
+            'rank': round_participant.get('end_rank') or round_participant.get('rank'),
+            'post_count': round_participant.get('end_post_count'),
+            'activity': round_participant.get('end_activity'),
+            'merit': round_participant.get('end_merit')}
+
+
+class Checkpoint:
+    """Crawl results of adding or ending a round saved when the request budget ran out"""
+    def __init__(self, campaign_path, round_number, stage):
+        self.path = campaign_path / f".checkpoint_{round_number}_{stage}.jl"
+
+
+    def read(self):
+        """Time the round was first tried to be added or ended, or None if
+        there is no checkpoint, and crawl results by UID"""
+        if not self.path.is_file():
+            return None, {}
+        with self.path.open('r') as f:
+            lines = [loads(line) for line in f if line.strip()]
+        results = {
+            line['uid']: CrawlResult(line['uid'], Profile(**line['profile']),
+                                     line['posts_result'])
+            for line in lines[1:]
+        }
+        return lines[0]['time'], results
+
+
+    def save(self, started, results):
+        """Save time the round was first tried to be added or ended and crawl results"""
+        with self.path.open('w') as f:
+            f.write(dumps({'time': started}) + '\n')
+            for result in results:
+                f.write(dumps({'uid': result.uid, 'profile': vars(result.profile),
+                               'posts_result': result.posts_result}) + '\n')
+
+
+    def remove(self):
+        """Remove checkpoint after the round has been added or ended"""
+        self.path.unlink(missing_ok=True)
+
+
+class FinalizedParticipants:
+    """Participants of an ending round appended into finalized.jl of the round folder
+    as soon as each of them has been crawled, so results are visible while the round
+    is ending. First line has the time the round was ended. If ending stops before
+    all participants are finalized, the next try continues from the rest."""
+    def __init__(self, round_folder):
+        self.path = round_folder / FINALIZED_FILE
+
+
+    def read(self):
+        """Time the round was first tried to be ended, or None if it has not,
+        and UIDs of finalized participants"""
+        started = None
+        uids = set()
+        for record in self.records():
+            if started is None:
+                started = record['time']
+            else:
+                uids.add(str(record['uid']))
+        return started, uids
+
+
+    def records(self):
+        """Yield lines of the file. Line being written when ending stopped is skipped."""
+        if not self.path.is_file():
+            return
+        with self.path.open('r') as f:
+            for line in f:
+                if line.endswith('\n'):
+                    yield loads(line)
+
+
+    def start(self, started):
+        """Create the file unless ending continues from an earlier try"""
+        if not self.path.is_file():
+            with self.path.open('w') as f:
+                f.write(dumps({'time': started}) + '\n')
+            return
+        # Drop a partially written last line so that new lines start on a line of their own
+        with self.path.open('rb+') as f:
+            content_end = f.seek(0, os.SEEK_END)
+            position = content_end
+            while position > 0:
+                f.seek(position - 1)
+                if f.read(1) == b'\n':
+                    break
+                position -= 1
+            if position < content_end:
+                f.truncate(position)
+
+
+    def append(self, round_participant):
+        """Append a finalized round participant"""
+        with self.path.open('a') as f:
+            f.write(dumps(round_participant.to_dict()) + '\n')
+
+
+    def participants(self, uids):
+        """Yield (uid, round participant dict) of finalized participants in the order
+        of uids. Only offsets of the lines are kept in memory while they are read."""
+        offsets = {}
+        with self.path.open('rb') as f:
+            f.readline()
+            while (line := f.readline()).endswith(b'\n'):
+                offsets[str(loads(line)['uid'])] = f.tell() - len(line)
+            for uid in uids:
+                if (offset := offsets.get(uid)) is not None:
+                    f.seek(offset)
+                    yield uid, loads(f.readline())
+
+
+    def remove(self):
+        """Remove the file after round.json has been written"""
+        self.path.unlink(missing_ok=True)
+
+
+class SpiderRunner:
+    """Runs spiders of bitcointalk_scraper on the running asyncio event loop and
+    collects the items they scrape. At most concurrency spiders run at the same time.
+    Amount of requests made by finished spiders is kept in requests and amount of
+    items they dropped as invalid in dropped_items.
+
+    Crawls go through a circuit breaker. A crawl during which the forum did not answer
+    normally, e.g. it served a challenge page, is a failure and is run again once the
+    breaker lets it. If preflight is True, the forum is probed before the first crawl."""
+    # Event loop the reactor was installed on, shared by all runners of the process
+    reactor_loop = None
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, breaker=None, preflight=False):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.runner = None
+        self.requests = 0
+        self.dropped_items = 0
+        self.breaker = breaker or CircuitBreaker()
+        self.preflight = preflight
+        self.preflight_check = None
+
+
+    def start(self):
+        """Install the asyncio reactor on the running event loop and start it"""
+        if self.runner is not None:
+            return
+        if str(SCRAPER_PATH) not in sys.path:
+            sys.path.append(str(SCRAPER_PATH))
+        # Scrapy is only imported here so that the reactor gets installed on the running loop
+        from scrapy.crawler import CrawlerRunner
+        from scrapy.settings import Settings
+        from scrapy.utils.reactor import install_reactor, is_asyncio_reactor_installed
+        settings = Settings()
+        settings.setmodule('bitcointalk_scraper.settings', priority='project')
+        loop = asyncio.get_running_loop()
+        if SpiderRunner.reactor_loop is None:
+            # Asyncio reactor is installed on the event loop running this coroutine
+            install_reactor(settings['TWISTED_REACTOR'])
+            SpiderRunner.reactor_loop = loop
+        if not is_asyncio_reactor_installed() or SpiderRunner.reactor_loop is not loop:
+            raise ScrapingError(
+                "Spiders can only be run on the event loop where the first crawl was made")
+        from twisted.internet import reactor
+        if not reactor.running:
+            # Reactor is never stopped so its threads must not keep the process alive
+            reactor.getThreadPool().threadFactory = partial(threading.Thread, daemon=True)
+            # The event loop is already running, so instead of reactor.run() only the
+            # startup event is fired, which starts the reactor and its thread pool
+            reactor.fireSystemEvent('startup')
+        self.runner = CrawlerRunner(settings)
+
+
+    async def run(self, spider_name, on_item=None, **kwargs):
+        """Run a spider with given arguments and return the items it scraped.
+        If on_item is given, it is called with each item as it is scraped instead.
+        Such crawls are not run again if the forum fails them, as items were handled."""
+        await self.check_forum()
+        for _ in range(MAX_CRAWL_ATTEMPTS):
+            await self.breaker.wait(self.probe)
+            async with self.semaphore:
+                items, forum_state = await self.crawl(spider_name, on_item, kwargs)
+            if forum_state == FORUM_OK:
+                self.breaker.record_success()
+                return items
+            self.breaker.record_failure(forum_state)
+            if on_item is not None:
+                break
+        raise ScrapingError(f"Crawling {spider_name} {kwargs} failed as bitcointalk "
+                            f"was {describe_forum_state(forum_state)}")
+
+
+    async def crawl(self, spider_name, on_item, kwargs):
+        """Run a spider and return its items and the state of the forum
+        judged by the latest response. Items dropped by the item pipelines as
+        invalid are logged and counted in dropped_items."""
+        from scrapy import signals
+        from scrapy.utils.defer import deferred_to_future
+        from itemadapter import ItemAdapter
+        self.start()
+        items = []
+        handle_item = on_item or items.append
+        crawler = self.runner.create_crawler(spider_name)
+        crawler.signals.connect(
+            lambda item: handle_item(ItemAdapter(item).asdict()),
+            signal=signals.item_scraped, weak=False)
+        await deferred_to_future(self.runner.crawl(crawler, **kwargs))
+        self.requests += crawler.stats.get_value('downloader/request_count', 0)
+        if dropped := crawler.stats.get_value('item_dropped_count', 0):
+            logger.warning("%s items scraped by %s %s were invalid and dropped",
+                           dropped, spider_name, kwargs)
+            self.dropped_items += dropped
+        return items, crawler.stats.get_value('forum/state', FORUM_OK)
+
+
+    async def probe(self):
+        """State of the forum judged by a single request"""
+        try:
+            items, _ = await self.crawl('probe', None, {})
+        except Exception as error:
+            logger.error("Probing bitcointalk failed: %s", error)
+            return FORUM_UNREACHABLE
+        return items[0]['state'] if items else FORUM_UNREACHABLE
+
+
+    async def check_forum(self):
+        """Probe the forum once before the first crawl if preflight is set. If it cannot
+        be crawled, the breaker is opened and crawls wait until it can."""
+        if not self.preflight:
+            return
+        if self.preflight_check is None:
+            self.preflight_check = asyncio.ensure_future(self._check_forum())
+        await asyncio.shield(self.preflight_check)
+
+
+    async def _check_forum(self):
+        """Probe the forum and wait for it to come back if needed"""
+        if (forum_state := await self.probe()) != FORUM_OK:
+            self.breaker.trip(forum_state)
+        await self.breaker.wait(self.probe)
+
+
+class CampaignManager:
+    """Manages campaigns in data_folder. Crawls are made on the running event loop
+    with at most concurrency spiders at the same time.
+
+    Round methods also accept a crawl function of crawl_pool or work_queue, which
+    is then run in a thread instead of crawling on the event loop.
+
+    Changes are made holding the locks of locks.py. Adding or ending a round holds
+    the round for the whole crawl, so other commands changing the round wait for
+    at most lock_timeout seconds and then fail with LockTimeoutError.
+
+    Crawls made in this process pause while the forum cannot be crawled and fail
+    with CircuitOpenError if it does not come back within max_pause seconds, see
+    circuit_breaker. If preflight is True, the forum is probed before crawling."""
+    def __init__(self, data_folder, concurrency=DEFAULT_CONCURRENCY,
+                 lock_timeout=DEFAULT_LOCK_TIMEOUT, max_pause=DEFAULT_MAX_PAUSE, preflight=False):
+        self.data_folder = Path(data_folder)
+        self.concurrency = concurrency
+        self.lock_timeout = lock_timeout
+        self.spiders = SpiderRunner(concurrency, CircuitBreaker(max_pause=max_pause), preflight)
+
+
+    async def fetch_profile(self, uid):
+        """Crawl bitcointalk profile of a user"""
+        uid = try_uid_to_int(uid)
+        profile = profile_from_items(await self.spiders.run('profile', uid=str(uid)), uid)
+        if profile is None:
+            raise CrawlerResultError(f"Profile of {uid} could not be crawled")
+        self.index_members([(profile['uid'], profile['name'])])
+        return Profile.from_dict(profile)
+
+
+    async def fetch_profile_by_name(self, name):
+        """Crawl bitcointalk profile of a user by username. Returns None if
+        there is no such user."""
+        items = await self.spiders.run('profile', username=name)
+        if not items:
+            return None
+        profile = Profile.from_dict(items[0])
+        # Forum finds users also by login name which may differ from the shown name
+        self.index_members([(profile.uid, name), (profile.uid, profile.name)])
+        return profile
+
+
+    async def fetch_profiles(self, uids):
+        """Crawl profiles of many users concurrently. Returns profiles by UID."""
+        uids = [str(uid) for uid in uids]
+        profiles = await asyncio.gather(*(self.fetch_profile(uid) for uid in uids))
+        return dict(zip(uids, profiles))
+
+
+    async def fetch_posts(self, uid, start_timestamp):
+        """Crawl posts of a user made after start_timestamp"""
+        items = await self.spiders.run(
+            'posts', uid=str(try_uid_to_int(uid)),
+            start_timestamp=str(try_timestamp_to_int(start_timestamp)))
+        return [post_from_item(item) for item in items]
+
+
+    async def fetch_recent_posts(self, start_timestamp):
+        """Crawl recent posts of the whole forum made after start_timestamp. The first
+        post older than it is included if the recent posts reached back to it."""
+        return await self.spiders.run(
+            'recent', start_timestamp=str(try_timestamp_to_int(start_timestamp)))
+
+
+    async def count_posts(self, uid, start_timestamp):
+        """Count posts of a user made after start_timestamp without crawling them all"""
+        items = await self.spiders.run(
+            'post_count', uid=str(try_uid_to_int(uid)),
+            start_timestamp=str(try_timestamp_to_int(start_timestamp)))
+        return post_count_from_items(items)
+
+
+    async def fetch_round_pages(self, uid, start_timestamp, end_timestamp,
+                                known_page_hashes=()):
+        """Crawl pages of posts of a user made between start_timestamp and
+        end_timestamp. Contents of pages with known hashes are not parsed."""
+        return await self.spiders.run(
+            'verify_posts', uid=str(try_uid_to_int(uid)),
+            start_timestamp=str(try_timestamp_to_int(start_timestamp)),
+            end_timestamp=str(try_timestamp_to_int(end_timestamp)),
+            known_page_hashes=','.join(known_page_hashes))
+
+
+    async def fetch_topic_posts(self, topic, start=0, after_message=0, on_item=None):
+        """Crawl replies of a topic from the page at offset start, skipping replies up
+        to message ID after_message. Replies are given to on_item as they are scraped
+        if it is given, otherwise they are returned."""
+        return await self.spiders.run(
+            'topic', on_item=on_item, topic=str(int(topic)), start=str(int(start)),
+            after_message=str(int(after_message)))
+
+
+    async def crawl_participant(self, uid, start_timestamp, count_only=False,
+                                verify_count=False, evaluate=None):
+        """Crawl profile of a participant and posts made after start_timestamp
+        unless it is None. Posts are given to evaluate(uid, posts) if given,
+        otherwise they are counted."""
+        uid = str(uid)
+        profile_task = asyncio.ensure_future(self.fetch_profile(uid))
+        posts_result = None
+        try:
+            if start_timestamp is not None:
+                posts_made = None
+                if count_only or verify_count:
+                    posts_made = await self.count_posts(uid, start_timestamp)
+                if count_only and not verify_count:
+                    posts_result = {POSTS_MADE_KEY: posts_made}
+                else:
+                    posts = iter(await self.fetch_posts(uid, start_timestamp))
+                    posts_result = (evaluate(uid, posts) if evaluate is not None
+                                    else evaluate_posts(posts))
+                    if posts_made is not None and posts_made != posts_result[POSTS_MADE_KEY]:
+                        logger.warning(
+                            "Post count for uid %s was %s but walking all pages found %s posts",
+                            uid, posts_made, posts_result[POSTS_MADE_KEY])
+            return CrawlResult(uid, await profile_task, posts_result)
+        finally:
+            if not profile_task.done():
+                profile_task.cancel()
+
+
+    async def crawl(self, tasks, count_only=False, verify_count=False, evaluate=None,
+                    crawl=None, max_requests=None, on_result=None):
+        """Crawl (uid, start_timestamp) tasks concurrently and return a CrawlResult
+        for each. If crawl function is given, it is used instead in a thread.
+        If max_requests is given, no more participants are started after that many
+        requests have been made, so some tasks may be left without a result.
+        If on_result is given, it is called with each result as soon as it is
+        crawled and results are not returned."""
+        tasks = list(tasks)
+        results = []
+        handle_result = on_result or results.append
+        if crawl is None:
+            pending = deque(tasks)
+            requests_before = self.spiders.requests
+            async def crawl_pending():
+                while pending and (max_requests is None or
+                                   self.spiders.requests - requests_before < max_requests):
+                    uid, start_timestamp = pending.popleft()
+                    handle_result(await self.crawl_participant(
+                        uid, start_timestamp, count_only, verify_count, evaluate))
+            await asyncio.gather(*(crawl_pending() for _ in range(self.concurrency)))
+            return results
+        if max_requests is not None:
+            raise CampaignManagerError(
+                "Request budget can only be used when crawling in this process")
+        if evaluate is not None:
+            crawl = partial(crawl, evaluate=evaluate)
+        # Worker processes do not share the breaker, but the forum is checked before them
+        await self.spiders.check_forum()
+        def crawl_in_thread():
+            members = []
+            try:
+                for uid, profile, posts_result in crawl(tasks):
+                    members.append((uid, profile.get('name')))
+                    handle_result(CrawlResult(str(uid), Profile.from_dict(profile),
+                                              posts_result))
+            finally:
+                self.index_members(members)
+        await asyncio.to_thread(crawl_in_thread)
+        return results
+
+
+    async def crawl_within_budget(self, checkpoint, started, tasks, crawled,
+                                  count_only=False, verify_count=False, evaluate=None,
+                                  crawl=None, max_requests=None):
+        """Crawl tasks not yet in crawled results of the checkpoint. If request budget
+        runs out, results are saved into the checkpoint and RequestBudgetExceeded raised.
+        Returns results of all tasks."""
+        uids = {str(uid) for uid, _ in tasks}
+        crawled = {uid: result for uid, result in crawled.items() if uid in uids}
+        if crawled:
+            print(f"Continuing from checkpoint with {len(crawled)} participants crawled")
+        for result in await self.crawl(
+                [task for task in tasks if str(task[0]) not in crawled], count_only,
+                verify_count, evaluate, crawl, max_requests):
+            crawled[result.uid] = result
+        if len(crawled) < len(uids):
+            checkpoint.save(started, crawled.values())
+            raise RequestBudgetExceeded(
+                f"Request budget of {max_requests} used with {len(crawled)}/{len(uids)} "
+                "participants crawled. Progress was saved, run again to continue.")
+        return list(crawled.values())
+
+
+    def estimate_add_round(self, campaign_name, concurrency=None):
+        """Estimate requests and time of adding a round without fetching anything"""
+        self.campaign_path(campaign_name)
+        participants = campaign_participants(self.data_folder, campaign_name) or {}
+        return estimate_crawl([(uid, None) for uid in participants], time.time(),
+                              concurrency=concurrency or self.concurrency)
+
+
+    def estimate_end_round(self, campaign_name, round_number, count_only=False,
+                           verify_count=False, concurrency=None):
+        """Estimate requests and time of ending a round without fetching anything.
+        Posts of participants are estimated from their post rate in earlier rounds."""
+        campaign_path = self.campaign_path(campaign_name)
+        round_dict = self.read_round(campaign_name, round_number)
+        round_folder = round_folder_path(campaign_path, round_number)
+        latest = latest_snapshots(round_folder) if not count_only else {}
+        now = int(time.time())
+        tasks = end_round_tasks(round_folder, round_dict, latest,
+                                not count_only and has_feed(round_folder), now)
+        rates = participant_post_rates(campaign_path, round_dict.get(PARTICIPANTS_KEY) or {},
+                                       latest or latest_snapshots(round_folder))
+        return estimate_crawl(tasks, now, rates, count_only, verify_count,
+                              concurrency or self.concurrency)
+
+
+    def estimate_rollover_round(self, campaign_name, round_number, count_only=False,
+                                verify_count=False, concurrency=None):
+        """Estimate requests and time of rolling a round over without fetching anything.
+        Profiles of campaign participants who were not in the round are crawled for the
+        next round after the round has ended."""
+        round_dict = self.read_round(campaign_name, round_number)
+        concurrency = concurrency or self.concurrency
+        if round_dict.get('ended'):
+            estimate = estimate_crawl([], time.time(), concurrency=concurrency)
+        else:
+            estimate = self.estimate_end_round(campaign_name, round_number, count_only,
+                                               verify_count, concurrency)
+        round_participants = round_dict.get(PARTICIPANTS_KEY) or {}
+        participants = campaign_participants(self.data_folder, campaign_name) or {}
+        return estimate.then(estimate_crawl(
+            [(uid, None) for uid in participants if uid not in round_participants],
+            time.time(), concurrency=concurrency))
+
+
+    def index_members(self, members):
+        """Save (uid, name) pairs of crawled users into the member index"""
+        if not members:
+            return
+        member_index = MemberIndex(member_index_path(self.data_folder))
+        try:
+            member_index.add(members)
+        finally:
+            member_index.close()
+
+
+    async def resolve_usernames(self, names):
+        """UIDs of many usernames at once by name. Names missing from the member index
+        are looked up by crawling their profiles, the UID of a name without a user is None."""
+        names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+        member_index = MemberIndex(member_index_path(self.data_folder))
+        try:
+            resolved = member_index.resolve(names)
+        finally:
+            member_index.close()
+        misses = [name for name in names if name not in resolved]
+        if misses:
+            print(f"{len(names) - len(misses)} names found in member index, "
+                  f"fetching profiles of {len(misses)}...")
+        profiles = await asyncio.gather(*(self.fetch_profile_by_name(name) for name in misses))
+        for name, profile in zip(misses, profiles):
+            resolved[name] = profile.uid if profile is not None else None
+        return {name: resolved[name] for name in names}
+
+
+    def campaign_lock(self, campaign_name, exclusive=True):
+        """Lock of metadata of an existing campaign"""
+        return campaign_lock(self.campaign_path(campaign_name), exclusive, self.lock_timeout)
+
+
+    def round_lock(self, campaign_name, round_number, exclusive=True):
+        """Lock of a round of an existing campaign"""
+        return round_lock(self.campaign_path(campaign_name), round_number, exclusive,
+                          self.lock_timeout)
+
+
+    def campaign_path(self, campaign_name):
+        """Path of an existing campaign"""
+        if not campaign_exists(self.data_folder, campaign_name):
+            raise CampaignManagerError(f"Campaign {campaign_name} does not exist")
+        return campaign_folder_path(self.data_folder, campaign_name)
+
+
+    def read_round(self, campaign_name, round_number):
+        """Read data of an existing round"""
+        campaign_path = self.campaign_path(campaign_name)
+        if not round_exists(campaign_path, round_number):
+            raise CampaignManagerError(f"Round {round_number} of {campaign_name} does not exist")
+        return read_round_data(campaign_path, round_number)
+
+
+    async def add_participant(self, campaign_name, uid, payment_address=None):
+        """Add a participant to a campaign. Returns profile of the participant."""
+        self.campaign_path(campaign_name)
+        str_uid = str(uid)
+        if str_uid in read_metadata(self.data_folder, campaign_name).get(PARTICIPANTS_KEY, {}):
+            raise CampaignManagerError(f"Participant {str_uid} already exists")
+        profile = await self.fetch_profile(uid)
+        # Metadata is read again as it may have changed during the crawl
+        with self.campaign_lock(campaign_name):
+            metadata = read_metadata(self.data_folder, campaign_name)
+            participants = metadata.setdefault(PARTICIPANTS_KEY, {})
+            if str_uid in participants:
+                raise CampaignManagerError(f"Participant {str_uid} already exists")
+            participants[str_uid] = Participant(profile.name, payment_address or None).to_dict()
+            write_metadata(self.data_folder, campaign_name, metadata)
+        return profile
+
+
+    async def add_round_participant(self, campaign_name, round_number, uid,
+                                    payment_address=None):
+        """Add a participant to a round and to the campaign if not already in it.
+        Returns the round participant."""
+        campaign_path = self.campaign_path(campaign_name)
+        str_uid = str(uid)
+        if str_uid in self.read_round(campaign_name, round_number).get(PARTICIPANTS_KEY, {}):
+            raise CampaignManagerError(f"Participant {str_uid} already in round {round_number}")
+        profile = await self.fetch_profile(uid)
+        round_participant = round_participant_from_profile(
+            vars(profile), payment_address, int(time.time()), True)
+        with self.campaign_lock(campaign_name), self.round_lock(campaign_name, round_number):
+            round_dict = read_round_data(campaign_path, round_number)
+            if round_dict.get('ended'):
+                raise CampaignManagerError(f"Round {round_number} has already ended")
+            round_participants = round_dict.setdefault(PARTICIPANTS_KEY, {})
+            if str_uid in round_participants:
+                raise CampaignManagerError(
+                    f"Participant {str_uid} already in round {round_number}")
+            round_participants[str_uid] = round_participant.to_dict()
+            write_round_data(campaign_path, round_number, round_dict)
+            metadata = read_metadata(self.data_folder, campaign_name)
+            participants = metadata.setdefault(PARTICIPANTS_KEY, {})
+            if str_uid not in participants:
+                participants[str_uid] = Participant(
+                    profile.name, payment_address or None).to_dict()
+                write_metadata(self.data_folder, campaign_name, metadata)
+        return round_participant
+
+
+    async def add_round(self, campaign_name, round_number, round_start=None, crawl=None,
+                        max_requests=None):
+        """Add a round and crawl starting profile stats of campaign participants.
+        If round_start is not given, round starts now and start stats are known.
+        If max_requests is given and not all participants could be crawled with that
+        many requests, RequestBudgetExceeded is raised and the next call continues
+        from where this one stopped."""
+        campaign_path = self.campaign_path(campaign_name)
+        if round_exists(campaign_path, round_number):
+            raise CampaignManagerError(f"Round {round_number} of {campaign_name} already exists")
+        with self.campaign_lock(campaign_name, exclusive=False):
+            if not campaign_has_participants(self.data_folder, campaign_name):
+                raise CampaignManagerError(f"Campaign {campaign_name} doesn't have participants")
+            participants = campaign_participants(self.data_folder, campaign_name)
+        with self.round_lock(campaign_name, round_number):
+            # Another command may have added the round while waiting for the lock
+            if round_exists(campaign_path, round_number):
+                raise CampaignManagerError(
+                    f"Round {round_number} of {campaign_name} already exists")
+            return await self._add_round(campaign_name, round_number, participants,
+                                         round_start, crawl, max_requests)
+
+
+    async def _add_round(self, campaign_name, round_number, participants, round_start,
+                         crawl, max_requests, profiles=None):
+        """Crawl and write a new round holding its lock. Participants with a profile
+        in profiles, crawled at round_start, are not crawled again. Those without
+        one start the round when their profile is crawled."""
+        campaign_path = self.campaign_path(campaign_name)
+        rolled_over = profiles is not None
+        known_start_info = not round_start or rolled_over
+        profiles = profiles or {}
+        checkpoint = Checkpoint(campaign_path, round_number, START_STAGE)
+        started, crawled = checkpoint.read()
+        round_start = round_start or started or int(time.time())
+        tasks = [(uid, None) for uid in participants if uid not in profiles]
+        if rolled_over and tasks:
+            print(f"Crawling profiles of {len(tasks)} participants missing from previous round")
+        reused = [CrawlResult(uid, Profile.from_dict(profiles[uid]), None)
+                  for uid in participants if uid in profiles]
+        crawled = reused + await self.crawl_within_budget(
+            checkpoint, round_start, tasks, crawled, crawl=crawl, max_requests=max_requests)
+        joined = int(time.time()) if rolled_over else round_start
+        round_dict = {
+            CAMPAIGN_NAME_KEY: campaign_name,
+            'round_number': round_number,
+            'ended': False,
+            'round_start': round_start,
+            'round_start_utc': datetime.utcfromtimestamp(round_start).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"),
+            PARTICIPANTS_KEY: {
+                result.uid: round_participant_from_profile(
+                    vars(result.profile),
+                    Participant.from_dict(participants[result.uid]).payment_address,
+                    round_start if result.uid in profiles else joined,
+                    known_start_info).to_dict()
+                for result in crawled
+            }
+        }
+        os.makedirs(campaign_path / str(round_number))
+        write_round_data(campaign_path, round_number, round_dict)
+        checkpoint.remove()
+        return Round.from_dict(round_dict)
+
+
+    async def end_round(self, campaign_name, round_number, count_only=False,
+                        verify_count=False, crawl=None, max_requests=None):
+        """End a round and calculate posts made by participants during it.
+        If count_only is True, posts are only counted instead of fetching every
+        one of them. Posts are evaluated with campaign post rules if there are any.
+        If snapshots of the round have been taken, only posts made after the latest
+        snapshot are crawled. If recent posts of the forum have been polled with
+        poll_feed, posts of participants are crawled one by one only from the first
+        gap of the polls. Posts are added to the quote graph and the post cache
+        of the campaign and posting patterns of participants are sketched.
+        Request budget works the same way as with add_round."""
+        with self.campaign_lock(campaign_name, exclusive=False):
+            rules = read_metadata(self.data_folder, campaign_name).get(POST_RULES_KEY)
+        with self.round_lock(campaign_name, round_number):
+            return await self._end_round(campaign_name, round_number, rules, count_only,
+                                         verify_count, crawl, max_requests)
+
+
+    async def rollover_round(self, campaign_name, round_number, count_only=False,
+                             verify_count=False, crawl=None, start_crawl=None,
+                             max_requests=None):
+        """End a round and add the next one starting when it ended, holding locks of
+        both rounds throughout. Profiles crawled at the end of the round are the start
+        stats of the next round, so only campaign participants who were not in the
+        round are crawled for it, using start_crawl. Ending works as with end_round.
+        If the round has already ended, only the next round is added from its end
+        stats, so running again after an interruption continues either step.
+        Returns the ended round and the new round."""
+        campaign_path = self.campaign_path(campaign_name)
+        next_round = round_number + 1
+        if round_exists(campaign_path, next_round):
+            raise CampaignManagerError(f"Round {next_round} of {campaign_name} already exists")
+        with self.campaign_lock(campaign_name, exclusive=False):
+            if not campaign_has_participants(self.data_folder, campaign_name):
+                raise CampaignManagerError(f"Campaign {campaign_name} doesn't have participants")
+            rules = read_metadata(self.data_folder, campaign_name).get(POST_RULES_KEY)
+            participants = campaign_participants(self.data_folder, campaign_name)
+        with self.round_lock(campaign_name, round_number), \
+                self.round_lock(campaign_name, next_round):
+            if round_exists(campaign_path, next_round):
+                raise CampaignManagerError(
+                    f"Round {next_round} of {campaign_name} already exists")
+            profiles = {}
+            round_dict = self.read_round(campaign_name, round_number)
+            if not round_dict.get('ended'):
+                summary = await self._end_round(campaign_name, round_number, rules, count_only,
+                                                verify_count, crawl, max_requests, profiles)
+            else:
+                # Round was ended by an earlier try which stopped before adding the next one
+                summary = RoundSummary.from_dict(round_dict)
+                for _ in summary.counting(end_profiles(
+                        (round_dict.get(PARTICIPANTS_KEY) or {}).items(), profiles)):
+                    pass
+            new_round = await self._add_round(
+                campaign_name, next_round, participants, summary.round_end,
+                start_crawl, max_requests, profiles)
+        return summary, new_round
+
+
+    async def poll_feed(self, campaign_name, round_number):
+        """Walk recent posts of the whole forum made since the previous poll of a
+        running round and save posts of its participants. Returns amount of new posts."""
+        campaign_path = self.campaign_path(campaign_name)
+        with self.round_lock(campaign_name, round_number):
+            round_dict = self.read_round(campaign_name, round_number)
+            if round_dict.get('ended'):
+                raise CampaignManagerError(f"Round {round_number} has already ended")
+            return await self._poll_feed(campaign_path, round_number, round_dict)
+
+
+    async def _poll_feed(self, campaign_path, round_number, round_dict):
+        """Poll recent posts for a round holding its lock"""
+        round_folder = round_folder_path(campaign_path, round_number)
+        start_timestamp = poll_start_timestamp(round_folder, round_dict.get('round_start'))
+        # Posts made while walking may be missed, so poll only covers until it started
+        now = int(time.time())
+        items = await self.fetch_recent_posts(start_timestamp)
+        self.index_members([(item['uid'], item.get('name')) for item in items
+                            if item.get('uid') is not None])
+        return save_feed_poll(round_folder, round_dict.get(PARTICIPANTS_KEY) or {}, items,
+                              start_timestamp, now)
+
+
+    async def _end_round(self, campaign_name, round_number, rules, count_only,
+                         verify_count, crawl, max_requests, profiles=None):
+        """Crawl and finalize participants of a round holding its lock. Each participant
+        is written into finalized.jl as soon as it is crawled and round.json is written
+        from it in the order of the participants of the round, so participants are not all
+        kept in memory as results. If profiles is given, end profiles of participants are
+        put into it by UID. Returns a RoundSummary."""
+        campaign_path = self.campaign_path(campaign_name)
+        round_dict = self.read_round(campaign_name, round_number)
+        if round_dict.get('ended'):
+            raise CampaignManagerError(f"Round {round_number} has already ended")
+        round_folder = round_folder_path(campaign_path, round_number)
+        finalized = FinalizedParticipants(round_folder)
+        started, finalized_uids = finalized.read()
+        now = started or time.time()
+        finalized.start(now)
+        round_dict['ended'] = True
+        round_dict['round_end'] = int(now)
+        round_dict['round_end_utc'] = datetime.utcfromtimestamp(now).strftime(
+            "%Y-%m-%dT%H:%M:%SZ")
+        if participants := round_dict.get(PARTICIPANTS_KEY):
+            rule_set = compile_rules(rules)
+            if rule_set and count_only:
+                logger.warning("Posts are only counted so post rules are not used")
+            latest = latest_snapshots(round_folder) if not count_only else {}
+            use_feed = not count_only and has_feed(round_folder)
+            if use_feed:
+                await self._poll_feed(campaign_path, round_number, round_dict)
+            quote_graph = QuoteGraph(quote_graph_path(campaign_path))
+            post_cache = PostCache(post_cache_path(campaign_path))
+            quote_graph.set_members(
+                round_number, {uid: participant.get('name')
+                               for uid, participant in participants.items()})
+            def evaluate(uid, posts):
+                if uid in latest:
+                    posts = merge_snapshot_posts(round_folder, uid, posts)
+                if use_feed:
+                    posts = merge_feed_posts(round_folder, uid, posts,
+                                             participants[uid].get('start_time'))
+                sketch = PostingSketch()
+                posts = quote_graph.indexing(round_number, uid, sketching(posts, sketch))
+                posts_result = evaluate_posts(post_cache.caching(round_number, uid, posts),
+                                              rule_set)
+                posts_result[POSTING_SKETCH_KEY] = sketch.to_dict()
+                return posts_result
+            def finalize(result):
+                # Posts of participants found only by the feed were not crawled
+                if result.posts_result is None:
+                    result.posts_result = evaluate(result.uid, iter(()))
+                finalized.append(finalize_round_participant(
+                    RoundParticipant.from_dict(participants[result.uid]),
+                    vars(result.profile), result.posts_result))
+                finalized_uids.add(result.uid)
+            tasks = [(uid, start_timestamp) for uid, start_timestamp in end_round_tasks(
+                        round_folder, round_dict, latest, use_feed, round_dict['round_end'])
+                     if uid not in finalized_uids]
+            # Participants expected to take longest are crawled first
+            tasks = longest_first(
+                tasks, round_dict['round_end'],
+                participant_post_rates(campaign_path, participants,
+                                       latest or latest_snapshots(round_folder)),
+                count_only, verify_count)
+            try:
+                await self.crawl(tasks, count_only, verify_count, evaluate, crawl,
+                                 max_requests, on_result=finalize)
+            finally:
+                quote_graph.close()
+                post_cache.close()
+            if len(finalized_uids) < len(participants):
+                raise RequestBudgetExceeded(
+                    f"Crawling stopped with {len(finalized_uids)}/{len(participants)} "
+                    f"participants finalized into {FINALIZED_FILE}. Run again to continue.")
+        header = {key: value for key, value in round_dict.items() if key != PARTICIPANTS_KEY}
+        summary = RoundSummary.from_dict(round_dict)
+        written = summary.counting(finalized.participants(list(participants or {})))
+        if profiles is not None:
+            written = end_profiles(written, profiles)
+        write_round_data(campaign_path, round_number, header, written)
+        finalized.remove()
+        return summary
+
+
+    async def verify_round_posts(self, campaign_name, round_number):
+        """Fetch again the pages of posts participants made during an ended round and
+        compare them with the post cache. Returns a PostVerification of each participant
+        whose pages could be fetched."""
+        campaign_path = self.campaign_path(campaign_name)
+        with self.round_lock(campaign_name, round_number, exclusive=False):
+            round_dict = self.read_round(campaign_name, round_number)
+        if not round_dict.get('ended'):
+            raise CampaignManagerError(f"Round {round_number} has not ended yet")
+        post_cache = PostCache(post_cache_path(campaign_path))
+        pending = deque(
+            (uid, participant.get('start_time'))
+            for uid, participant in (round_dict.get(PARTICIPANTS_KEY) or {}).items()
+            if participant.get('start_time') is not None)
+        verifications = []
+        async def verify_pending():
+            while pending:
+                uid, start_timestamp = pending.popleft()
+                try:
+                    pages = await self.fetch_round_pages(
+                        uid, start_timestamp, round_dict['round_end'],
+                        post_cache.known_page_hashes(round_number, uid))
+                    verifications.append(post_cache.verify(round_number, uid, pages,
+                                                           round_dict['round_end']))
+                except (CrawlerResultError, ScrapingError, ValueError) as err:
+                    logger.error("Posts of %s could not be verified: %s", uid, err)
+        try:
+            await asyncio.gather(*(verify_pending() for _ in range(self.concurrency)))
+        finally:
+            post_cache.close()
+        return sorted(verifications, key=lambda verification: int(verification.uid))
+
+
+    async def enroll_from_topic(self, campaign_name, topic=None):
+        """Enroll applicants replying to the signup topic of a campaign with a payment
+        address. Replies are parsed as they are crawled and valid applicants are added
+        to the campaign at once. The next run continues after the last reply gone
+        through, from its page. Returns applications of the new replies."""
+        campaign_path = self.campaign_path(campaign_name)
+        with self.campaign_lock(campaign_name, exclusive=False):
+            enrollment = read_enrollment(campaign_path)
+        if topic is not None and (enrollment is None or enrollment['topic'] != int(topic)):
+            enrollment = {'topic': int(topic), 'page_start': 0, 'last_message_id': 0}
+        if enrollment is None:
+            raise CampaignManagerError(f"Signup topic of {campaign_name} has not been given")
+        applications = []
+        last_reply = {}
+        def on_item(post):
+            last_reply.update(page_start=post['page_start'], link=post['link'])
+            # First post of the topic is the announcement of the campaign
+            if post['position'] > 0:
+                applications.append(parse_application(post))
+        await self.fetch_topic_posts(enrollment['topic'], enrollment['page_start'],
+                                     enrollment['last_message_id'], on_item)
+        self.index_members([(application['uid'], application['name'])
+                            for application in applications])
+        with self.campaign_lock(campaign_name):
+            metadata = read_metadata(self.data_folder, campaign_name)
+            participants = metadata.setdefault(PARTICIPANTS_KEY, {})
+            for application in applications:
+                if application['status'] is not None:
+                    continue
+                if str(application['uid']) in participants:
+                    application['status'] = ALREADY_PARTICIPATING
+                    continue
+                participants[str(application['uid'])] = Participant(
+                    application['name'], application['payment_address']).to_dict()
+                application['status'] = ENROLLED
+            if any(application['status'] == ENROLLED for application in applications):
+                write_metadata(self.data_folder, campaign_name, metadata)
+            append_applications(campaign_path, applications)
+            if last_reply:
+                enrollment['page_start'] = last_reply['page_start']
+                enrollment['last_message_id'] = post_message_id(last_reply)
+            write_enrollment(campaign_path, enrollment)
+        return applications
@@ -0,0 +1,92 @@
+"""Local index of bitcointalk usernames and UIDs, for adding participants who signed
+up with their username.
+
+Names of users are saved into a SQLite database in the data folder whenever profiles
+or recent posts are crawled, so most names are known without fetching anything.
+Names are looked up case-insensitively like the forum does. Earlier names of a user
+stay in the index, so a user is still found by a name they used before, unless
+another user has taken the name since."""
+import sqlite3
+import time
+
+MEMBER_INDEX_FILE = 'member_index.sqlite3'
+# Maximum amount of variables in a query of old SQLite versions
+QUERY_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS names (
+    name_key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    seen INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS names_uid ON names (uid, seen);
+"""
+
+
+def member_index_path(data_folder):
+    """Path of the member index of a data folder"""
+    return data_folder / MEMBER_INDEX_FILE
+
+
+def name_key(name):
+    """Key of a username, which the forum compares case-insensitively"""
+    return name.strip().casefold()
+
+
+class MemberIndex:
+    """Usernames of members by UID stored in a SQLite database"""
+    def __init__(self, path):
+        self.path = path
+        # Profiles may be indexed in a crawl thread, but never by two threads at once
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+
+    def close(self):
+        """Close database connection"""
+        self.connection.close()
+
+
+    def add(self, members, seen=None):
+        """Save (uid, name) pairs seen at seen, by default now. A name seen
+        earlier than it already was does not replace the newer owner of the name."""
+        seen = int(time.time()) if seen is None else int(seen)
+        rows = [(name_key(name), name.strip(), int(uid), seen)
+                for uid, name in members if name and name.strip()]
+        with self.connection:
+            self.connection.executemany(
+                """INSERT INTO names (name_key, name, uid, seen) VALUES (?, ?, ?, ?)
+                ON CONFLICT (name_key) DO UPDATE SET
+                name = excluded.name, uid = excluded.uid, seen = excluded.seen
+                WHERE excluded.seen >= names.seen""", rows)
+
+
+    def resolve(self, names):
+        """UIDs of names found in the index by name as given"""
+        keys = {}
+        for name in names:
+            keys.setdefault(name_key(name), []).append(name)
+        key_list = list(keys)
+        resolved = {}
+        for i in range(0, len(key_list), QUERY_BATCH_SIZE):
+            batch = key_list[i:i + QUERY_BATCH_SIZE]
+            rows = self.connection.execute(
+                f"SELECT name_key, uid FROM names WHERE name_key IN "
+                f"({','.join('?' * len(batch))})", batch)
+            for key, uid in rows:
+                for name in keys[key]:
+                    resolved[name] = uid
+        return resolved
+
+
+    def names(self, uid):
+        """Names of a user, the latest first"""
+        return [name for name, in self.connection.execute(
+            "SELECT name FROM names WHERE uid = ? ORDER BY seen DESC", (int(uid),))]
+
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM names").fetchone()[0]
@@ -0,0 +1,220 @@
+"""Index of participants of all campaigns and rounds of a data folder, for finding
+the campaigns and rounds of a UID and the UIDs using a payment address without
+reading every metadata.json and round.json.
+
+The index is a SQLite database in the data folder. It is built from the campaign
+folders the first time it is needed and kept up to date by core.write_metadata and
+core.write_round_data. Changes made to the files by hand are picked up by rebuilding
+the index."""
+import logging
+import sqlite3
+
+from records import loads
+
+logger = logging.getLogger(__name__)
+
+PARTICIPANT_INDEX_FILE = 'participant_index.sqlite3'
+# Seconds to wait for another command writing the index, e.g. while it is rebuilt
+BUSY_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaign_participants (
+    campaign TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    payment_address TEXT,
+    PRIMARY KEY (campaign, uid)
+);
+CREATE INDEX IF NOT EXISTS campaign_participants_uid ON campaign_participants (uid);
+CREATE INDEX IF NOT EXISTS campaign_participants_address
+    ON campaign_participants (payment_address);
+CREATE TABLE IF NOT EXISTS round_participants (
+    campaign TEXT NOT NULL,
+    round_number INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    payment_address TEXT,
+    PRIMARY KEY (campaign, round_number, uid)
+);
+CREATE INDEX IF NOT EXISTS round_participants_uid ON round_participants (uid);
+CREATE INDEX IF NOT EXISTS round_participants_address ON round_participants (payment_address);
+"""
+
+
+def participant_index_path(data_folder):
+    """Path of the participant index of a data folder"""
+    return data_folder / PARTICIPANT_INDEX_FILE
+
+
+def participant_row(uid, participant):
+    """(uid, payment_address) of a participant of metadata.json or round.json"""
+    return int(uid), (participant or {}).get('payment_address') or None
+
+
+def participant_rows(participants):
+    """Rows of participants dict of metadata.json or round.json"""
+    return {participant_row(uid, participant) for uid, participant in participants.items()}
+
+
+def collecting_rows(participants, rows):
+    """Yield (uid, participant) items of participants adding their rows into rows, so
+    that participants written one at a time are indexed without reading them back"""
+    for uid, participant in participants:
+        rows.add(participant_row(uid, participant))
+        yield uid, participant
+
+
+def campaign_files(data_folder):
+    """Yield (campaign name, round number or None, path) of metadata.json and
+    round.json files of a data folder"""
+    for campaign_path in sorted(data_folder.iterdir()):
+        if not (campaign_path / 'metadata.json').is_file():
+            continue
+        yield campaign_path.name, None, campaign_path / 'metadata.json'
+        for round_path in sorted(campaign_path.iterdir()):
+            if round_path.name.isdigit() and (round_path / 'round.json').is_file():
+                yield campaign_path.name, int(round_path.name), round_path / 'round.json'
+
+
+class ParticipantIndex:
+    """Participants of campaigns and rounds stored in a SQLite database"""
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+
+    def close(self):
+        """Close database connection"""
+        self.connection.close()
+
+
+    def _set_rows(self, campaign, round_number, rows):
+        """Replace participant rows of a campaign or a round with as few changes as possible"""
+        if round_number is None:
+            indexed = set(self.connection.execute(
+                "SELECT uid, payment_address FROM campaign_participants WHERE campaign = ?",
+                (campaign,)))
+            where = "campaign = ? AND uid = ?"
+            table = 'campaign_participants'
+            key = (campaign,)
+        else:
+            indexed = set(self.connection.execute(
+                "SELECT uid, payment_address FROM round_participants "
+                "WHERE campaign = ? AND round_number = ?", (campaign, round_number)))
+            where = "campaign = ? AND round_number = ? AND uid = ?"
+            table = 'round_participants'
+            key = (campaign, round_number)
+        self.connection.executemany(f"DELETE FROM {table} WHERE {where}",
+                                    [key + (uid,) for uid, _ in indexed - rows])
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO {table} VALUES ({','.join('?' * (len(key) + 2))})",
+            [key + row for row in rows - indexed])
+
+
+    def set_participants(self, campaign, round_number, participants):
+        """Save participants dict of a campaign, or of a round if round_number is given"""
+        with self.connection:
+            self._set_rows(campaign, round_number, participant_rows(participants))
+
+
+    def update(self, campaign, round_number, rows):
+        """Save participant rows of a campaign or a round if the index has been built.
+        A rebuild in progress is waited for, so that the update is not lost."""
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            if self.built():
+                self._set_rows(campaign, round_number, rows)
+
+
+    def rebuild(self, data_folder):
+        """Index all campaigns and rounds of data_folder from scratch. The index is
+        locked while files are read, so writes made meanwhile are indexed after it.
+        Returns amount of files indexed."""
+        files = 0
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute("DELETE FROM campaign_participants")
+            self.connection.execute("DELETE FROM round_participants")
+            for campaign, round_number, path in campaign_files(data_folder):
+                try:
+                    self._set_rows(campaign, round_number, participant_rows(
+                        loads(path.read_text()).get('participants') or {}))
+                except (OSError, ValueError, AttributeError) as error:
+                    logger.warning("Skipping %s: %s", path, error)
+                    continue
+                files += 1
+            self.connection.execute("PRAGMA user_version = 1")
+        return files
+
+
+    def built(self):
+        """Whether the index has been built from the data folder"""
+        return self.connection.execute("PRAGMA user_version").fetchone()[0] > 0
+
+
+    def campaigns(self, uid):
+        """(campaign, payment address) of campaigns a UID participates in"""
+        return self.connection.execute(
+            "SELECT campaign, payment_address FROM campaign_participants WHERE uid = ? "
+            "ORDER BY campaign", (int(uid),)).fetchall()
+
+
+    def rounds(self, uid):
+        """(campaign, round number, payment address) of rounds of a UID"""
+        return self.connection.execute(
+            "SELECT campaign, round_number, payment_address FROM round_participants "
+            "WHERE uid = ? ORDER BY campaign, round_number", (int(uid),)).fetchall()
+
+
+    def address_uids(self, payment_address):
+        """(uid, campaign, round number or None) of participants using a payment address"""
+        return self.connection.execute(
+            "SELECT uid, campaign, NULL FROM campaign_participants WHERE payment_address = ? "
+            "UNION ALL SELECT uid, campaign, round_number FROM round_participants "
+            "WHERE payment_address = ? ORDER BY 1, 2, 3",
+            (payment_address, payment_address)).fetchall()
+
+
+    def shared_addresses(self):
+        """UIDs of payment addresses used by more than one UID"""
+        rows = self.connection.execute(
+            """WITH used AS (
+                SELECT payment_address, uid FROM campaign_participants
+                WHERE payment_address IS NOT NULL
+                UNION SELECT payment_address, uid FROM round_participants
+                WHERE payment_address IS NOT NULL)
+            SELECT payment_address, uid FROM used WHERE payment_address IN (
+                SELECT payment_address FROM used GROUP BY payment_address
+                HAVING COUNT(*) > 1)
+            ORDER BY payment_address, uid""")
+        shared = {}
+        for payment_address, uid in rows:
+            shared.setdefault(payment_address, []).append(uid)
+        return shared
+
+
+def open_participant_index(data_folder):
+    """Participant index of a data folder, built first if there is none"""
+    index = ParticipantIndex(participant_index_path(data_folder))
+    if not index.built():
+        print("Building participant index...")
+        print(f"{index.rebuild(data_folder)} campaign and round files indexed")
+    return index
+
+
+def update_participant_index(data_folder, campaign, round_number, rows):
+    """Update participant rows of a campaign, or a round if round_number is given, after
+    its file was written. A failed update is logged as the file has already been written."""
+    path = participant_index_path(data_folder)
+    if not path.is_file():
+        return
+    try:
+        index = ParticipantIndex(path)
+        try:
+            index.update(campaign, round_number, rows)
+        finally:
+            index.close()
+    except sqlite3.Error as error:
+        logger.error("Participant index could not be updated: %s. "
+                     "Rebuild it with 'participant rebuild_index'.", error)
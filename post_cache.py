@@ -0,0 +1,193 @@
+"""Cache of hashes of posts made during rounds, for finding posts which were deleted
+or edited after a round ended.
+
+Hash of the content of each post of a participant is saved into a SQLite database in
+the campaign folder as the posts are evaluated when a round ends. Verifying a round
+fetches again only the pages of posts made during it and compares hashes by message ID.
+Hashes of pages whose posts all matched are saved too, so the contents of a page which
+has not changed since the previous verification do not need to be parsed again."""
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+
+from utils import post_message_id
+
+POST_CACHE_FILE = 'post_cache.sqlite3'
+VERIFICATION_CSV_FILE = 'verification.csv'
+# Hashes of this many posts are written at a time
+WRITE_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    round_number INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    datetime_utc TEXT,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (round_number, message_id)
+);
+CREATE INDEX IF NOT EXISTS posts_uid ON posts (round_number, uid);
+CREATE TABLE IF NOT EXISTS pages (
+    round_number INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    page_hash TEXT NOT NULL,
+    PRIMARY KEY (round_number, uid, page_hash)
+);
+"""
+
+
+def post_cache_path(campaign_path):
+    """Path of the post cache database of a campaign"""
+    return campaign_path / POST_CACHE_FILE
+
+
+def content_hash(content):
+    """Hash of parsed content of a post"""
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def post_row(round_number, uid, post):
+    """Cache row of a post or None if it has no message ID"""
+    if (message_id := post_message_id(post)) is None:
+        return None
+    return (round_number, message_id, int(uid), post.get('datetime_utc'),
+            content_hash(post.get('content')))
+
+
+class PostVerification:
+    """Message IDs of posts of a participant which changed after the round ended"""
+    def __init__(self, uid, deleted=(), edited=(), new=(), pages=0, skipped_pages=0):
+        self.uid = uid
+        self.deleted = sorted(deleted)
+        self.edited = sorted(edited)
+        self.new = sorted(new)
+        self.pages = pages
+        self.skipped_pages = skipped_pages
+
+
+class PostCache:
+    """Post hashes of a campaign stored in a SQLite database"""
+    def __init__(self, path):
+        self.path = path
+        # Posts may be evaluated in a crawl thread, but never by two threads at once
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+
+    def close(self):
+        """Close database connection"""
+        self.connection.close()
+
+
+    def add_posts(self, round_number, uid, posts):
+        """Save hashes of posts of a participant. Posts already in the cache are kept
+        as they were, so a round ending again does not hide edits.
+        Returns amount of posts not in the cache before."""
+        added = 0
+        rows = []
+        for post in posts:
+            if (row := post_row(round_number, uid, post)) is not None:
+                rows.append(row)
+            if len(rows) >= WRITE_BATCH_SIZE:
+                added += self.write_rows(rows)
+                rows = []
+        return added + self.write_rows(rows)
+
+
+    def caching(self, round_number, uid, posts):
+        """Yield posts saving their hashes in batches as they go through. Only the
+        hashes of the batch are kept, not the posts."""
+        rows = []
+        for post in posts:
+            if (row := post_row(round_number, uid, post)) is not None:
+                rows.append(row)
+            yield post
+            if len(rows) >= WRITE_BATCH_SIZE:
+                self.write_rows(rows)
+                rows = []
+        self.write_rows(rows)
+
+
+    def write_rows(self, rows):
+        """Write post rows. Returns amount of posts not in the cache before."""
+        with self.connection:
+            cursor = self.connection.executemany(
+                """INSERT OR IGNORE INTO posts
+                (round_number, message_id, uid, datetime_utc, content_hash)
+                VALUES (?, ?, ?, ?, ?)""", rows)
+        return cursor.rowcount
+
+
+    def cached_posts(self, round_number, uid, before=None):
+        """Content hashes of cached posts of a participant by message ID. If before is
+        given, only posts made before that timestamp are included."""
+        if before is None:
+            return dict(self.connection.execute(
+                "SELECT message_id, content_hash FROM posts WHERE round_number = ? AND uid = ?",
+                (round_number, int(uid))))
+        return dict(self.connection.execute(
+            """SELECT message_id, content_hash FROM posts
+            WHERE round_number = ? AND uid = ? AND datetime_utc < ?""",
+            (round_number, int(uid),
+             datetime.utcfromtimestamp(before).strftime("%Y-%m-%dT%H:%M:%SZ"))))
+
+
+    def known_page_hashes(self, round_number, uid):
+        """Hashes of pages of a participant whose posts matched the cache"""
+        return {page_hash for page_hash, in self.connection.execute(
+            "SELECT page_hash FROM pages WHERE round_number = ? AND uid = ?",
+            (round_number, int(uid)))}
+
+
+    def verify(self, round_number, uid, pages, round_end=None):
+        """Compare pages fetched by the verify_posts spider with the cache. Posts on
+        pages with a known hash are unchanged and only their message IDs are used.
+        The spider skips posts made at or after round_end, so cached posts made then,
+        e.g. while the round was being ended, are not compared.
+        If nothing is cached for the participant, e.g. posts were only counted when
+        the round ended, the posts are saved as they are now and nothing is reported."""
+        pages = sorted(pages, key=lambda page: page['page'])
+        if not pages or not pages[-1].get('last'):
+            raise ValueError(f"Pages of posts of {uid} were not fetched to the end")
+        cached = self.cached_posts(round_number, uid, round_end)
+        if not cached:
+            self.add_posts(round_number, uid, (post for page in pages for post in page['posts']))
+            self.add_pages(round_number, uid, [page['page_hash'] for page in pages])
+            return PostVerification(uid, pages=len(pages))
+        seen = set()
+        edited = set()
+        new = set()
+        matching_pages = []
+        for page in pages:
+            page_changed = False
+            for post in page['posts']:
+                if (message_id := post_message_id(post)) is None:
+                    continue
+                seen.add(message_id)
+                if page.get('unchanged'):
+                    continue
+                if message_id not in cached:
+                    new.add(message_id)
+                    page_changed = True
+                elif cached[message_id] != content_hash(post.get('content')):
+                    edited.add(message_id)
+                    page_changed = True
+            # Edited pages are compared again each time so that edits keep being reported
+            if not page_changed:
+                matching_pages.append(page['page_hash'])
+        self.add_pages(round_number, uid, matching_pages)
+        return PostVerification(
+            uid, deleted=set(cached) - seen, edited=edited, new=new, pages=len(pages),
+            skipped_pages=sum(1 for page in pages if page.get('unchanged')))
+
+
+    def add_pages(self, round_number, uid, page_hashes):
+        """Save hashes of pages whose posts matched the cache"""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO pages (round_number, uid, page_hash) VALUES (?, ?, ?)",
+                [(round_number, int(uid), page_hash) for page_hash in page_hashes])
@@ -0,0 +1,177 @@
+"""Rules for accepting or rejecting posts made by campaign participants.
+
+Rules are configured per campaign and stored in campaign metadata. They are compiled
+once into a RuleSet which is then used to evaluate the posts of every participant.
+Posts are parsed post contents of PostContentParser."""
+import calendar
+import logging
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+POST_RULES_KEY = 'post_rules'
+POSTS_MADE_KEY = 'posts_made'
+ACCEPTED_POSTS_KEY = 'accepted_posts'
+REJECTED_POSTS_KEY = 'rejected_posts'
+REJECTION_REASONS_KEY = 'rejection_reasons'
+
+MIN_LENGTH = 'min_length'
+QUOTE_ONLY = 'reject_quote_only'
+LINK_ONLY = 'reject_link_only'
+MAX_POSTS_PER_DAY = 'max_posts_per_day'
+MIN_SPACING_MINUTES = 'min_spacing_minutes'
+
+# Rule name and type of its value. Posts are checked in this order.
+RULES = {
+    QUOTE_ONLY: bool,
+    LINK_ONLY: bool,
+    MIN_LENGTH: int,
+    MAX_POSTS_PER_DAY: int,
+    MIN_SPACING_MINUTES: int,
+}
+
+
+class PostRuleError(Exception):
+    """Represents errors regarding configuration of post rules"""
+
+
+def parse_rule_value(rule, value):
+    """Convert rule value given as a string to the type of the rule"""
+    if rule not in RULES:
+        raise PostRuleError(f"Unknown post rule {rule}. Known rules: {', '.join(RULES)}")
+    if RULES[rule] is bool:
+        if value.lower() in ('1', 'true', 'yes'):
+            return True
+        if value.lower() in ('0', 'false', 'no'):
+            return False
+        raise PostRuleError(f"Value of {rule} should be true or false")
+    try:
+        value = int(value)
+    except ValueError as error:
+        raise PostRuleError(f"Value of {rule} should be an integer") from error
+    if value < 0:
+        raise PostRuleError(f"Value of {rule} cannot be negative")
+    return value
+
+
+class PostSummary:
+    """What the rules need to know about a post, computed in one pass over its content"""
+    __slots__ = ('datetime_utc', 'own_text_length', 'quotes', 'links', 'images')
+
+    def __init__(self, post):
+        self.datetime_utc = post.get('datetime_utc')
+        self.quotes = 0
+        self.links = 0
+        self.images = 0
+        texts = []
+        # Walk the content tree without recursion, skipping contents of quotes
+        nodes = list(reversed((post.get('content') or {}).get('children', ())))
+        while nodes:
+            node = nodes.pop()
+            node_type = node.get('type')
+            if node_type == 'text':
+                texts.append(node.get('content', ''))
+            elif node_type == 'quote':
+                self.quotes += 1
+            elif node_type == 'link':
+                self.links += 1
+            elif node_type == 'image':
+                self.images += 1
+            if node_type != 'quote' and (children := node.get('children')):
+                nodes.extend(reversed(children))
+        self.own_text_length = len(' '.join(''.join(texts).split()))
+
+
+class RuleSet:
+    """Compiled post rules of a campaign"""
+    def __init__(self, config):
+        self.post_checks = []
+        self.max_posts_per_day = None
+        self.min_spacing = None
+        config = config or {}
+        if unknown := set(config) - set(RULES):
+            raise PostRuleError(f"Unknown post rules {', '.join(sorted(unknown))}")
+        for rule in RULES:
+            if not (value := config.get(rule)):
+                continue
+            if rule == MIN_LENGTH:
+                self.post_checks.append(
+                    (rule, lambda summary, value=value: summary.own_text_length < value))
+            elif rule == QUOTE_ONLY:
+                self.post_checks.append(
+                    (rule, lambda summary: summary.quotes and not summary.own_text_length))
+            elif rule == LINK_ONLY:
+                self.post_checks.append(
+                    (rule, lambda summary: (summary.links or summary.images)
+                     and not summary.own_text_length))
+            elif rule == MAX_POSTS_PER_DAY:
+                self.max_posts_per_day = value
+            elif rule == MIN_SPACING_MINUTES:
+                self.min_spacing = value * 60
+
+
+    def rejection_reason(self, summary):
+        """Name of the first rule post breaks without considering other posts"""
+        for rule, check in self.post_checks:
+            if check(summary):
+                return rule
+        return None
+
+
+    def evaluate(self, posts):
+        """Evaluate posts of a participant. Posts breaking per post rules are rejected
+        first and then remaining posts are gone through from oldest to newest so that
+        posts over the daily limit or too soon after previous accepted post are rejected."""
+        reasons = Counter()
+        candidates = []
+        posts_made = 0
+        for post in posts:
+            posts_made += 1
+            summary = PostSummary(post)
+            if reason := self.rejection_reason(summary):
+                reasons[reason] += 1
+            else:
+                candidates.append(summary)
+        accepted = 0
+        if self.max_posts_per_day or self.min_spacing:
+            candidates.sort(key=lambda summary: summary.datetime_utc or '')
+            posts_per_day = Counter()
+            previous_time = None
+            for summary in candidates:
+                day = (summary.datetime_utc or '')[:10]
+                if self.max_posts_per_day and posts_per_day[day] >= self.max_posts_per_day:
+                    reasons[MAX_POSTS_PER_DAY] += 1
+                    continue
+                # Posts without a time cannot be spaced and are left to the other rules
+                if self.min_spacing and summary.datetime_utc:
+                    post_time = calendar.timegm(
+                        time.strptime(summary.datetime_utc, "%Y-%m-%dT%H:%M:%SZ"))
+                    if previous_time is not None and post_time - previous_time < self.min_spacing:
+                        reasons[MIN_SPACING_MINUTES] += 1
+                        continue
+                    previous_time = post_time
+                posts_per_day[day] += 1
+                accepted += 1
+        else:
+            accepted = len(candidates)
+        return {
+            POSTS_MADE_KEY: posts_made,
+            ACCEPTED_POSTS_KEY: accepted,
+            REJECTED_POSTS_KEY: posts_made - accepted,
+            REJECTION_REASONS_KEY: dict(reasons),
+        }
+
+
+def evaluate_posts(posts, rule_set=None):
+    """Count posts and evaluate them with rules if there are any"""
+    if rule_set is None:
+        return {POSTS_MADE_KEY: sum(1 for _ in posts)}
+    return rule_set.evaluate(posts)
+
+
+def compile_rules(config):
+    """Compile post rules of a campaign. Returns None if there are no rules."""
+    if not config:
+        return None
+    return RuleSet(config)
@@ -0,0 +1,131 @@
+"""Posting patterns of participants summarized into fixed size sketches.
+
+Posts of a participant go through a sketch as they are evaluated when a round ends.
+A sketch counts posts by hour of day and day of week, gaps between consecutive posts
+in buckets from a minute to days, and bursts of BURST_POSTS posts made within
+BURST_SECONDS, e.g. a participant making their posts in a hurry at the end of the round.
+Each sketch takes the same memory no matter how many posts it has seen, so sketches are
+saved with the round participants and written to sketches.csv next to round.csv.
+
+Gaps and bursts need posts in order of time. Crawled posts come newest first and posts
+found by snapshots or the feed before them, so timestamps of the posts are collected
+into a compact array and sorted before they are added to the sketch."""
+import calendar
+import time
+from array import array
+from collections import deque
+
+POSTING_SKETCH_KEY = 'posting_sketch'
+SKETCHES_CSV_FILE = 'sketches.csv'
+BURST_POSTS = 5
+BURST_SECONDS = 600
+# Upper bounds of gap buckets in seconds, the last bucket has longer gaps
+GAP_BUCKETS = (60, 120, 300, 600, 1800, 3600, 7200, 21600, 43200, 86400, 172800)
+GAP_BUCKET_NAMES = ('1m', '2m', '5m', '10m', '30m', '1h', '2h', '6h', '12h', '1d', '2d',
+                    'longer')
+
+
+def post_timestamp(post):
+    """Timestamp of datetime_utc of a post or None if it has none"""
+    if not (datetime_utc := post.get('datetime_utc')):
+        return None
+    return calendar.timegm(time.strptime(datetime_utc, "%Y-%m-%dT%H:%M:%SZ"))
+
+
+def gap_bucket(gap):
+    """Index of the gap bucket of seconds between posts"""
+    for index, bound in enumerate(GAP_BUCKETS):
+        if gap < bound:
+            return index
+    return len(GAP_BUCKETS)
+
+
+class PostingSketch:
+    """Posting pattern of a participant. Timestamps are added oldest first."""
+    def __init__(self, burst_posts=BURST_POSTS, burst_seconds=BURST_SECONDS):
+        self.burst_posts = burst_posts
+        self.burst_seconds = burst_seconds
+        self.posts = 0
+        self.first = None
+        self.last = None
+        self.hours = [0] * 24
+        self.weekdays = [0] * 7
+        self.gaps = [0] * (len(GAP_BUCKETS) + 1)
+        self.min_gap = None
+        self.bursts = 0
+        self.max_posts_per_day = 0
+        self.day = None
+        self.day_posts = 0
+        # Timestamps of the latest posts, at most burst_posts of them
+        self.window = deque(maxlen=burst_posts)
+
+
+    def add(self, timestamp):
+        """Add timestamp of a post made at the same time or after the previous one"""
+        posted = time.gmtime(timestamp)
+        self.posts += 1
+        self.hours[posted.tm_hour] += 1
+        self.weekdays[posted.tm_wday] += 1
+        if self.first is None:
+            self.first = timestamp
+        else:
+            gap = abs(timestamp - self.last)
+            self.gaps[gap_bucket(gap)] += 1
+            self.min_gap = gap if self.min_gap is None else min(self.min_gap, gap)
+        self.last = timestamp
+        day = timestamp // 86400
+        self.day_posts = self.day_posts + 1 if day == self.day else 1
+        self.day = day
+        self.max_posts_per_day = max(self.max_posts_per_day, self.day_posts)
+        self.window.append(timestamp)
+        if (len(self.window) == self.burst_posts and
+                self.window[-1] - self.window[0] <= self.burst_seconds):
+            # Posts of a burst are not counted again in an overlapping burst
+            self.bursts += 1
+            self.window.clear()
+
+
+    def to_dict(self):
+        """Sketch as saved with the round participant"""
+        return {
+            'posts': self.posts,
+            'first': self.first,
+            'last': self.last,
+            'hours': self.hours,
+            'weekdays': self.weekdays,
+            'gaps': self.gaps,
+            'min_gap': self.min_gap,
+            'bursts': self.bursts,
+            'burst_posts': self.burst_posts,
+            'burst_seconds': self.burst_seconds,
+            'max_posts_per_day': self.max_posts_per_day,
+        }
+
+
+def sketching(posts, sketch):
+    """Yield posts and add their timestamps to sketch in order of time
+    once all posts have been gone through"""
+    timestamps = array('q')
+    for post in posts:
+        yield post
+        if (timestamp := post_timestamp(post)) is not None:
+            timestamps.append(timestamp)
+    for timestamp in sorted(timestamps):
+        sketch.add(timestamp)
+
+
+def sketch_csv_header():
+    """Header of sketches.csv"""
+    return (['uid', 'name', 'posts', 'bursts', 'max_posts_per_day', 'min_gap_seconds'] +
+            [f"gaps_under_{name}" if name != 'longer' else 'gaps_longer'
+             for name in GAP_BUCKET_NAMES] +
+            [f"hour_{hour:02}" for hour in range(24)] +
+            [f"weekday_{day}" for day in calendar.day_abbr])
+
+
+def sketch_csv_row(uid, name, sketch):
+    """Row of sketches.csv of a participant with a sketch dict"""
+    return ([uid, name, sketch.get('posts'), sketch.get('bursts'),
+             sketch.get('max_posts_per_day'),
+             '' if sketch.get('min_gap') is None else sketch.get('min_gap')] +
+            sketch.get('gaps') + sketch.get('hours') + sketch.get('weekdays'))
@@ -0,0 +1,241 @@
+"""Index of who participants quote, for finding participants who farm posts by
+quoting each other.
+
+Posts of round participants are added to a SQLite database in the campaign folder as
+they are evaluated when a round ends. Each direct quote of a post, i.e. not a quote
+inside another quote, becomes an edge from the participant to the quoted username.
+Posts already in the index are skipped, so posts may be added again any number of
+times. Edges between members of the same round are aggregated in SQL, which keeps
+queries fast with hundreds of thousands of edges."""
+import logging
+import sqlite3
+
+from utils import message_id_from_link, post_message_id
+
+logger = logging.getLogger(__name__)
+
+QUOTE_GRAPH_FILE = 'quote_graph.sqlite3'
+QUOTES_CSV_FILE = 'quotes.csv'
+# Rows of this many posts are written at a time
+WRITE_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    round_number INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (round_number, uid)
+);
+CREATE INDEX IF NOT EXISTS members_name ON members (round_number, name);
+CREATE TABLE IF NOT EXISTS posts (
+    round_number INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    datetime_utc TEXT,
+    PRIMARY KEY (round_number, message_id)
+);
+CREATE INDEX IF NOT EXISTS posts_uid ON posts (round_number, uid);
+CREATE TABLE IF NOT EXISTS quotes (
+    round_number INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    quoted_name TEXT,
+    quoted_message_id INTEGER,
+    quoted_datetime_utc TEXT,
+    PRIMARY KEY (round_number, message_id, position)
+);
+CREATE INDEX IF NOT EXISTS quotes_edge ON quotes (round_number, quoted_name, uid);
+"""
+
+# Quotes made by each member to other members of the same round
+MEMBER_EDGES_QUERY = """
+SELECT q.uid AS source, m.uid AS target, COUNT(*) AS quotes
+FROM quotes q JOIN members m ON m.round_number = q.round_number AND m.name = q.quoted_name
+WHERE q.round_number = ? AND m.uid != q.uid
+GROUP BY q.uid, m.uid
+"""
+
+
+def quote_graph_path(campaign_path):
+    """Path of the quote graph database of a campaign"""
+    return campaign_path / QUOTE_GRAPH_FILE
+
+
+def direct_quotes(post):
+    """Quotes of a post which are not inside other quotes"""
+    quotes = []
+    nodes = list(reversed((post.get('content') or {}).get('children', ())))
+    while nodes:
+        node = nodes.pop()
+        if node.get('type') == 'quote':
+            quotes.append(node)
+        elif children := node.get('children'):
+            nodes.extend(reversed(children))
+    return quotes
+
+
+def collect_rows(round_number, uid, post, post_rows, quote_rows):
+    """Append index rows of a post and its direct quotes to post_rows and quote_rows.
+    Posts without a message ID are skipped."""
+    if (message_id := post_message_id(post)) is None:
+        return
+    post_rows.append((round_number, message_id, int(uid), post.get('datetime_utc')))
+    for position, quote in enumerate(direct_quotes(post)):
+        quote_rows.append((
+            round_number, message_id, position, int(uid), quote.get('username'),
+            message_id_from_link(quote.get('url')), quote.get('datetime_utc')))
+
+
+def strongly_connected_components(graph):
+    """Strongly connected components of graph {node: set of nodes} using
+    Tarjan's algorithm without recursion"""
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in graph:
+        if root in index:
+            continue
+        work = [(root, iter(graph.get(root, ())))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    break
+                if successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = set()
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.add(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+class QuoteGraph:
+    """Quote graph of a campaign stored in a SQLite database"""
+    def __init__(self, path):
+        self.path = path
+        # Posts may be evaluated in a crawl thread, but never by two threads at once
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+
+    def close(self):
+        """Close database connection"""
+        self.connection.close()
+
+
+    def set_members(self, round_number, members):
+        """Set names of round members by UID whose quotes of each other are looked for"""
+        with self.connection:
+            self.connection.execute("DELETE FROM members WHERE round_number = ?", (round_number,))
+            self.connection.executemany(
+                "INSERT INTO members (round_number, uid, name) VALUES (?, ?, ?)",
+                [(round_number, int(uid), name) for uid, name in members.items() if name])
+
+
+    def add_posts(self, round_number, uid, posts):
+        """Add posts of a participant and their direct quotes to the index.
+        Returns amount of posts not in the index before."""
+        added = 0
+        post_rows, quote_rows = [], []
+        for post in posts:
+            collect_rows(round_number, uid, post, post_rows, quote_rows)
+            if len(post_rows) >= WRITE_BATCH_SIZE:
+                added += self.write_rows(post_rows, quote_rows)
+                post_rows, quote_rows = [], []
+        return added + self.write_rows(post_rows, quote_rows)
+
+
+    def indexing(self, round_number, uid, posts):
+        """Yield posts adding them to the index in batches as they go through. Only
+        rows of the batch are kept, not the posts."""
+        post_rows, quote_rows = [], []
+        for post in posts:
+            collect_rows(round_number, uid, post, post_rows, quote_rows)
+            yield post
+            if len(post_rows) >= WRITE_BATCH_SIZE:
+                self.write_rows(post_rows, quote_rows)
+                post_rows, quote_rows = [], []
+        self.write_rows(post_rows, quote_rows)
+
+
+    def write_rows(self, post_rows, quote_rows):
+        """Write rows of posts and their quotes. Returns amount of posts not in the
+        index before."""
+        with self.connection:
+            cursor = self.connection.executemany(
+                """INSERT OR IGNORE INTO posts (round_number, message_id, uid, datetime_utc)
+                VALUES (?, ?, ?, ?)""", post_rows)
+            added = cursor.rowcount
+            self.connection.executemany(
+                """INSERT OR IGNORE INTO quotes (round_number, message_id, position, uid,
+                quoted_name, quoted_message_id, quoted_datetime_utc)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""", quote_rows)
+        return added
+
+
+    def member_edges(self, round_number, min_quotes=1):
+        """Amount of quotes between members of a round by (source uid, target uid)"""
+        rows = self.connection.execute(
+            f"SELECT source, target, quotes FROM ({MEMBER_EDGES_QUERY}) WHERE quotes >= ?",
+            (round_number, min_quotes))
+        return {(source, target): quotes for source, target, quotes in rows}
+
+
+    def mutual_pairs(self, round_number, min_quotes=1):
+        """Pairs of members who have both quoted each other at least min_quotes times.
+        Returns (uid, uid, quotes of first, quotes of second) tuples."""
+        return self.connection.execute(
+            f"""WITH edges AS ({MEMBER_EDGES_QUERY})
+            SELECT a.source, a.target, a.quotes, b.quotes FROM edges a
+            JOIN edges b ON b.source = a.target AND b.target = a.source
+            WHERE a.source < a.target AND a.quotes >= ? AND b.quotes >= ?
+            ORDER BY a.quotes + b.quotes DESC""",
+            (round_number, min_quotes, min_quotes)).fetchall()
+
+
+    def rings(self, round_number, min_quotes=1):
+        """Groups of members who quote each other, directly or around a circle, each
+        quote at least min_quotes times. Largest groups first."""
+        graph = {}
+        for source, target in self.member_edges(round_number, min_quotes):
+            graph.setdefault(source, set()).add(target)
+        rings = [sorted(component) for component in strongly_connected_components(graph)
+                 if len(component) > 1]
+        return sorted(rings, key=len, reverse=True)
+
+
+    def member_quote_shares(self, round_number):
+        """Amount of posts of each member and how many of them quote other members.
+        Returns {uid: (posts, posts quoting members)}"""
+        rows = self.connection.execute(
+            """SELECT p.uid, COUNT(*), COUNT(member_quotes.message_id) FROM posts p
+            LEFT JOIN (
+                SELECT DISTINCT q.message_id FROM quotes q
+                JOIN members m ON m.round_number = q.round_number AND m.name = q.quoted_name
+                WHERE q.round_number = ? AND m.uid != q.uid
+            ) member_quotes ON member_quotes.message_id = p.message_id
+            WHERE p.round_number = ? GROUP BY p.uid""", (round_number, round_number))
+        return {uid: (posts, quoting) for uid, posts, quoting in rows}
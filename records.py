@@ -0,0 +1,229 @@
+"""Typed records of campaign and round participants and their JSON serialization.
+
+Participants are kept in memory as slotted dataclasses instead of dicts so that rounds
+with many participants take less memory. Records are converted from and to the dicts
+stored in metadata.json and round.json, which are read and written with orjson if it
+is installed and with the standard json module otherwise. Both give the same JSON: keys
+which are not strings are written as strings and integers wider than 64 bits are
+rejected when writing and read as floats."""
+import json
+from dataclasses import dataclass, fields, MISSING
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+UNKNOWN = 'unknown'
+
+# Fields of round.json participants and their allowed types.
+# Start stats are 'unknown' if round was added with a start time in the past.
+# Name is None in rounds written before profiles without a name were rejected.
+ROUND_PARTICIPANT_SCHEMA = {
+    'uid': (int,),
+    'name': (str, type(None)),
+    'rank': (str, type(None)),
+    'payment_address': (str, type(None)),
+    'start_time': (int, float),
+    'known_start_info': (bool,),
+    'start_post_count': (int, str),
+    'start_activity': (int, str),
+    'start_merit': (int, str),
+    'end_post_count': (int, type(None)),
+    'end_activity': (int, type(None)),
+    'end_merit': (int, type(None)),
+    'end_name': (str, type(None)),
+    'end_rank': (str, type(None)),
+    'post_count_difference': (int, str, type(None)),
+    'activity_gained': (int, str, type(None)),
+    'merit_gained': (int, str, type(None)),
+    'posts_made': (int, type(None)),
+    'accepted_posts': (int, type(None)),
+    'rejected_posts': (int, type(None)),
+    'rejection_reasons': (dict, type(None)),
+    'posting_sketch': (dict, type(None)),
+}
+
+# Fields of metadata.json participants and their allowed types
+PARTICIPANT_SCHEMA = {
+    'name': (str, type(None)),
+    'payment_address': (str, type(None)),
+}
+
+# Older versions wrote name of participants added through a round as username
+LEGACY_KEYS = {'username': 'name'}
+
+
+class RecordError(Exception):
+    """Represents participant data not matching the schema"""
+
+
+# Range of integers orjson can write
+MIN_JSON_INT = -2 ** 63
+MAX_JSON_INT = 2 ** 64 - 1
+
+
+def check_json_ints(data):
+    """Raise TypeError like orjson if data has an integer wider than 64 bits"""
+    values = [data]
+    while values:
+        value = values.pop()
+        if isinstance(value, dict):
+            values.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            values.extend(value)
+        elif (isinstance(value, int) and not isinstance(value, bool)
+              and not MIN_JSON_INT <= value <= MAX_JSON_INT):
+            raise TypeError("Integer exceeds 64-bit range")
+
+
+def json_int(digits):
+    """Integer read by the json module, a float like orjson reads it if too wide"""
+    value = int(digits)
+    return value if MIN_JSON_INT <= value <= MAX_JSON_INT else float(value)
+
+
+def dumps(data):
+    """Serialize data to a JSON string. Keys which are not strings, e.g. UIDs as
+    ints, are written as strings."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+    check_json_ints(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(json_string):
+    """Deserialize a JSON string. Errors are json.JSONDecodeError with both libraries."""
+    if orjson is not None:
+        return orjson.loads(json_string)
+    return json.loads(json_string, parse_int=json_int)
+
+
+def json_chunks(data, key, items):
+    """Yield JSON of data dict with key set to an object of (key, value) items, which
+    are serialized one at a time so that they do not need to be in memory at once"""
+    head = dumps(data)
+    yield head[:-1] + (',' if len(head) > 2 else '') + dumps(key) + ':{'
+    for i, (item_key, value) in enumerate(items):
+        yield (',' if i else '') + dumps(str(item_key)) + ':' + dumps(value)
+    yield '}}'
+
+
+def coerce_value(types, value):
+    """Value converted to a type allowed by the schema if it is a number written
+    as a string, as older versions wrote e.g. UIDs, otherwise value as it is"""
+    if isinstance(value, str) and int in types:
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    if isinstance(value, str) and float in types:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return value
+
+
+def check_schema(schema, data, required):
+    """Check that required keys exist and values have types allowed by schema.
+    Numbers written as strings are converted in place."""
+    if missing := [key for key in required if key not in data]:
+        raise RecordError(f"Participant is missing {', '.join(missing)}")
+    for key, value in data.items():
+        if key not in schema:
+            continue
+        value = data[key] = coerce_value(schema[key], value)
+        if not isinstance(value, schema[key]):
+            raise RecordError(f"Participant {key} has invalid value {value!r}")
+
+
+def split_known_keys(schema, data):
+    """Split data into values of the schema and other values, renaming legacy keys"""
+    known, extra = {}, {}
+    for key, value in data.items():
+        key = LEGACY_KEYS.get(key, key)
+        if key in schema:
+            known.setdefault(key, value)
+        else:
+            extra[key] = value
+    return known, extra
+
+
+@dataclass(slots=True)
+class Participant:
+    """Participant of a campaign as stored in metadata.json"""
+    name: str | None = None
+    payment_address: str | None = None
+    extra: dict | None = None
+
+    @classmethod
+    def from_dict(cls, data):
+        known, extra = split_known_keys(PARTICIPANT_SCHEMA, data)
+        check_schema(PARTICIPANT_SCHEMA, known, ())
+        return cls(**known, extra=extra or None)
+
+    def to_dict(self):
+        data = {'name': self.name, 'payment_address': self.payment_address}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+@dataclass(slots=True)
+class RoundParticipant:
+    """Participant of a round as stored in round.json. End stats are None
+    until the round has ended and are then left out of the dict."""
+    uid: int
+    name: str | None
+    rank: str | None
+    payment_address: str | None
+    start_time: int
+    known_start_info: bool
+    start_post_count: int | str
+    start_activity: int | str
+    start_merit: int | str
+    end_post_count: int | None = None
+    end_activity: int | None = None
+    end_merit: int | None = None
+    end_name: str | None = None
+    end_rank: str | None = None
+    post_count_difference: int | str | None = None
+    activity_gained: int | str | None = None
+    merit_gained: int | str | None = None
+    posts_made: int | None = None
+    accepted_posts: int | None = None
+    rejected_posts: int | None = None
+    rejection_reasons: dict | None = None
+    posting_sketch: dict | None = None
+    extra: dict | None = None
+
+    @classmethod
+    def from_dict(cls, data):
+        known, extra = split_known_keys(ROUND_PARTICIPANT_SCHEMA, data)
+        check_schema(ROUND_PARTICIPANT_SCHEMA, known, REQUIRED_ROUND_PARTICIPANT_FIELDS)
+        return cls(**known, extra=extra or None)
+
+    def to_dict(self):
+        data = {}
+        for key in ROUND_PARTICIPANT_SCHEMA:
+            value = getattr(self, key)
+            if value is not None or key in REQUIRED_ROUND_PARTICIPANT_FIELDS:
+                data[key] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+REQUIRED_ROUND_PARTICIPANT_FIELDS = tuple(
+    f.name for f in fields(RoundParticipant) if f.default is MISSING)
+
+
+def round_participants_from_dict(participants):
+    """Round participants of round.json as records by UID"""
+    return {uid: RoundParticipant.from_dict(data) for uid, data in participants.items()}
+
+
+def round_participants_to_dict(participants):
+    """Round participant records by UID as dicts of round.json"""
+    return {uid: participant.to_dict() for uid, participant in participants.items()}
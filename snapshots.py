@@ -0,0 +1,166 @@
+"""Snapshots of round participants taken while the round is running.
+
+Each snapshot records profile stats of every participant into snapshots.jl of the
+round folder and appends posts not seen before into snapshot_posts/UID.jl. When the
+round ends, only posts made after the latest snapshot need to be crawled and they are
+combined with posts of the snapshots. Snapshots also give daily curves of posts,
+activity and merit for each participant."""
+import csv
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime
+
+from estimate import longest_first, participant_post_rates
+from utils import post_message_id
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOTS_FILE = 'snapshots.jl'
+SNAPSHOT_POSTS_FOLDER = 'snapshot_posts'
+CURVES_FILE = 'curves.csv'
+# Posts made this long before latest snapshot are crawled again incase
+# they were not yet visible when snapshot was taken
+SNAPSHOT_OVERLAP_SECONDS = 3600
+
+
+def post_key(post):
+    """Key identifying a post, message ID if it has one"""
+    return post_message_id(post) or post.get('link')
+
+
+def read_snapshots(round_folder):
+    """Yield snapshot records of a round from oldest to newest"""
+    path = round_folder / SNAPSHOTS_FILE
+    if not path.is_file():
+        return
+    with path.open('r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def latest_snapshots(round_folder):
+    """Latest snapshot record of each participant"""
+    latest = {}
+    for record in read_snapshots(round_folder):
+        latest[record['uid']] = record
+    return latest
+
+
+def snapshot_posts_path(round_folder, uid):
+    """Path of file containing posts of participant found by snapshots"""
+    return round_folder / SNAPSHOT_POSTS_FOLDER / f"{uid}.jl"
+
+
+def snapshot_posts(round_folder, uid):
+    """Yield posts of participant found by snapshots"""
+    path = snapshot_posts_path(round_folder, uid)
+    if not path.is_file():
+        return
+    with path.open('r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def seen_post_keys(round_folder, uid):
+    """Keys of posts of participant found by snapshots"""
+    return {post_key(post) for post in snapshot_posts(round_folder, uid)}
+
+
+def crawl_start_timestamp(round_participant, latest_snapshot):
+    """Timestamp from which posts of participant need to be crawled"""
+    start_time = round_participant.get('start_time')
+    if latest_snapshot is None:
+        return start_time
+    return max(start_time, latest_snapshot['time'] - SNAPSHOT_OVERLAP_SECONDS)
+
+
+def unseen_posts(round_folder, uid, posts):
+    """Yield crawled posts not found by earlier snapshots"""
+    seen = seen_post_keys(round_folder, uid)
+    for post in posts:
+        if (key := post_key(post)) not in seen:
+            seen.add(key)
+            yield post
+
+
+def merge_snapshot_posts(round_folder, uid, posts):
+    """Yield posts found by snapshots followed by crawled posts not found by them"""
+    yield from snapshot_posts(round_folder, uid)
+    yield from unseen_posts(round_folder, uid, posts)
+
+
+def snapshot_record(uid, profile, new_posts, now):
+    """Snapshot record of profile stats of participant"""
+    return {
+        'uid': str(uid),
+        'time': now,
+        'time_utc': datetime.utcfromtimestamp(now).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        'post_count': profile.get('post_count'),
+        'activity': profile.get('activity'),
+        'merit': profile.get('merit'),
+        'new_posts': new_posts,
+    }
+
+
+def save_snapshot(round_folder, uid, profile, new_posts, now):
+    """Append new posts and stats of participant to the snapshot files"""
+    posts_path = snapshot_posts_path(round_folder, uid)
+    posts_path.parent.mkdir(exist_ok=True)
+    with posts_path.open('a') as f:
+        for post in new_posts:
+            f.write(json.dumps(post) + '\n')
+    with (round_folder / SNAPSHOTS_FILE).open('a') as f:
+        f.write(json.dumps(snapshot_record(uid, profile, len(new_posts), now)) + '\n')
+
+
+def take_snapshot(participants, round_folder, now, crawl):
+    """Crawl profiles and posts made since latest snapshot of each participant
+    and save them. Participants are crawled all at once using crawl function,
+    which takes (uid, start_timestamp) tasks and evaluate(uid, posts) function and
+    yields (uid, profile, new posts)."""
+    latest = latest_snapshots(round_folder)
+    tasks = longest_first(
+        [(uid, crawl_start_timestamp(participants[uid], latest.get(uid)))
+         for uid in participants],
+        now, participant_post_rates(round_folder.parent, participants, latest))
+    def new_posts(uid, posts):
+        return list(unseen_posts(round_folder, uid, posts))
+    for uid, profile, posts in crawl(tasks, evaluate=new_posts):
+        save_snapshot(round_folder, uid, profile, posts, now)
+        print(f"{len(posts)} new posts of {profile.get('name')} saved to snapshot")
+
+
+def daily_curves(round_folder):
+    """Posts made and profile stats at the end of each day for each participant.
+    Returns {uid: {day: {'posts': n, 'post_count': n, 'activity': n, 'merit': n}}}"""
+    curves = defaultdict(lambda: defaultdict(dict))
+    for record in read_snapshots(round_folder):
+        day = record['time_utc'][:10]
+        curves[record['uid']][day].update({
+            'post_count': record.get('post_count'),
+            'activity': record.get('activity'),
+            'merit': record.get('merit'),
+        })
+    for uid in list(curves):
+        for post in snapshot_posts(round_folder, uid):
+            day_values = curves[uid][post.get('datetime_utc', '')[:10]]
+            day_values['posts'] = day_values.get('posts', 0) + 1
+    return curves
+
+
+def write_curves_csv(round_folder, participants):
+    """Write daily curves of participants into curves.csv of round folder"""
+    curves = daily_curves(round_folder)
+    with (round_folder / CURVES_FILE).open('w', newline='') as f:
+        csv_writer = csv.writer(f, delimiter=';')
+        csv_writer.writerow(['uid', 'name', 'day', 'posts', 'post_count', 'activity', 'merit'])
+        for uid, days in curves.items():
+            name = participants.get(uid, {}).get('name')
+            for day in sorted(days):
+                values = days[day]
+                csv_writer.writerow([
+                    uid, name, day, values.get('posts', 0), values.get('post_count'),
+                    values.get('activity'), values.get('merit')])
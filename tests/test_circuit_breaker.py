@@ -0,0 +1,144 @@
+import asyncio
+import unittest
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+from twisted.internet.error import ConnectionRefusedError
+
+from bitcointalk_scraper.bitcointalk.forum_health import (
+    classify_response, FORUM_OK, FORUM_CHALLENGE, FORUM_DOWN, FORUM_RATE_LIMITED,
+    FORUM_MAINTENANCE, FORUM_UNREACHABLE)
+from bitcointalk_scraper.bitcointalk.middlewares import ForumHealthMiddleware
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN
+from manager import SpiderRunner
+from utils import ScrapingError
+
+FORUM_PAGE = '<html><body><div id="bodyarea">Posts about maintenance mode</div></body></html>'
+CHALLENGE_PAGE = '<html><head><title>Just a moment...</title></head><body></body></html>'
+
+
+class FakeTime:
+    """Clock and sleep of a breaker which only advance when slept"""
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def clock(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class ScriptedRunner(SpiderRunner):
+    """Spider runner whose crawls and probes find the forum in scripted states"""
+    def __init__(self, crawl_states, probe_states, breaker):
+        super().__init__(2, breaker)
+        self.crawl_states = list(crawl_states)
+        self.probe_states = list(probe_states)
+        self.crawls = 0
+
+    async def crawl(self, spider_name, on_item, kwargs):
+        self.crawls += 1
+        return [{'uid': 3}], self.crawl_states.pop(0)
+
+    async def probe(self):
+        return self.probe_states.pop(0)
+
+
+class TestForumHealth(unittest.TestCase):
+
+    def test_classify_response(self):
+        self.assertEqual(FORUM_OK, classify_response(200, FORUM_PAGE))
+        self.assertEqual(FORUM_CHALLENGE, classify_response(503, CHALLENGE_PAGE))
+        self.assertEqual(FORUM_CHALLENGE, classify_response(200, CHALLENGE_PAGE))
+        self.assertEqual(FORUM_RATE_LIMITED, classify_response(429, FORUM_PAGE))
+        self.assertEqual(FORUM_MAINTENANCE,
+                         classify_response(200, '<p>Forum is in maintenance mode</p>'))
+        self.assertEqual(FORUM_DOWN, classify_response(502, ''))
+
+    def test_middleware_keeps_latest_state(self):
+        stats = MemoryStatsCollector(get_crawler())
+        middleware = ForumHealthMiddleware(stats)
+        def respond(status, body, meta=None):
+            request = Request('https://bitcointalk.org/index.php', meta=meta or {})
+            middleware.process_response(request, HtmlResponse(
+                request.url, status=status, body=body.encode(), request=request), None)
+            return stats.get_value('forum/state')
+        self.assertEqual(FORUM_CHALLENGE, respond(503, CHALLENGE_PAGE))
+        # Retried request got through
+        self.assertEqual(FORUM_OK, respond(200, FORUM_PAGE))
+        middleware.process_exception(Request('https://bitcointalk.org/'), TimeoutError(), None)
+        self.assertEqual(FORUM_UNREACHABLE, stats.get_value('forum/state'))
+
+    def test_middleware_judges_proxied_responses(self):
+        stats = MemoryStatsCollector(get_crawler())
+        middleware = ForumHealthMiddleware(stats)
+        request = Request('https://bitcointalk.org/index.php',
+                          meta={'pool_proxy': 'http://10.0.0.1:3128'})
+        middleware.process_response(request, HtmlResponse(
+            request.url, status=503, body=CHALLENGE_PAGE.encode(), request=request), None)
+        self.assertEqual(FORUM_CHALLENGE, stats.get_value('forum/state'))
+        # Failing to connect to a proxy is left to the proxy pool
+        middleware.process_exception(request, ConnectionRefusedError(), None)
+        self.assertEqual(FORUM_CHALLENGE, stats.get_value('forum/state'))
+        middleware.process_exception(request, TimeoutError(), None)
+        self.assertEqual(FORUM_UNREACHABLE, stats.get_value('forum/state'))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.time = FakeTime()
+
+    def breaker(self, **kwargs):
+        return CircuitBreaker(failure_threshold=2, retry_seconds=10, clock=self.time.clock,
+                              sleep=self.time.sleep, **kwargs)
+
+    def test_opens_and_closes_after_probe(self):
+        breaker = self.breaker()
+        breaker.record_failure(FORUM_DOWN)
+        self.assertEqual(CLOSED, breaker.state)
+        breaker.record_failure(FORUM_DOWN)
+        self.assertEqual(OPEN, breaker.state)
+        probes = [FORUM_CHALLENGE, FORUM_OK]
+        async def probe():
+            return probes.pop(0)
+        asyncio.run(breaker.wait(probe))
+        self.assertEqual(CLOSED, breaker.state)
+        # Wait before the second probe was doubled
+        self.assertEqual([10, 20], self.time.slept)
+
+    def test_gives_up_after_max_pause(self):
+        breaker = self.breaker(max_pause=60)
+        breaker.trip(FORUM_CHALLENGE)
+        async def probe():
+            return FORUM_CHALLENGE
+        with self.assertRaises(CircuitOpenError) as context:
+            asyncio.run(breaker.wait(probe))
+        self.assertIn('challenge page', str(context.exception))
+        self.assertLessEqual(self.time.now, 60)
+
+    def test_max_pause_zero_stops_at_once(self):
+        breaker = self.breaker(max_pause=0)
+        breaker.trip(FORUM_UNREACHABLE)
+        async def probe():
+            raise AssertionError("Forum should not be probed")
+        with self.assertRaises(CircuitOpenError):
+            asyncio.run(breaker.wait(probe))
+        self.assertEqual([], self.time.slept)
+
+    def test_runner_pauses_and_retries_crawls(self):
+        runner = ScriptedRunner([FORUM_CHALLENGE, FORUM_CHALLENGE, FORUM_OK], [FORUM_OK],
+                                self.breaker())
+        self.assertEqual([{'uid': 3}], asyncio.run(runner.run('profile', uid='3')))
+        self.assertEqual(3, runner.crawls)
+        self.assertEqual([10], self.time.slept)
+
+    def test_runner_gives_up_on_crawl_failing_again(self):
+        runner = ScriptedRunner([FORUM_DOWN] * 3, [FORUM_OK], self.breaker(max_pause=600))
+        with self.assertRaises(ScrapingError):
+            asyncio.run(runner.run('profile', uid='3'))
+        self.assertEqual(3, runner.crawls)
@@ -4,7 +4,9 @@ import json
 import shutil
 from pathlib import Path
 
-from core import add_campaign, add_participant, remove_participant
+from core import add_campaign, add_participant, remove_participant, round_crawl_function
+from crawl_pool import crawl_participants
+from work_queue import crawl_participants_via_queue, END_STAGE
 
 class Namespace:
     """Class to mimic argparse namespace"""
@@ -56,3 +58,23 @@ class CampaignTestCase(unittest.TestCase):
         remove_participant(ns)
         metadata = get_metadata(self.metadata_path)
         self.assertEqual(None, metadata.get('participants').get('3'))
+
+
+class RoundCrawlFunctionTestCase(unittest.TestCase):
+    """Tests choosing how participants of a round are crawled"""
+    def test_crawled_on_event_loop(self):
+        self.assertIsNone(round_crawl_function(Namespace(), 'test_campaign', 1, END_STAGE))
+
+    def test_crawled_by_workers(self):
+        crawl = round_crawl_function(Namespace(workers=2, count_only=True), 'test_campaign', 1,
+                                     END_STAGE)
+        self.assertIs(crawl_participants, crawl.func)
+        self.assertEqual((2, True), (crawl.keywords['workers'], crawl.keywords['count_only']))
+
+    def test_crawled_via_queue(self):
+        queue_path = Path('queue.sqlite3')
+        crawl = round_crawl_function(Namespace(queue=queue_path, workers=2), 'test_campaign', 1,
+                                     END_STAGE)
+        self.assertIs(crawl_participants_via_queue, crawl.func)
+        self.assertEqual((queue_path, 'test_campaign', 1, END_STAGE), crawl.args)
+
@@ -0,0 +1,61 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+from bitcointalk_scraper.bitcointalk.item_store import ItemStore, ITEM_STORE_FILE
+from crawl_pool import shard_tasks, task_argument, read_worker_result
+from utils import CrawlerResultError
+
+
+class TestCrawlPool(unittest.TestCase):
+
+    def test_shard_tasks(self):
+        tasks = [(uid, 0) for uid in range(10)]
+        shards = shard_tasks(tasks, 3)
+        self.assertEqual(3, len(shards))
+        self.assertEqual(sorted(tasks), sorted(task for shard in shards for task in shard))
+
+    def test_more_workers_than_tasks(self):
+        self.assertEqual(2, len(shard_tasks([(1, 0), (2, 0)], 16)))
+
+    def test_task_argument(self):
+        self.assertEqual('3', task_argument('3', None))
+        self.assertEqual('3:1700000000', task_argument(3, 1700000000))
+
+    def test_read_worker_result(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ItemStore(Path(tmp) / ITEM_STORE_FILE)
+            store.add_items('profile', 3, [{'uid': 3, 'name': 'satoshi', 'post_count': 575,
+                                            'activity': 364, 'merit': 0, 'rank': 'Founder'}])
+            store.finish_crawl('profile', 3, 1, 0)
+            store.add_items('posts', 3, [
+                {'datetime_utc': '2023-01-01T00:00:00Z', 'link': 'a', 'message_id': None},
+                {'datetime_utc': '2023-01-02T00:00:00Z', 'link': 'b', 'message_id': None}])
+            store.finish_crawl('posts', 3, 2, 0)
+            store.add_items('post_count', 3, [{'uid': 3, 'posts_made': 2}])
+            store.finish_crawl('post_count', 3, 1, 0)
+            profile, posts_result = read_worker_result(store, 3, 0, False, True)
+            self.assertEqual('satoshi', profile.get('name'))
+            self.assertEqual({'posts_made': 2}, posts_result)
+            store.finish_crawl('post_count', 3, 1, 1)
+            with self.assertRaises(CrawlerResultError):
+                read_worker_result(store, 3, 0, True, False)
+            with self.assertRaises(CrawlerResultError):
+                read_worker_result(store, 5, None, False, False)
+            store.close()
+
+    def test_posts_keep_message_id(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ItemStore(Path(tmp) / ITEM_STORE_FILE)
+            store.add_items('profile', 3, [{'uid': 3, 'name': 'satoshi'}])
+            store.finish_crawl('profile', 3, 1, 0)
+            store.add_items('posts', 3, [
+                {'datetime_utc': '2023-01-01T00:00:00Z', 'link': 'a', 'message_id': 7}])
+            store.finish_crawl('posts', 3, 1, 0)
+            _, posts = read_worker_result(store, 3, 0, False, False,
+                                          lambda uid, posts: list(posts))
+            self.assertEqual([7], [post['message_id'] for post in posts])
+            store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import re
+import tempfile
+import unittest
+from pathlib import Path
+
+from scrapy.http import HtmlResponse
+
+from bitcointalk_scraper.bitcointalk.spiders.topic_spider import BitcointalkTopicSpider
+from enrollment import (parse_application, read_enrollment, NO_PAYMENT_ADDRESS,
+                        PROFILE_OF_ANOTHER_USER, NOT_A_FORM)
+from manager import CampaignManager
+
+ADDRESS = 'bc1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq'
+
+
+def form(uid, address=ADDRESS):
+    return (f"Bitcointalk username: user{uid}<br>"
+            f'Profile link: <a href="https://bitcointalk.org/index.php?action=profile;u={uid}">'
+            f"link</a><br>BTC address: {address}")
+
+
+def reply_row(msg_id, uid, body):
+    return f"""<tr><td class="poster_info"><b>
+<a href="https://bitcointalk.org/index.php?action=profile;u={uid}">user{uid}</a></b></td>
+<td class="td_headerandpost"><table><tr><td>
+<div class="subject"><a href="https://bitcointalk.org/index.php?topic=77.msg{msg_id}#msg{msg_id}">Re: Signup</a></div>
+<div class="smalltext">January 05, 2024, 01:00:00 PM</div></td></tr></table>
+<hr><div class="post">{body}</div></td></tr>"""
+
+
+class FakeTopic:
+    """Pages of a topic with replies (msg_id, uid, body)"""
+    def __init__(self, replies):
+        self.replies = replies
+        self.fetched = []
+
+    def response(self, url):
+        start = int(re.search(r'topic=77\.(\d+)', url).group(1))
+        # Forum shows the last page for offsets past the last reply
+        start = min(start, (len(self.replies) - 1) // 20 * 20)
+        self.fetched.append(start)
+        rows = ''.join(reply_row(*reply) for reply in self.replies[start:start + 20])
+        body = f'<html><body><table>{rows}</table></body></html>'
+        return HtmlResponse(url=url, body=body.encode(), encoding='utf-8')
+
+    def crawl(self, start=0, after_message=0, on_item=None):
+        spider = BitcointalkTopicSpider(topic='77', start=str(start),
+                                        after_message=str(after_message))
+        requests = list(spider.start_requests())
+        items = []
+        while requests:
+            request = requests.pop()
+            for output in request.callback(self.response(request.url), **request.cb_kwargs):
+                if hasattr(output, 'fields'):
+                    (on_item or items.append)(dict(output))
+                else:
+                    requests.append(output)
+        return items
+
+
+class TopicManager(CampaignManager):
+    """Manager reading replies of a fake topic"""
+    def __init__(self, data_folder, topic):
+        super().__init__(data_folder)
+        self.topic = topic
+        self.calls = []
+
+    async def fetch_topic_posts(self, topic, start=0, after_message=0, on_item=None):
+        self.calls.append((topic, start, after_message))
+        return self.topic.crawl(start, after_message, on_item)
+
+
+class TestEnrollment(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_folder = Path(self.tmp.name)
+        self.campaign_path = self.data_folder / 'test_campaign'
+        self.campaign_path.mkdir()
+        (self.campaign_path / 'metadata.json').write_text(json.dumps({
+            'campaign_name': 'test_campaign',
+            'participants': {'5': {'name': 'user5', 'payment_address': None}}}))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_application(self):
+        def application(uid, body):
+            topic = FakeTopic([(1, uid, body)])
+            return parse_application(topic.crawl()[0])
+        valid = application(3, form(3))
+        self.assertEqual((3, ADDRESS, None), (valid['uid'], valid['payment_address'],
+                                              valid['status']))
+        self.assertEqual('user3', valid['fields']['bitcointalk username'])
+        self.assertEqual(PROFILE_OF_ANOTHER_USER, application(4, form(3))['status'])
+        self.assertEqual(NO_PAYMENT_ADDRESS, application(3, form(3, 'later'))['status'])
+        self.assertEqual(NOT_A_FORM, application(3, 'Good luck with the campaign')['status'])
+
+    def test_enroll_and_resume(self):
+        replies = [(100, 1, 'Signup here')]
+        replies += [(100 + uid, uid, form(uid)) for uid in range(2, 46)]
+        topic = FakeTopic(replies)
+        manager = TopicManager(self.data_folder, topic)
+        applications = asyncio.run(manager.enroll_from_topic('test_campaign', 77))
+        self.assertEqual(44, len(applications))
+        participants = json.loads((self.campaign_path / 'metadata.json').read_text())[
+            'participants']
+        self.assertEqual(44, len(participants))
+        self.assertEqual(ADDRESS, participants['2']['payment_address'])
+        # Participant who was already in the campaign keeps their data
+        self.assertIsNone(participants['5']['payment_address'])
+        self.assertEqual({'topic': 77, 'page_start': 40, 'last_message_id': 145},
+                         read_enrollment(self.campaign_path))
+        # New replies are read starting from the page of the last reply gone through
+        replies.extend((100 + uid, uid, form(uid)) for uid in range(46, 70))
+        topic.fetched.clear()
+        applications = asyncio.run(manager.enroll_from_topic('test_campaign'))
+        self.assertEqual(list(range(46, 70)), [application['uid'] for application in applications])
+        self.assertEqual([40, 60], sorted(topic.fetched))
+        self.assertEqual((77, 40, 145), manager.calls[-1])
+        applications = asyncio.run(manager.enroll_from_topic('test_campaign'))
+        self.assertEqual([], applications)
+        self.assertEqual({'topic': 77, 'page_start': 60, 'last_message_id': 169},
+                         read_enrollment(self.campaign_path))
@@ -0,0 +1,67 @@
+import json
+import unittest
+import tempfile
+from pathlib import Path
+
+from estimate import (estimate_crawl, longest_first, post_rates, posts_pages,
+                      round_post_rates, spider_seconds, AUTOTHROTTLE_START_DELAY,
+                      DEFAULT_LATENCY)
+
+
+def write_round(campaign_path, round_number, ended, participants):
+    (campaign_path / str(round_number)).mkdir()
+    with (campaign_path / str(round_number) / 'round.json').open('w') as f:
+        json.dump({'round_number': round_number, 'ended': ended, 'round_start': 0,
+                   'round_end': 86400, 'participants': participants}, f)
+
+
+class TestEstimate(unittest.TestCase):
+
+    def test_posts_pages(self):
+        self.assertEqual(1, posts_pages(0))
+        self.assertEqual(2, posts_pages(20))
+        self.assertEqual(3, posts_pages(45))
+
+    def test_spider_seconds(self):
+        self.assertEqual(DEFAULT_LATENCY, spider_seconds(1))
+        # Delay is adjusted after each response like AutoThrottle does
+        self.assertEqual(DEFAULT_LATENCY + (AUTOTHROTTLE_START_DELAY + DEFAULT_LATENCY) / 2,
+                         spider_seconds(2))
+        self.assertLess(spider_seconds(20) - spider_seconds(19), AUTOTHROTTLE_START_DELAY)
+
+    def test_post_rates_from_latest_ended_round(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            campaign_path = Path(tmp)
+            write_round(campaign_path, 1, True, {'3': {'posts_made': 10}, '5': {'posts_made': 4}})
+            write_round(campaign_path, 2, True, {'3': {'posts_made': 20}})
+            write_round(campaign_path, 3, False, {'3': {}})
+            self.assertEqual({'3': 20 / 86400, '5': 4 / 86400}, post_rates(campaign_path))
+
+    def test_estimate_crawl(self):
+        rates = {'3': 40 / 86400, '5': 40 / 86400}
+        estimate = estimate_crawl([('3', 0), ('5', 0), ('7', 0)], 86400, rates)
+        self.assertEqual(3, estimate.participants)
+        self.assertEqual(1, estimate.participants_without_history)
+        self.assertEqual(120, estimate.expected_posts)
+        # Profile and 3 pages of posts with robots.txt for each participant
+        self.assertEqual(3 * (2 + 4), estimate.requests)
+        profiles_only = estimate_crawl([('3', None)], 86400, rates)
+        self.assertEqual(2, profiles_only.requests)
+        self.assertEqual(0, profiles_only.expected_posts)
+
+    def test_round_post_rates_from_snapshot(self):
+        participants = {'3': {'known_start_info': True, 'start_time': 0, 'start_post_count': 10},
+                        '5': {'known_start_info': False, 'start_time': 0}}
+        latest = {'3': {'uid': '3', 'time': 43200, 'post_count': 40},
+                  '5': {'uid': '5', 'time': 43200, 'post_count': 40}}
+        self.assertEqual({'3': 30 / 43200}, round_post_rates(participants, latest))
+
+    def test_longest_first(self):
+        rates = {'3': 10 / 86400, '5': 200 / 86400, '7': 10 / 86400}
+        tasks = [('3', 0), ('9', None), ('5', 0), ('7', 0)]
+        self.assertEqual([('5', 0), ('3', 0), ('7', 0), ('9', None)],
+                         longest_first(tasks, 86400, rates))
+        # Participants without history are estimated from the campaign median
+        self.assertEqual([('5', 0), ('11', 0), ('3', 0)],
+                         longest_first([('11', 0), ('5', 0), ('3', 0)], 86400,
+                                       {'3': 1 / 86400, '5': 200 / 86400, '7': 90 / 86400}))
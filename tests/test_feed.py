@@ -0,0 +1,134 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from scrapy import Request
+from scrapy.http import HtmlResponse
+
+from bitcointalk_scraper.bitcointalk.spiders.recent_spider import BitcointalkRecentSpider
+from feed import (save_feed_poll, covered_until, merge_feed_posts, feed_posts,
+                  poll_start_timestamp, feed_crawl_start_timestamp, FEED_OVERLAP_SECONDS)
+from manager import CampaignManager
+
+ROUND_START = 1704067200  # 2024-01-01T00:00:00Z
+
+
+def item(uid, msg_id, seconds):
+    """Post scraped by the recent spider made seconds after start of round"""
+    return {'uid': uid, 'name': f"user{uid}", 'content': {},
+            'datetime_utc': datetime.utcfromtimestamp(ROUND_START + seconds).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"),
+            'link': f"https://bitcointalk.org/index.php?topic=1.msg{msg_id}#msg{msg_id}"}
+
+
+def recent_page(posts):
+    """Recent posts page with posts (uid, msg_id, seconds), uid None for no author"""
+    tables = ''
+    for uid, msg_id, seconds in posts:
+        posted = datetime.utcfromtimestamp(ROUND_START + seconds)
+        author = (f'<a href="https://bitcointalk.org/index.php?action=profile;u={uid}">'
+                  f'user{uid}</a>' if uid else '')
+        tables += f"""<table><tr><td>{msg_id}</td>
+<td><a href="https://bitcointalk.org/index.php?topic=1.msg{msg_id}#msg{msg_id}">Re: topic</a></td>
+<td>on: {posted.strftime("%B %d, %Y, %I:%M:%S %p")}</td></tr>
+<tr><td colspan="3">by {author}</td></tr>
+<tr><td colspan="3"><div class="post">post {msg_id}</div></td></tr></table>"""
+    body = f'<html><body><div id="bodyarea">{tables}</div></body></html>'
+    return HtmlResponse(url="https://bitcointalk.org/index.php?action=recent",
+                        body=body.encode(), encoding='utf-8')
+
+
+class FeedManager(CampaignManager):
+    """Manager polling given recent posts"""
+    def __init__(self, data_folder, recent):
+        super().__init__(data_folder)
+        self.recent = recent
+
+    async def fetch_recent_posts(self, start_timestamp):
+        return self.recent
+
+
+class TestFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.round_folder = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_poll_saves_posts_of_participants(self):
+        items = [item(3, 12, 600), item(99, 11, 500), item(3, 10, 400), item(4, 9, -60)]
+        self.assertEqual(2, save_feed_poll(self.round_folder, {'3': {}, '4': {}}, items,
+                                           ROUND_START, ROUND_START + 700))
+        self.assertEqual(0, save_feed_poll(self.round_folder, {'3': {}, '4': {}}, items,
+                                           ROUND_START, ROUND_START + 800))
+        self.assertEqual(2, len(list(feed_posts(self.round_folder, 3))))
+        self.assertEqual([], list(feed_posts(self.round_folder, 4)))
+        self.assertEqual(ROUND_START + 800, covered_until(self.round_folder, ROUND_START))
+        self.assertEqual(ROUND_START + 800 - FEED_OVERLAP_SECONDS,
+                         poll_start_timestamp(self.round_folder, ROUND_START))
+
+    def test_recent_spider_skips_posts_without_author(self):
+        spider = BitcointalkRecentSpider(start_timestamp=str(ROUND_START))
+        list(spider.start_requests())
+        outputs = list(spider.parse(recent_page([(3, 12, 600), (None, 11, 500),
+                                                 (4, 10, 400)])))
+        self.assertEqual([(3, 12), (4, 10)],
+                         [(output['uid'], int(output['link'].rsplit('msg', 1)[1]))
+                          for output in outputs if not isinstance(output, Request)])
+        # Walk goes on to the next page
+        self.assertIsInstance(outputs[-1], Request)
+
+    def test_gap(self):
+        save_feed_poll(self.round_folder, {}, [item(3, 2, 500), item(3, 1, -1)],
+                       ROUND_START, ROUND_START + 1000)
+        # Second poll did not reach back to the first one
+        save_feed_poll(self.round_folder, {}, [item(3, 4, 5000), item(3, 3, 3000)],
+                       ROUND_START + 700, ROUND_START + 6000)
+        save_feed_poll(self.round_folder, {}, [item(3, 6, 7000), item(3, 5, 4000)],
+                       ROUND_START + 5700, ROUND_START + 8000)
+        until = covered_until(self.round_folder, ROUND_START)
+        self.assertEqual(ROUND_START + 1000, until)
+        self.assertEqual(ROUND_START + 1000 - FEED_OVERLAP_SECONDS,
+                         feed_crawl_start_timestamp(ROUND_START, until, ROUND_START + 8000))
+        self.assertIsNone(feed_crawl_start_timestamp(ROUND_START, until, ROUND_START + 1000))
+
+    def test_merge_feed_posts(self):
+        save_feed_poll(self.round_folder, {'3': {}},
+                       [item(3, 3, 900), item(3, 2, 500), item(3, 1, 100)],
+                       ROUND_START, ROUND_START + 1000)
+        crawled = [{'link': item(3, 4, 950)['link']}, {'link': item(3, 3, 900)['link']}]
+        merged = list(merge_feed_posts(self.round_folder, 3, crawled, ROUND_START + 300))
+        self.assertEqual(['3', '2', '4'], [post['link'][-1] for post in merged])
+
+    def test_end_round_with_feed(self):
+        data_folder = self.round_folder
+        round_folder = data_folder / 'test_campaign' / '1'
+        round_folder.mkdir(parents=True)
+        (data_folder / 'test_campaign' / 'metadata.json').write_text(json.dumps({
+            'campaign_name': 'test_campaign', 'participants': {'3': {}, '4': {}}}))
+        participants = {uid: {'uid': int(uid), 'name': f"user{uid}", 'rank': 'Member',
+                              'payment_address': None, 'start_time': ROUND_START,
+                              'known_start_info': True, 'start_post_count': 10,
+                              'start_activity': 10, 'start_merit': 0} for uid in '34'}
+        (round_folder / 'round.json').write_text(json.dumps({
+            'campaign_name': 'test_campaign', 'round_number': 1, 'ended': False,
+            'round_start': ROUND_START, 'participants': participants}))
+        save_feed_poll(round_folder, participants, [item(3, 1, 100), item(4, 0, -5)],
+                       ROUND_START, ROUND_START + 200)
+        manager = FeedManager(data_folder, [item(3, 3, 400), item(4, 2, 300), item(3, 1, 100)])
+        tasks = []
+        def crawl(crawl_tasks, evaluate=None):
+            tasks.extend(crawl_tasks)
+            return [(uid, {'uid': int(uid), 'name': f"user{uid}", 'post_count': 12,
+                           'activity': 12, 'merit': 0}, None) for uid, _ in crawl_tasks]
+        ended = asyncio.run(manager.end_round('test_campaign', 1, crawl=crawl))
+        self.assertEqual([('3', None), ('4', None)], sorted(tasks))
+        self.assertEqual(3, ended.posts_made)
+        participants = manager.read_round('test_campaign', 1)['participants']
+        self.assertEqual(2, participants['3']['posts_made'])
+        self.assertEqual(1, participants['4']['posts_made'])
@@ -0,0 +1,102 @@
+import json
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from locks import LockTimeoutError, campaign_lock, round_lock, write_atomically
+
+MAIN = Path(__file__).resolve().parent.parent / 'main.py'
+
+
+class TestLocks(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.campaign_path = Path(self.tmp.name) / 'test_campaign'
+        self.campaign_path.mkdir()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_writer_fails_fast(self):
+        with campaign_lock(self.campaign_path):
+            with self.assertRaises(LockTimeoutError):
+                with campaign_lock(self.campaign_path, timeout=0):
+                    pass
+            with self.assertRaises(LockTimeoutError):
+                with campaign_lock(self.campaign_path, exclusive=False, timeout=0.1):
+                    pass
+
+    def test_readers_share_lock(self):
+        with round_lock(self.campaign_path, 1, exclusive=False):
+            with round_lock(self.campaign_path, 1, exclusive=False, timeout=0):
+                pass
+            with self.assertRaises(LockTimeoutError):
+                with round_lock(self.campaign_path, 1, timeout=0):
+                    pass
+
+    def test_independent_locks(self):
+        with round_lock(self.campaign_path, 1):
+            with round_lock(self.campaign_path, 2, timeout=0), \
+                    campaign_lock(self.campaign_path, timeout=0):
+                pass
+
+    def test_write_atomically(self):
+        path = self.campaign_path / 'metadata.json'
+        write_atomically(path, '{"a": 1}')
+        write_atomically(path, '{"a": 2}')
+        self.assertEqual('{"a": 2}', path.read_text())
+        self.assertEqual(['metadata.json'], [p.name for p in self.campaign_path.iterdir()])
+
+
+class TestConcurrentCommands(unittest.TestCase):
+    """Runs many commands changing the same campaign and round at the same time"""
+
+    participants = 24
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_folder = Path(self.tmp.name)
+        campaign_path = self.data_folder / 'test_campaign'
+        (campaign_path / '1').mkdir(parents=True)
+        uids = [str(uid) for uid in range(1, self.participants + 1)]
+        (campaign_path / 'metadata.json').write_text(json.dumps({
+            'campaign_name': 'test_campaign',
+            'participants': {uid: {'name': f"user{uid}"} for uid in uids}}))
+        (campaign_path / '1' / 'round.json').write_text(json.dumps({
+            'campaign_name': 'test_campaign', 'round_number': 1, 'ended': False,
+            'round_start': 1700000000,
+            'participants': {uid: {'uid': int(uid), 'name': f"user{uid}"} for uid in uids}}))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_main(self, *args):
+        return subprocess.Popen(
+            [sys.executable, str(MAIN), '--data_folder', str(self.data_folder), *args],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def test_no_updates_are_lost(self):
+        processes = []
+        for uid in range(1, self.participants + 1):
+            if uid % 2:
+                processes.append(self.run_main(
+                    'campaign', 'add_payment_address', 'test_campaign', str(uid), f"addr{uid}"))
+            else:
+                processes.append(self.run_main(
+                    'round', 'add_payment_address', 'test_campaign', '1', str(uid),
+                    f"addr{uid}"))
+        for process in processes:
+            _, stderr = process.communicate(timeout=120)
+            self.assertEqual(0, process.returncode, stderr.decode())
+        campaign_path = self.data_folder / 'test_campaign'
+        metadata = json.loads((campaign_path / 'metadata.json').read_text())
+        round_dict = json.loads((campaign_path / '1' / 'round.json').read_text())
+        for uid in range(1, self.participants + 1):
+            self.assertEqual(f"addr{uid}",
+                             metadata['participants'][str(uid)].get('payment_address'))
+            if not uid % 2:
+                self.assertEqual(f"addr{uid}",
+                                 round_dict['participants'][str(uid)].get('payment_address'))
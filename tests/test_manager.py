@@ -0,0 +1,257 @@
+import asyncio
+import json
+import unittest
+import tempfile
+from pathlib import Path
+
+from manager import (CampaignManager, CampaignManagerError, RequestBudgetExceeded, Profile,
+                     CrawlResult, Round, SpiderRunner)
+from bitcointalk_scraper.bitcointalk.forum_health import FORUM_OK
+
+
+def profile(post_count, merit):
+    return {'uid': 3, 'name': 'satoshi', 'rank': 'Founder', 'post_count': post_count,
+            'activity': post_count, 'merit': merit}
+
+
+class BudgetedManager(CampaignManager):
+    """Manager crawling only given amount of participants on each crawl"""
+    def __init__(self, data_folder, participants_per_crawl):
+        super().__init__(data_folder)
+        self.participants_per_crawl = participants_per_crawl
+        self.crawled = []
+
+    async def crawl(self, tasks, count_only=False, verify_count=False, evaluate=None,
+                    crawl=None, max_requests=None, on_result=None):
+        tasks = list(tasks)[:self.participants_per_crawl]
+        self.crawled.extend(uid for uid, _ in tasks)
+        results = [CrawlResult(uid, Profile.from_dict(dict(profile(10, 5), uid=int(uid))),
+                               {'posts_made': 1} if start else None)
+                   for uid, start in tasks]
+        if on_result is None:
+            return results
+        for result in results:
+            on_result(result)
+        return []
+
+
+class StubSpiderRunner(SpiderRunner):
+    """Spider runner answering crawls without running spiders, each crawl making
+    requests_per_crawl requests"""
+    def __init__(self, requests_per_crawl):
+        super().__init__(concurrency=1)
+        self.requests_per_crawl = requests_per_crawl
+        self.crawls = []
+
+    async def crawl(self, spider_name, on_item, kwargs):
+        self.crawls.append((spider_name, kwargs.get('uid')))
+        self.requests += self.requests_per_crawl
+        if spider_name == 'profile':
+            return [dict(profile(10, 5), uid=int(kwargs['uid']))], FORUM_OK
+        return [], FORUM_OK
+
+
+def post(msg_id):
+    return {'datetime_utc': '2024-01-01T00:00:00Z', 'content': {},
+            'link': f"https://bitcointalk.org/index.php?topic=1.msg{msg_id}#msg{msg_id}"}
+
+
+class TestCampaignManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_folder = Path(self.tmp.name)
+        (self.data_folder / 'test_campaign').mkdir()
+        with (self.data_folder / 'test_campaign' / 'metadata.json').open('w') as f:
+            json.dump({'campaign_name': 'test_campaign',
+                       'participants': {'3': {'name': 'satoshi', 'payment_address': 'addr'}}}, f)
+        self.manager = CampaignManager(self.data_folder)
+        self.tasks = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def crawl_function(self, profile_item, posts):
+        def crawl(tasks, evaluate=None):
+            self.tasks.extend(tasks)
+            return [(uid, profile_item, evaluate(uid, iter(posts)) if start else None)
+                    for uid, start in tasks]
+        return crawl
+
+    def test_add_and_end_round(self):
+        added = asyncio.run(self.manager.add_round(
+            'test_campaign', 1, crawl=self.crawl_function(profile(10, 5), [])))
+        self.assertFalse(added.ended)
+        self.assertEqual([('3', None)], self.tasks)
+        participant = added.participants['3']
+        self.assertEqual(10, participant.start_post_count)
+        self.assertEqual('addr', participant.payment_address)
+
+        ended = asyncio.run(self.manager.end_round(
+            'test_campaign', 1,
+            crawl=self.crawl_function(profile(14, 6), [post(i) for i in range(4)])))
+        self.assertEqual((1, 4), (ended.participants, ended.posts_made))
+        self.assertEqual(('3', added.round_start), self.tasks[-1])
+        participant = Round.from_dict(
+            self.manager.read_round('test_campaign', 1)).participants['3']
+        self.assertEqual(4, participant.post_count_difference)
+        self.assertEqual(1, participant.merit_gained)
+        self.assertEqual(4, participant.posts_made)
+        with (self.data_folder / 'test_campaign' / '1' / 'round.json').open() as f:
+            saved = json.load(f)
+        self.assertTrue(saved['ended'])
+        self.assertNotIn('accepted_posts', saved['participants']['3'])
+        self.assertTrue((self.data_folder / 'test_campaign' / 'quote_graph.sqlite3').is_file())
+
+    def test_round_errors(self):
+        crawl = self.crawl_function(profile(10, 5), [])
+        with self.assertRaises(CampaignManagerError):
+            asyncio.run(self.manager.add_round('no_campaign', 1, crawl=crawl))
+        with self.assertRaises(CampaignManagerError):
+            asyncio.run(self.manager.end_round('test_campaign', 1, crawl=crawl))
+        asyncio.run(self.manager.add_round('test_campaign', 1, crawl=crawl))
+        with self.assertRaises(CampaignManagerError):
+            asyncio.run(self.manager.add_round('test_campaign', 1, crawl=crawl))
+        asyncio.run(self.manager.end_round('test_campaign', 1, crawl=crawl))
+        with self.assertRaises(CampaignManagerError):
+            asyncio.run(self.manager.end_round('test_campaign', 1, crawl=crawl))
+
+    def test_rollover_round(self):
+        added = asyncio.run(self.manager.add_round(
+            'test_campaign', 1, crawl=self.crawl_function(profile(10, 5), [])))
+        with (self.data_folder / 'test_campaign' / 'metadata.json').open('w') as f:
+            json.dump({'campaign_name': 'test_campaign', 'participants': {
+                '3': {'name': 'satoshi', 'payment_address': 'addr'}, '4': {'name': 'hal'}}}, f)
+        self.tasks.clear()
+        start_tasks = []
+        def start_crawl(tasks):
+            start_tasks.extend(tasks)
+            return [(uid, dict(profile(7, 1), uid=4, name='hal'), None) for uid, _ in tasks]
+        ended, new_round = asyncio.run(self.manager.rollover_round(
+            'test_campaign', 1,
+            crawl=self.crawl_function(dict(profile(14, 6), rank='Legendary'), [post(1)]),
+            start_crawl=start_crawl))
+        self.assertEqual([('3', added.round_start)], self.tasks)
+        self.assertEqual([('4', None)], start_tasks)
+        self.assertEqual((1, 1), (ended.participants, ended.posts_made))
+        self.assertEqual(2, new_round.round_number)
+        self.assertEqual(ended.round_end, new_round.round_start)
+        participant = new_round.participants['3']
+        self.assertEqual((14, 6, True), (participant.start_post_count, participant.start_merit,
+                                         participant.known_start_info))
+        # Rank at the end of the ended round is the rank of the new round
+        self.assertEqual('Legendary', participant.rank)
+        self.assertEqual(ended.round_end, participant.start_time)
+        self.assertEqual('addr', participant.payment_address)
+        # Participants who were not in the ended round start when they were crawled
+        self.assertEqual(7, new_round.participants['4'].start_post_count)
+        self.assertGreaterEqual(new_round.participants['4'].start_time, ended.round_end)
+        with self.assertRaises(CampaignManagerError):
+            asyncio.run(self.manager.rollover_round('test_campaign', 1))
+
+    def test_rollover_estimate_includes_new_participants(self):
+        asyncio.run(self.manager.add_round(
+            'test_campaign', 1, crawl=self.crawl_function(profile(10, 5), [])))
+        with (self.data_folder / 'test_campaign' / 'metadata.json').open('w') as f:
+            json.dump({'campaign_name': 'test_campaign', 'participants': {
+                '3': {'name': 'satoshi'}, '4': {'name': 'hal'}, '5': {'name': 'nick'}}}, f)
+        end_estimate = self.manager.estimate_end_round('test_campaign', 1)
+        estimate = self.manager.estimate_rollover_round('test_campaign', 1)
+        self.assertEqual(3, estimate.participants)
+        # Profiles of the two new participants are crawled after the round has ended
+        self.assertEqual(end_estimate.requests + 4, estimate.requests)
+        self.assertGreater(estimate.seconds, end_estimate.seconds)
+
+    def test_rollover_continues_after_budget(self):
+        with (self.data_folder / 'test_campaign' / 'metadata.json').open('w') as f:
+            json.dump({'campaign_name': 'test_campaign', 'participants': {
+                '3': {'name': 'satoshi'}, '4': {'name': 'hal'}, '5': {'name': 'nick'}}}, f)
+        manager = BudgetedManager(self.data_folder, 3)
+        asyncio.run(manager.add_round('test_campaign', 1))
+        manager.participants_per_crawl = 2
+        manager.crawled.clear()
+        with self.assertRaises(RequestBudgetExceeded):
+            asyncio.run(manager.rollover_round('test_campaign', 1, max_requests=10))
+        self.assertFalse((self.data_folder / 'test_campaign' / '2').exists())
+        ended, new_round = asyncio.run(
+            manager.rollover_round('test_campaign', 1, max_requests=10))
+        # Profiles are crawled once, when ending the round
+        self.assertEqual(['3', '4', '5'], manager.crawled)
+        self.assertEqual({'3', '4', '5'}, set(new_round.participants))
+        self.assertEqual({ended.round_end},
+                         {participant.start_time
+                          for participant in new_round.participants.values()})
+
+    def test_request_budget_of_spiders(self):
+        with (self.data_folder / 'test_campaign' / 'metadata.json').open('w') as f:
+            json.dump({'campaign_name': 'test_campaign', 'participants': {
+                '3': {'name': 'satoshi'}, '4': {'name': 'hal'}, '5': {'name': 'nick'}}}, f)
+        manager = CampaignManager(self.data_folder, concurrency=1)
+        manager.spiders = StubSpiderRunner(2)
+        # No participant is started after the budget has been used
+        with self.assertRaises(RequestBudgetExceeded):
+            asyncio.run(manager.add_round('test_campaign', 1, max_requests=3))
+        self.assertEqual([('profile', '3'), ('profile', '4')], manager.spiders.crawls)
+        added = asyncio.run(manager.add_round('test_campaign', 1, max_requests=3))
+        self.assertEqual([('profile', '3'), ('profile', '4'), ('profile', '5')],
+                         manager.spiders.crawls)
+        self.assertEqual({'3', '4', '5'}, set(added.participants))
+
+        manager.spiders.crawls.clear()
+        with self.assertRaises(RequestBudgetExceeded):
+            asyncio.run(manager.end_round('test_campaign', 1, max_requests=4))
+        # Posts and profile of a participant are crawled before the budget is checked
+        self.assertEqual({'3'}, {uid for _, uid in manager.spiders.crawls})
+        asyncio.run(manager.end_round('test_campaign', 1))
+        self.assertEqual(['3', '4', '5'],
+                         list(manager.read_round('test_campaign', 1)['participants']))
+
+    def test_end_round_keeps_participant_order(self):
+        with (self.data_folder / 'test_campaign' / 'metadata.json').open('w') as f:
+            json.dump({'campaign_name': 'test_campaign', 'participants': {
+                '3': {'name': 'satoshi'}, '4': {'name': 'hal'}, '5': {'name': 'nick'}}}, f)
+        def crawl(tasks, evaluate=None):
+            return [(uid, dict(profile(10, 5), uid=int(uid)),
+                     evaluate(uid, iter(())) if start else None)
+                    for uid, start in reversed(list(tasks))]
+        asyncio.run(self.manager.add_round('test_campaign', 1, crawl=crawl))
+        order = list(self.manager.read_round('test_campaign', 1)['participants'])
+        asyncio.run(self.manager.end_round('test_campaign', 1, crawl=crawl))
+        self.assertEqual(order, list(self.manager.read_round('test_campaign', 1)['participants']))
+
+    def test_profile_from_dict(self):
+        self.assertEqual(Profile(3, 'satoshi', 'Founder', 10, 10, 5),
+                         Profile.from_dict(profile(10, 5)))
+
+    def test_request_budget_checkpoint(self):
+        with (self.data_folder / 'test_campaign' / 'metadata.json').open('w') as f:
+            json.dump({'campaign_name': 'test_campaign', 'participants': {
+                '3': {'name': 'satoshi'}, '4': {'name': 'hal'}, '5': {'name': 'nick'}}}, f)
+        manager = BudgetedManager(self.data_folder, 2)
+        with self.assertRaises(RequestBudgetExceeded):
+            asyncio.run(manager.add_round('test_campaign', 1, max_requests=10))
+        self.assertFalse((self.data_folder / 'test_campaign' / '1').exists())
+        added = asyncio.run(manager.add_round('test_campaign', 1, max_requests=10))
+        self.assertEqual(['3', '4', '5'], manager.crawled)
+        self.assertEqual({'3', '4', '5'}, set(added.participants))
+        self.assertEqual([], list((self.data_folder / 'test_campaign').glob('.checkpoint*')))
+
+        manager.crawled.clear()
+        finalized_path = self.data_folder / 'test_campaign' / '1' / 'finalized.jl'
+        with self.assertRaises(RequestBudgetExceeded):
+            asyncio.run(manager.end_round('test_campaign', 1, max_requests=10))
+        # Finalized participants are visible before the round has ended
+        with finalized_path.open() as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([3, 4], [line['uid'] for line in lines[1:]])
+        self.assertEqual(1, lines[1]['posts_made'])
+        # Line being written when ending stopped is dropped
+        with finalized_path.open('a') as f:
+            f.write('{"uid": 5, "na')
+        ended = asyncio.run(manager.end_round('test_campaign', 1, max_requests=10))
+        self.assertEqual(['3', '4', '5'], manager.crawled)
+        self.assertEqual(lines[0]['time'] // 1, ended.round_end)
+        self.assertEqual(3, ended.participants)
+        self.assertEqual(['3', '4', '5'],
+                         list(manager.read_round('test_campaign', 1)['participants']))
+        self.assertFalse(finalized_path.exists())
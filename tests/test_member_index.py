@@ -0,0 +1,88 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from scrapy.http import HtmlResponse, Request
+
+from bitcointalk_scraper.bitcointalk.spiders.profile_spider import BitcointalkProfileSpider
+from manager import CampaignManager, Profile
+from member_index import MemberIndex, member_index_path
+
+PROFILE_PAGE = """<html><body><table>
+<tr><td><b>Name:</b></td><td>satoshi</td></tr>
+<tr><td><b>Posts:</b></td><td>575</td></tr>
+<tr><td><b>Activity:</b></td><td>364</td></tr>
+<tr><td><b><a>Merit</a>:</b></td><td>21</td></tr>
+<tr><td><b>Position:</b></td><td>Founder</td></tr>
+</table>
+<a href="https://bitcointalk.org/index.php?action=profile;u=3;sa=showPosts">Show posts</a>
+</body></html>"""
+
+
+class NameManager(CampaignManager):
+    """Manager finding profiles of given users by name"""
+    def __init__(self, data_folder, users):
+        super().__init__(data_folder)
+        self.users = users
+        self.fetched = []
+
+    async def fetch_profile_by_name(self, name):
+        self.fetched.append(name)
+        if (uid := self.users.get(name.lower())) is None:
+            return None
+        self.index_members([(uid, name)])
+        return Profile(uid, name, 'Member', 10, 10, 0)
+
+
+class TestMemberIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_folder = Path(self.tmp.name)
+        self.index = MemberIndex(member_index_path(self.data_folder))
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def test_resolve_case_insensitive(self):
+        self.index.add([(3, 'satoshi'), (5, 'Theymos')])
+        self.assertEqual({'Satoshi': 3, 'theymos': 5},
+                         self.index.resolve(['Satoshi', 'theymos', 'nobody']))
+
+    def test_name_changes(self):
+        self.index.add([(3, 'oldname')], seen=100)
+        self.index.add([(3, 'newname')], seen=200)
+        self.assertEqual({'oldname': 3, 'newname': 3},
+                         self.index.resolve(['oldname', 'newname']))
+        self.assertEqual(['newname', 'oldname'], self.index.names(3))
+        # Name taken by another user later, but older sightings do not take it back
+        self.index.add([(7, 'oldname')], seen=300)
+        self.index.add([(3, 'oldname')], seen=250)
+        self.assertEqual({'oldname': 7}, self.index.resolve(['oldname']))
+
+    def test_batches(self):
+        self.index.add([(uid, f"user{uid}") for uid in range(1200)])
+        resolved = self.index.resolve([f"user{uid}" for uid in range(1200)])
+        self.assertEqual(1200, len(resolved))
+        self.assertEqual(1199, resolved['user1199'])
+
+    def test_manager_crawls_only_misses(self):
+        self.index.add([(3, 'satoshi')])
+        manager = NameManager(self.data_folder, {'theymos': 35, 'hhampuz': 1})
+        resolved = asyncio.run(manager.resolve_usernames(['satoshi', 'theymos', 'ghost']))
+        self.assertEqual({'satoshi': 3, 'theymos': 35, 'ghost': None}, resolved)
+        self.assertEqual(['theymos', 'ghost'], manager.fetched)
+        manager.fetched.clear()
+        asyncio.run(manager.resolve_usernames(['Theymos', 'satoshi']))
+        self.assertEqual([], manager.fetched)
+
+    def test_profile_by_username(self):
+        spider = BitcointalkProfileSpider(username='satoshi')
+        request = next(iter(spider.start_requests()))
+        self.assertTrue(request.url.endswith('action=profile;user=satoshi'))
+        response = HtmlResponse(url=request.url, body=PROFILE_PAGE.encode(),
+                                encoding='utf-8', request=Request(request.url))
+        profile = next(iter(spider.parse(response)))
+        self.assertEqual((3, 'satoshi'), (profile['uid'], profile['name']))
@@ -0,0 +1,40 @@
+import unittest
+
+from bitcointalk_scraper.bitcointalk.page_search import PageBoundarySearch
+
+
+def run_search(newer_posts, total_posts, page_size=20):
+    """Run search against a user with total_posts of which newer_posts are newer
+    than start of round. Returns result and amount of pages fetched."""
+    search = PageBoundarySearch(page_size)
+    fetched = 0
+    while (page := search.next_page()) is not None:
+        fetched += 1
+        first = page * page_size
+        total = max(0, min(page_size, total_posts - first))
+        newer = max(0, min(total, newer_posts - first))
+        search.record(page, newer, total)
+    return search.result(), fetched
+
+
+class TestPageBoundarySearch(unittest.TestCase):
+
+    def test_counts_match_walk(self):
+        for total_posts in (0, 5, 20, 21, 40, 399, 1000):
+            for newer_posts in range(0, total_posts + 1, 7):
+                result, _ = run_search(newer_posts, total_posts)
+                self.assertEqual(newer_posts, result)
+
+    def test_all_posts_newer(self):
+        self.assertEqual((40, 3), run_search(40, 40))
+
+    def test_logarithmic_requests(self):
+        result, fetched = run_search(20 * 5000 + 3, 20 * 10000)
+        self.assertEqual(20 * 5000 + 3, result)
+        self.assertLess(fetched, 30)
+
+    def test_first_page_is_boundary(self):
+        self.assertEqual((3, 1), run_search(3, 500))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from core import write_metadata, write_round_data
+from participant_index import participant_index_path, open_participant_index
+from records import dumps
+
+
+def metadata(campaign_name, participants):
+    return {'campaign_name': campaign_name, 'participants': {
+        str(uid): {'name': f"user{uid}", 'payment_address': address}
+        for uid, address in participants.items()}}
+
+
+def round_dict(round_number, participants):
+    return {'round_number': round_number, 'ended': False, 'participants': {
+        str(uid): {'uid': uid, 'payment_address': address}
+        for uid, address in participants.items()}}
+
+
+class TestParticipantIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_folder = Path(self.tmp.name)
+        self.write_campaign('first', {3: 'bc1qa', 5: 'bc1qb'})
+        self.write_round('first', 1, {3: 'bc1qa'})
+        self.write_campaign('second', {3: 'bc1qc', 7: None})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_campaign(self, campaign_name, participants):
+        (self.data_folder / campaign_name).mkdir(exist_ok=True)
+        write_metadata(self.data_folder, campaign_name, metadata(campaign_name, participants))
+
+    def write_round(self, campaign_name, round_number, participants):
+        (self.data_folder / campaign_name / str(round_number)).mkdir(exist_ok=True)
+        write_round_data(self.data_folder / campaign_name, round_number,
+                         round_dict(round_number, participants))
+
+    def index(self):
+        index = open_participant_index(self.data_folder)
+        self.addCleanup(index.close)
+        return index
+
+    def test_built_from_data_folder(self):
+        index = self.index()
+        self.assertEqual([('first', 'bc1qa'), ('second', 'bc1qc')], index.campaigns(3))
+        self.assertEqual([('first', 1, 'bc1qa')], index.rounds(3))
+        self.assertEqual([(5, 'first', None)], index.address_uids('bc1qb'))
+        self.assertEqual([], index.campaigns(9))
+
+    def test_kept_up_to_date_by_writes(self):
+        index = self.index()
+        self.write_campaign('first', {3: 'bc1qa', 9: 'bc1qb'})
+        self.write_campaign('third', {11: 'bc1qa'})
+        header = {'round_number': 2, 'ended': True}
+        (self.data_folder / 'first' / '2').mkdir()
+        # Rounds ending are written in chunks
+        write_round_data(self.data_folder / 'first', 2, header,
+                         iter([('9', {'uid': 9, 'payment_address': 'bc1qd'})]))
+        self.assertEqual([], index.campaigns(5))
+        self.assertEqual([('first', 'bc1qb')], index.campaigns(9))
+        self.assertEqual([('first', 2, 'bc1qd')], index.rounds(9))
+        self.assertEqual({'bc1qa': [3, 11]}, index.shared_addresses())
+
+    def test_writes_without_index(self):
+        self.assertFalse(participant_index_path(self.data_folder).exists())
+
+    def test_rebuild_picks_up_manual_changes(self):
+        index = self.index()
+        (self.data_folder / 'second' / 'metadata.json').write_text(
+            dumps(metadata('second', {13: 'bc1qe'})))
+        (self.data_folder / 'broken').mkdir()
+        (self.data_folder / 'broken' / 'metadata.json').write_text('{')
+        with self.assertLogs('participant_index', 'WARNING'):
+            self.assertEqual(3, index.rebuild(self.data_folder))
+        self.assertEqual([('first', 'bc1qa')], index.campaigns(3))
+        self.assertEqual([(13, 'second', None)], index.address_uids('bc1qe'))
@@ -0,0 +1,70 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+from scrapy import Spider
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.test import get_crawler
+
+from bitcointalk_scraper.bitcointalk.item_store import ItemStore, ITEM_STORE_FILE
+from bitcointalk_scraper.bitcointalk.items import PostItem, ProfileItem
+from bitcointalk_scraper.bitcointalk.pipelines import BitcointalkPipeline, ItemStorePipeline
+
+
+def post_item(msg_id, datetime_utc='2024-01-01T00:00:00Z'):
+    return PostItem(datetime_utc=datetime_utc, content={},
+                    link=f"https://bitcointalk.org/index.php?topic=1.msg{msg_id}#msg{msg_id}")
+
+
+class TestPipelines(unittest.TestCase):
+
+    def setUp(self):
+        self.spider = Spider('posts', uid='3')
+
+    def test_profile_normalized(self):
+        item = ProfileItem(uid='3', name='satoshi', post_count='1,234', activity=364.0,
+                           merit=0, rank='Founder')
+        BitcointalkPipeline().process_item(item, self.spider)
+        self.assertEqual({'uid': 3, 'name': 'satoshi', 'post_count': 1234, 'activity': 364,
+                          'merit': 0, 'rank': 'Founder'}, dict(item))
+
+    def test_post_message_id(self):
+        item = BitcointalkPipeline().process_item(post_item(123), self.spider)
+        self.assertEqual(123, item['message_id'])
+
+    def test_invalid_items_dropped(self):
+        pipeline = BitcointalkPipeline()
+        for item in [ProfileItem(name='satoshi'), ProfileItem(uid='three'),
+                     post_item(1, '01.01.2024'), PostItem(datetime_utc='2024-01-01T00:00:00Z')]:
+            with self.subTest(item=item), self.assertRaises(DropItem):
+                pipeline.process_item(item, self.spider)
+
+    def test_item_store_pipeline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / ITEM_STORE_FILE
+            crawler = get_crawler(settings_dict={'ITEM_STORE': str(path),
+                                                 'ITEM_STORE_BATCH_SIZE': 2})
+            crawler.stats.open_spider(self.spider)
+            pipeline = ItemStorePipeline.from_crawler(crawler)
+            pipeline.open_spider(self.spider)
+            for msg_id in range(3):
+                pipeline.process_item(
+                    BitcointalkPipeline().process_item(post_item(msg_id), self.spider),
+                    self.spider)
+            store = ItemStore(path)
+            # Third item is waiting for the batch to fill
+            self.assertEqual(2, len(list(store.items('posts', 3))))
+            self.assertIsNone(store.crawl('posts', 3))
+            crawler.stats.inc_value('item_dropped_count', spider=self.spider)
+            pipeline.close_spider(self.spider)
+            self.assertEqual([0, 1, 2],
+                             [item['message_id'] for item in store.items('posts', 3)])
+            self.assertEqual((3, 1), store.crawl('posts', 3))
+            store.close()
+
+    def test_item_store_not_configured(self):
+        with self.assertRaises(NotConfigured):
+            ItemStorePipeline.from_crawler(get_crawler())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import re
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from scrapy.http import HtmlResponse
+
+from bitcointalk_scraper.bitcointalk.spiders.verify_posts_spider import (
+    BitcointalkVerifyPostsSpider)
+from post_cache import PostCache, content_hash, WRITE_BATCH_SIZE
+
+ROUND_START = 1704067200  # 2024-01-01T00:00:00Z
+ROUND_END = ROUND_START + 100 * 3600
+
+
+def post_table(msg_id, hours, text):
+    """Post table of a showPosts page made hours after start of round"""
+    posted = datetime.utcfromtimestamp(ROUND_START + hours * 3600)
+    return f"""<table><tr><td>{msg_id}</td>
+<td><a href="https://bitcointalk.org/index.php?topic=1.msg{msg_id}#msg{msg_id}">Re: topic</a></td>
+<td>on: {posted.strftime("%B %d, %Y, %I:%M:%S %p")}</td></tr>
+<tr><td colspan="3"><div class="post">{text}</div></td></tr></table>"""
+
+
+class FakeForum:
+    """showPosts pages of a user with posts (msg_id, hours, text), newest first"""
+    def __init__(self, posts, page_size=20):
+        self.posts = posts
+        self.page_size = page_size
+        self.fetched = []
+
+    def response(self, url):
+        start = int(match.group(1)) if (match := re.search(r';start=(\d+)', url)) else 0
+        # Forum shows the last page for offsets past the last post
+        last_start = max(0, (len(self.posts) - 1) // self.page_size * self.page_size)
+        start = min(start, last_start)
+        self.fetched.append(start // self.page_size)
+        tables = ''.join(post_table(*post) for post in self.posts[start:start + self.page_size])
+        body = f'<html><body><div id="bodyarea">{tables}</div></body></html>'
+        return HtmlResponse(url=url, body=body.encode(), encoding='utf-8')
+
+    def crawl(self, known_page_hashes=()):
+        """Run the verify_posts spider against the pages and return its items"""
+        spider = BitcointalkVerifyPostsSpider(
+            uid='3', start_timestamp=str(ROUND_START), end_timestamp=str(ROUND_END),
+            known_page_hashes=','.join(known_page_hashes))
+        requests = list(spider.start_requests())
+        items = []
+        while requests:
+            request = requests.pop()
+            for output in request.callback(self.response(request.url), **request.cb_kwargs):
+                if isinstance(output, dict) or hasattr(output, 'fields'):
+                    items.append(dict(output))
+                else:
+                    requests.append(output)
+        return items
+
+
+def user_posts(after=0, during=50, before=30, edits=None):
+    """Posts of a user made after the round, during it and before it, newest first"""
+    edits = edits or {}
+    posts = [(10000 + i, 150 + after - i, 'later') for i in range(after)]
+    posts += [(1000 + i, 99 - i, edits.get(1000 + i, f"post {i}")) for i in range(during)]
+    posts += [(100 + i, -1 - i, 'earlier') for i in range(before)]
+    return posts
+
+
+class TestPostCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = PostCache(Path(self.tmp.name) / 'post_cache.sqlite3')
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def cache_round_posts(self, posts):
+        """Cache posts as they were evaluated when the round ended"""
+        forum = FakeForum(posts)
+        items = forum.crawl()
+        round_posts = [post for item in items for post in item['posts']]
+        self.assertEqual(list(round_posts), list(self.cache.caching(1, '3', iter(round_posts))))
+
+    def test_spider_fetches_only_round_pages(self):
+        forum = FakeForum(user_posts(after=45, during=50, before=200))
+        items = forum.crawl()
+        posts = [post for item in items for post in item['posts']]
+        self.assertEqual(list(range(1000, 1050)),
+                         sorted(int(post['link'].rsplit('msg', 1)[1]) for post in posts))
+        self.assertTrue(items[-1]['last'])
+        # Round posts are on pages 2-4 of 15, found by a search instead of walking from start
+        self.assertLess(len(forum.fetched), 9)
+        self.assertNotIn(14, forum.fetched)
+
+    def test_deleted_and_edited_posts(self):
+        self.cache_round_posts(user_posts(after=5))
+        posts = [post for post in user_posts(after=8, edits={1003: 'edited'})
+                 if post[0] not in (1010, 1040)]
+        verification = self.cache.verify(1, '3', FakeForum(posts).crawl())
+        self.assertEqual([1010, 1040], verification.deleted)
+        self.assertEqual([1003], verification.edited)
+        self.assertEqual([], verification.new)
+        # Edits keep being reported when verifying again
+        verification = self.cache.verify(1, '3', FakeForum(posts).crawl(
+            self.cache.known_page_hashes(1, '3')))
+        self.assertEqual(([1010, 1040], [1003]), (verification.deleted, verification.edited))
+
+    def test_posts_after_round_end_are_not_deleted(self):
+        # Round was ended after posts made since round_end had been crawled too
+        posts = user_posts(after=5)
+        round_posts = [{'link': f"https://bitcointalk.org/index.php?topic=1.msg{msg_id}"
+                                f"#msg{msg_id}",
+                        'datetime_utc': datetime.utcfromtimestamp(
+                            ROUND_START + hours * 3600).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                        'content': {'text': text}}
+                       for msg_id, hours, text in posts if hours >= 0]
+        self.cache.add_posts(1, '3', round_posts)
+        self.assertEqual(55, len(self.cache.cached_posts(1, '3')))
+        self.assertEqual(50, len(self.cache.cached_posts(1, '3', ROUND_END)))
+        verification = self.cache.verify(1, '3', FakeForum(posts).crawl(), ROUND_END)
+        self.assertEqual([], verification.deleted)
+
+    def test_unchanged_pages_are_skipped(self):
+        posts = user_posts(after=5)
+        self.cache_round_posts(posts)
+        first = self.cache.verify(1, '3', FakeForum(posts).crawl())
+        self.assertEqual(0, first.skipped_pages)
+        items = FakeForum(posts).crawl(self.cache.known_page_hashes(1, '3'))
+        self.assertTrue(all(item['unchanged'] for item in items))
+        self.assertTrue(all('content' not in post for item in items for post in item['posts']))
+        second = self.cache.verify(1, '3', items)
+        self.assertEqual(second.pages, second.skipped_pages)
+        self.assertEqual(([], [], []), (second.deleted, second.edited, second.new))
+
+    def test_first_verification_without_cache_is_baseline(self):
+        posts = user_posts()
+        verification = self.cache.verify(1, '3', FakeForum(posts).crawl())
+        self.assertEqual(([], [], []), (verification.deleted, verification.edited,
+                                        verification.new))
+        self.assertEqual(50, len(self.cache.cached_posts(1, '3')))
+        with self.assertRaises(ValueError):
+            self.cache.verify(1, '3', [])
+
+    def test_caching_writes_in_batches(self):
+        posts = self.cache.caching(1, '3', (
+            {'link': f"index.php?topic=1.msg{i}#msg{i}", 'datetime_utc': None, 'content': {}}
+            for i in range(WRITE_BATCH_SIZE + 1)))
+        for _ in range(WRITE_BATCH_SIZE + 1):
+            next(posts)
+        self.assertEqual(WRITE_BATCH_SIZE, len(self.cache.cached_posts(1, '3')))
+        self.assertEqual([], list(posts))
+        self.assertEqual(WRITE_BATCH_SIZE + 1, len(self.cache.cached_posts(1, '3')))
+
+    def test_content_hash(self):
+        self.assertEqual(content_hash({'a': 1, 'b': [2]}), content_hash({'b': [2], 'a': 1}))
+        self.assertNotEqual(content_hash({'a': 1}), content_hash({'a': 2}))
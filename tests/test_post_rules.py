@@ -0,0 +1,97 @@
+import os
+import time
+import unittest
+
+from post_rules import (compile_rules, evaluate_posts, parse_rule_value, PostSummary,
+                        PostRuleError, MIN_LENGTH, QUOTE_ONLY, LINK_ONLY,
+                        MAX_POSTS_PER_DAY, MIN_SPACING_MINUTES)
+
+
+def text(content):
+    return {'type': 'text', 'content': content}
+
+
+def post(datetime_utc, *children):
+    return {'datetime_utc': datetime_utc, 'link': '', 'content': {'children': list(children)}}
+
+
+QUOTE = {'type': 'quote', 'username': 'bob', 'children': [text('a long quoted text ' * 10)]}
+LINK = {'type': 'link', 'url': 'https://example.com'}
+
+
+class TestPostRules(unittest.TestCase):
+
+    def test_own_text_excludes_quotes(self):
+        summary = PostSummary(post(
+            '2023-01-01T00:00:00Z', QUOTE, text('I  agree'),
+            {'type': 'element', 'tag': 'b', 'children': [text(' fully')]}))
+        self.assertEqual(len('I agree fully'), summary.own_text_length)
+        self.assertEqual(1, summary.quotes)
+
+    def test_per_post_rules(self):
+        rule_set = compile_rules({MIN_LENGTH: 5, QUOTE_ONLY: True, LINK_ONLY: True})
+        result = rule_set.evaluate([
+            post('2023-01-01T00:00:00Z', QUOTE),
+            post('2023-01-01T01:00:00Z', LINK),
+            post('2023-01-01T02:00:00Z', QUOTE, text('ok')),
+            post('2023-01-01T03:00:00Z', QUOTE, text('long enough')),
+        ])
+        self.assertEqual(4, result['posts_made'])
+        self.assertEqual(1, result['accepted_posts'])
+        self.assertEqual(3, result['rejected_posts'])
+        self.assertEqual(
+            {QUOTE_ONLY: 1, LINK_ONLY: 1, MIN_LENGTH: 1}, result['rejection_reasons'])
+
+    def test_daily_cap_and_spacing(self):
+        rule_set = compile_rules({MAX_POSTS_PER_DAY: 2, MIN_SPACING_MINUTES: 10})
+        # Newest first like on showPosts pages
+        result = rule_set.evaluate([
+            post('2023-01-02T00:00:00Z', text('x')),
+            post('2023-01-01T03:00:00Z', text('x')),
+            post('2023-01-01T02:00:00Z', text('x')),
+            post('2023-01-01T01:05:00Z', text('x')),
+            post('2023-01-01T01:00:00Z', text('x')),
+        ])
+        self.assertEqual(3, result['accepted_posts'])
+        self.assertEqual(
+            {MIN_SPACING_MINUTES: 1, MAX_POSTS_PER_DAY: 1}, result['rejection_reasons'])
+
+    def test_spacing_is_in_utc(self):
+        rule_set = compile_rules({MIN_SPACING_MINUTES: 30})
+        tz = os.environ.get('TZ')
+        # Clocks of Helsinki were turned back an hour between these posts
+        os.environ['TZ'] = 'Europe/Helsinki'
+        time.tzset()
+        try:
+            result = rule_set.evaluate([
+                post('2023-10-29T04:05:00Z', text('x')), post('2023-10-29T03:55:00Z', text('x'))])
+        finally:
+            if tz is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = tz
+            time.tzset()
+        self.assertEqual({MIN_SPACING_MINUTES: 1}, result['rejection_reasons'])
+
+    def test_spacing_skips_posts_without_time(self):
+        rule_set = compile_rules({MIN_SPACING_MINUTES: 10})
+        result = rule_set.evaluate([
+            post('2023-01-01T01:05:00Z', text('x')), post(None, text('x')),
+            post('2023-01-01T01:00:00Z', text('x'))])
+        self.assertEqual(2, result['accepted_posts'])
+        self.assertEqual({MIN_SPACING_MINUTES: 1}, result['rejection_reasons'])
+
+    def test_no_rules_only_counts(self):
+        self.assertIsNone(compile_rules({}))
+        self.assertEqual({'posts_made': 2}, evaluate_posts(iter([post(''), post('')])))
+
+    def test_parse_rule_value(self):
+        self.assertTrue(parse_rule_value(QUOTE_ONLY, 'true'))
+        self.assertEqual(100, parse_rule_value(MIN_LENGTH, '100'))
+        with self.assertRaises(PostRuleError):
+            parse_rule_value('unknown', '1')
+        with self.assertRaises(PostRuleError):
+            parse_rule_value(MIN_LENGTH, '-1')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from datetime import datetime
+
+from post_sketch import PostingSketch, sketching, sketch_csv_header, sketch_csv_row
+
+ROUND_START = 1704067200  # Monday 2024-01-01T00:00:00Z
+
+
+def post(seconds):
+    return {'datetime_utc': datetime.utcfromtimestamp(ROUND_START + seconds).strftime(
+        "%Y-%m-%dT%H:%M:%SZ")}
+
+
+class TestPostingSketch(unittest.TestCase):
+
+    def sketch(self, offsets):
+        sketch = PostingSketch()
+        posts = [post(seconds) for seconds in offsets]
+        self.assertEqual(posts, list(sketching(iter(posts), sketch)))
+        return sketch.to_dict()
+
+    def test_histograms_and_gaps(self):
+        sketch = self.sketch([3600 * 25, 3600, 3630, 0])
+        self.assertEqual(4, sketch['posts'])
+        self.assertEqual(3, sketch['hours'][1])
+        self.assertEqual([3, 1, 0, 0, 0, 0, 0], sketch['weekdays'])
+        # Gaps of 30 seconds, one hour and a day minus 30 seconds
+        self.assertEqual(1, sketch['gaps'][0])
+        self.assertEqual(1, sketch['gaps'][6])
+        self.assertEqual(1, sketch['gaps'][9])
+        self.assertEqual(30, sketch['min_gap'])
+        self.assertEqual(3, sketch['max_posts_per_day'])
+        self.assertEqual(0, sketch['bursts'])
+
+    def test_bursts(self):
+        # 15 posts in ten minutes at the end of the round, newest first like crawled
+        offsets = [86400 * 7 - 40 * i for i in range(15)] + [3600 * i for i in range(10)]
+        sketch = self.sketch(offsets)
+        self.assertEqual(3, sketch['bursts'])
+        self.assertEqual(25, sketch['posts'])
+
+    def test_merged_posts_are_ordered(self):
+        # Snapshot posts followed by newer crawled posts, each newest first
+        offsets = list(range(1000, 0, -10)) + list(range(3000, 1000, -10))
+        sketch = self.sketch(offsets)
+        self.assertEqual(len(offsets) - 1, sketch['gaps'][0])
+
+    def test_many_crawled_posts_are_not_bursts(self):
+        # Posts an hour apart, newest first like crawled
+        sketch = self.sketch(range(600 * 3600, 0, -3600))
+        self.assertEqual(0, sketch['bursts'])
+        self.assertEqual(599, sketch['gaps'][6])
+        self.assertEqual(24, sketch['max_posts_per_day'])
+
+    def test_fixed_size(self):
+        small = self.sketch(range(0, 600, 60))
+        large = self.sketch(range(0, 600000, 60))
+        self.assertEqual({key: len(value) for key, value in small.items()
+                          if isinstance(value, list)},
+                         {key: len(value) for key, value in large.items()
+                          if isinstance(value, list)})
+        self.assertEqual(len(sketch_csv_header()), len(sketch_csv_row(3, 'satoshi', large)))
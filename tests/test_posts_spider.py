@@ -0,0 +1,76 @@
+import asyncio
+import unittest
+from datetime import datetime
+
+from scrapy import Request
+from scrapy.exceptions import CloseSpider
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from bitcointalk_scraper.bitcointalk.parse_pool import shutdown_parse_pool
+from bitcointalk_scraper.bitcointalk.spiders.posts_spider import BitcointalkPostsSpider
+
+ROUND_START = 1704067200  # 2024-01-01T00:00:00Z
+
+
+def posts_page(url, hours):
+    """showPosts page with posts made hours after start of round"""
+    tables = ''
+    for i, hour in enumerate(hours):
+        posted = datetime.utcfromtimestamp(ROUND_START + hour * 3600)
+        tables += f"""<table><tr><td>{i}</td>
+<td><a href="https://bitcointalk.org/index.php?topic=1.msg{hour}#msg{hour}">Re: topic</a></td>
+<td>on: {posted.strftime("%B %d, %Y, %I:%M:%S %p")}</td></tr>
+<tr><td colspan="3"><div class="post">post <b>{hour}</b><br/>
+<div class="quoteheader">Quote from: satoshi</div><div class="quote">quoted</div>
+</div></td></tr></table>"""
+    body = f'<html><body><div id="bodyarea">{tables}</div></body></html>'
+    return HtmlResponse(url=url, body=body.encode(), encoding='utf-8')
+
+
+class TestPostsSpider(unittest.TestCase):
+
+    def tearDown(self):
+        shutdown_parse_pool()
+
+    def crawl_page(self, hours, processes):
+        """Outputs of the spider for a page and the error closing it, if any"""
+        crawler = get_crawler(BitcointalkPostsSpider,
+                              settings_dict={'POST_PARSE_PROCESSES': processes})
+        spider = BitcointalkPostsSpider.from_crawler(
+            crawler, uid='3', start_timestamp=str(ROUND_START))
+        request = next(spider.start_requests())
+        outputs = []
+        async def parse():
+            async for output in spider.parse(posts_page(request.url, hours)):
+                outputs.append(output)
+        try:
+            asyncio.run(parse())
+        except CloseSpider as error:
+            return outputs, error.reason
+        return outputs, None
+
+    def test_next_page_requested_before_parsing(self):
+        outputs, closed = self.crawl_page(range(40, 20, -1), 0)
+        self.assertIsNone(closed)
+        self.assertIsInstance(outputs[0], Request)
+        self.assertTrue(outputs[0].url.endswith(';start=20'))
+        self.assertEqual(20, len(outputs[1:]))
+        self.assertEqual('2024-01-02T16:00:00Z', outputs[1]['datetime_utc'])
+
+    def test_stops_at_older_post(self):
+        outputs, closed = self.crawl_page([3, 2, 1, -1, -2], 0)
+        self.assertEqual("Found a post older than start date.", closed)
+        self.assertEqual(['2024-01-01T03:00:00Z', '2024-01-01T02:00:00Z',
+                          '2024-01-01T01:00:00Z'],
+                         [item['datetime_utc'] for item in outputs])
+
+    def test_process_pool_parses_the_same(self):
+        hours = [5, 4, 3, 2, 1, -1]
+        in_thread, _ = self.crawl_page(hours, 0)
+        offloaded, closed = self.crawl_page(hours, 2)
+        self.assertEqual("Found a post older than start date.", closed)
+        self.assertEqual([dict(item) for item in in_thread],
+                         [dict(item) for item in offloaded])
+        self.assertIn({'type': 'quote', 'children': [{'type': 'text', 'content': 'quoted'}]},
+                      offloaded[0]['content']['children'])
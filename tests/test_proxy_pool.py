@@ -0,0 +1,152 @@
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from bitcointalk_scraper.bitcointalk.proxy_pool import ProxyPool, ProxyPoolError
+
+SCRAPER_PATH = Path(__file__).resolve().parent.parent / 'bitcointalk_scraper'
+
+PROFILE_PAGE = """<html><body><table>
+<tr><td><b>Name:</b></td><td>satoshi</td></tr>
+<tr><td><b>Posts:</b></td><td>575</td></tr>
+<tr><td><b>Activity:</b></td><td>364</td></tr>
+<tr><td><b><a>Merit</a>:</b></td><td>21</td></tr>
+<tr><td><b>Position:</b></td><td>Founder</td></tr>
+</table></body></html>"""
+
+# Crawls profiles over plain http so that local proxy stand-ins can answer them
+CRAWL_SCRIPT = """
+import json, sys
+sys.path.insert(0, {scraper_path!r})
+import scrapy
+from scrapy.crawler import CrawlerProcess
+from scrapy.settings import Settings
+from bitcointalk.spiders.profile_spider import BitcointalkProfileSpider
+
+class LocalProfileSpider(BitcointalkProfileSpider):
+    name = 'local_profile'
+    def start_requests(self):
+        yield scrapy.Request(f"http://bitcointalk.org/index.php?action=profile;u={{self.uid}}",
+                             callback=self.parse, meta={{'uid': self.uid}})
+
+settings = Settings()
+settings.setmodule('settings', priority='project')
+settings.set('PROXY_POOL', {proxies!r})
+settings.set('PROXY_MAX_FAILURES', 1)
+settings.set('PROXY_REQUESTS_PER_MINUTE', 6000)
+settings.set('ROBOTSTXT_OBEY', False)
+settings.set('AUTOTHROTTLE_ENABLED', False)
+settings.set('FEEDS', {{{output!r}: {{'format': 'jsonlines'}}}})
+process = CrawlerProcess(settings)
+for uid in range(1, 7):
+    process.crawl(LocalProfileSpider, uid=str(uid))
+process.start()
+"""
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestProxyPool(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.proxies = [f"http://10.0.0.{i}:3128" for i in range(1, 5)]
+        self.pool = ProxyPool(self.proxies, requests_per_minute=60, max_failures=2,
+                              cooldown=100, clock=self.clock)
+
+    def test_sticky_assignment(self):
+        assigned = {uid: self.pool.reserve(uid)[0] for uid in range(40)}
+        self.assertEqual(set(self.proxies), set(assigned.values()))
+        self.clock.now = 10
+        self.assertEqual(assigned, {uid: self.pool.reserve(uid)[0] for uid in range(40)})
+        # Ejecting a proxy only moves users it had
+        ejected = assigned[0]
+        self.pool.record_failure(ejected)
+        self.assertTrue(self.pool.record_failure(ejected))
+        self.clock.now = 20
+        for uid in range(40):
+            proxy = self.pool.reserve(uid)[0]
+            self.assertNotEqual(ejected, proxy)
+            if assigned[uid] != ejected:
+                self.assertEqual(assigned[uid], proxy)
+
+    def test_rate_budget(self):
+        pool = ProxyPool(self.proxies[:2], requests_per_minute=60, clock=self.clock)
+        delays = [pool.reserve()[1] for _ in range(6)]
+        self.assertEqual([0, 0, 1, 1, 2, 2], delays)
+
+    def test_cooldown_and_health_check(self):
+        proxy = self.proxies[0]
+        pool = ProxyPool([proxy], max_failures=1, cooldown=100, clock=self.clock)
+        self.assertTrue(pool.record_failure(proxy))
+        self.assertEqual([], pool.healthy())
+        # Only proxy is ejected so request waits for the end of cooldown as a health check
+        self.assertEqual((proxy, 100), pool.reserve('3'))
+        self.clock.now = 100
+        self.assertTrue(pool.record_failure(proxy))
+        self.clock.now = 150
+        self.assertEqual((proxy, 50), pool.reserve('3'))
+        pool.record_success(proxy)
+        self.assertEqual([proxy], pool.healthy())
+
+    def test_unsupported_proxy(self):
+        with self.assertRaises(ProxyPoolError):
+            ProxyPool(['socks5://10.0.0.1:1080'])
+
+
+class StandInProxy(BaseHTTPRequestHandler):
+    """Proxy stand-in answering requests itself instead of forwarding them"""
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        status = self.server.status
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html')
+        self.end_headers()
+        if status == 200:
+            self.wfile.write(PROFILE_PAGE.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class TestProxyMiddleware(unittest.TestCase):
+
+    def start_proxy(self, status):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StandInProxy)
+        server.status = status
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_requests_avoid_failing_proxy(self):
+        working = [self.start_proxy(200), self.start_proxy(200)]
+        failing = self.start_proxy(503)
+        proxies = [f"http://127.0.0.1:{server.server_port}" for server in working + [failing]]
+        with tempfile.TemporaryDirectory() as tmp:
+            output = str(Path(tmp) / 'profiles.jl')
+            script = CRAWL_SCRIPT.format(scraper_path=str(SCRAPER_PATH), proxies=proxies,
+                                         output=output)
+            subprocess.run([sys.executable, '-c', script], cwd=SCRAPER_PATH, check=True,
+                           timeout=120)
+            with open(output) as f:
+                profiles = [json.loads(line) for line in f]
+        self.assertEqual(list(range(1, 7)), sorted(profile['uid'] for profile in profiles))
+        # Spiders start at the same time, but no request is retried through the failing proxy
+        self.assertEqual(len(set(failing.requests)), len(failing.requests))
+        self.assertEqual(6, sum(len(server.requests) for server in working))
+        for server in working:
+            self.assertTrue(all(path.startswith('http://bitcointalk.org/')
+                                for path in server.requests))
@@ -0,0 +1,82 @@
+import unittest
+import tempfile
+import time
+from pathlib import Path
+
+from quote_graph import (QuoteGraph, direct_quotes, strongly_connected_components,
+                         WRITE_BATCH_SIZE)
+
+
+def quote(username, msg_id, children=()):
+    return {'type': 'quote', 'username': username,
+            'url': f"https://bitcointalk.org/index.php?topic=1.msg{msg_id}#msg{msg_id}",
+            'datetime_utc': '2024-01-01T00:00:00Z', 'children': list(children)}
+
+
+def post(msg_id, *quotes):
+    return {'datetime_utc': '2024-01-02T00:00:00Z',
+            'link': f"https://bitcointalk.org/index.php?topic=1.msg{msg_id}#msg{msg_id}",
+            'content': {'children': [{'type': 'element', 'tag': 'b', 'children': list(quotes)},
+                                     {'type': 'text', 'content': 'I agree'}]}}
+
+
+class TestQuoteGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.graph = QuoteGraph(Path(self.tmp.name) / 'quote_graph.sqlite3')
+        self.graph.set_members(1, {'1': 'alice', '2': 'bob', '3': 'carol', '4': 'dave'})
+
+    def tearDown(self):
+        self.graph.close()
+        self.tmp.cleanup()
+
+    def test_direct_quotes(self):
+        nested = post(10, quote('bob', 5, [quote('carol', 4)]))
+        self.assertEqual(['bob'], [q['username'] for q in direct_quotes(nested)])
+
+    def test_mutual_pairs_and_rings(self):
+        self.graph.add_posts(1, '1', [post(10, quote('bob', 11)), post(12, quote('bob', 13))])
+        self.graph.add_posts(1, '2', [post(11, quote('alice', 10))])
+        # carol -> dave -> carol through a third party is not mutual but a ring
+        self.graph.add_posts(1, '3', [post(20, quote('dave', 21)), post(22, quote('outsider', 1))])
+        self.graph.add_posts(1, '4', [post(21, quote('carol', 20))])
+        self.assertEqual([(1, 2, 2, 1), (3, 4, 1, 1)], self.graph.mutual_pairs(1))
+        self.assertEqual([(1, 2, 2, 1)], self.graph.mutual_pairs(1, min_quotes=1)[:1])
+        self.assertEqual([], self.graph.mutual_pairs(1, min_quotes=2))
+        self.assertEqual([[1, 2], [3, 4]], sorted(self.graph.rings(1)))
+        self.assertEqual({1: (2, 2), 2: (1, 1), 3: (2, 1), 4: (1, 1)},
+                         self.graph.member_quote_shares(1))
+
+    def test_posts_are_added_once(self):
+        posts = [post(10, quote('bob', 11))]
+        self.assertEqual(1, self.graph.add_posts(1, '1', posts))
+        self.assertEqual(posts, list(self.graph.indexing(1, '1', iter(posts))))
+        self.assertEqual(0, self.graph.add_posts(1, '1', posts))
+        self.assertEqual({(1, 2): 1}, self.graph.member_edges(1))
+
+    def test_indexing_writes_in_batches(self):
+        posts = self.graph.indexing(1, '1', (post(i) for i in range(WRITE_BATCH_SIZE + 1)))
+        for _ in range(WRITE_BATCH_SIZE + 1):
+            next(posts)
+        # A full batch is written before the posts have all gone through
+        self.assertEqual(0, self.graph.add_posts(1, '1', [post(0)]))
+        self.assertEqual(1, self.graph.add_posts(1, '1', [post(WRITE_BATCH_SIZE)]))
+        self.assertEqual([], list(posts))
+
+    def test_strongly_connected_components(self):
+        graph = {1: {2}, 2: {3}, 3: {1}, 4: {5}, 5: set()}
+        components = sorted(sorted(c) for c in strongly_connected_components(graph))
+        self.assertEqual([[1, 2, 3], [4], [5]], components)
+
+    def test_many_edges(self):
+        members = {str(uid): f"user{uid}" for uid in range(1, 1001)}
+        self.graph.set_members(2, members)
+        for uid in range(1, 1001):
+            self.graph.add_posts(2, uid, [
+                post(uid * 1000 + i, quote(f"user{(uid + i) % 1000 + 1}", 1))
+                for i in range(100)])
+        start = time.perf_counter()
+        self.graph.rings(2, min_quotes=1)
+        self.graph.member_quote_shares(2)
+        self.assertLess(time.perf_counter() - start, 10)
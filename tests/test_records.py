@@ -0,0 +1,88 @@
+import json
+import unittest
+
+import records
+from records import (Participant, RoundParticipant, RecordError, dumps, loads, json_chunks,
+                     round_participants_from_dict)
+
+
+def round_participant_dict():
+    return {'uid': 3, 'name': 'satoshi', 'rank': 'Founder', 'payment_address': None,
+            'start_time': 1000, 'known_start_info': True, 'start_post_count': 10,
+            'start_activity': 10, 'start_merit': 5}
+
+
+class TestRecords(unittest.TestCase):
+
+    def test_round_participant_round_trip(self):
+        data = round_participant_dict()
+        participant = RoundParticipant.from_dict(data)
+        self.assertEqual(10, participant.start_post_count)
+        self.assertIsNone(participant.end_post_count)
+        self.assertEqual(data, participant.to_dict())
+        participant.posts_made = 4
+        self.assertEqual(4, participant.to_dict()['posts_made'])
+
+    def test_unknown_keys_are_kept(self):
+        data = round_participant_dict()
+        data['note'] = 'paid manually'
+        self.assertEqual(data, RoundParticipant.from_dict(data).to_dict())
+
+    def test_schema_is_checked(self):
+        data = round_participant_dict()
+        del data['start_time']
+        with self.assertRaises(RecordError):
+            RoundParticipant.from_dict(data)
+        data = round_participant_dict()
+        data['start_merit'] = [5]
+        with self.assertRaises(RecordError):
+            round_participants_from_dict({'3': data})
+
+    def test_legacy_username(self):
+        participant = Participant.from_dict({'username': 'satoshi', 'payment_address': 'addr'})
+        self.assertEqual('satoshi', participant.name)
+        self.assertEqual({'name': 'satoshi', 'payment_address': 'addr'}, participant.to_dict())
+
+    def test_dumps_and_loads(self):
+        data = {'participants': {'3': round_participant_dict()}}
+        self.assertEqual(data, loads(dumps(data)))
+        self.assertEqual(data, json.loads(dumps(data)))
+        with self.assertRaises(json.JSONDecodeError):
+            loads('{')
+
+    def test_legacy_values_are_coerced(self):
+        data = round_participant_dict()
+        data.update({'uid': '3', 'name': None, 'start_post_count': '10',
+                     'end_post_count': '12', 'start_merit': 'unknown'})
+        participant = RoundParticipant.from_dict(data)
+        self.assertEqual((3, None, 10, 12, 'unknown'), (
+            participant.uid, participant.name, participant.start_post_count,
+            participant.end_post_count, participant.start_merit))
+
+    def test_json_fallback_matches_orjson(self):
+        data = {3: {'name': 'sätoshi', 'merit': 2 ** 64 - 1}, 'ratio': 0.5}
+        big = {'merit': 2 ** 64}
+        json_string = dumps(data)
+        orjson = records.orjson
+        records.orjson = None
+        try:
+            self.assertEqual(json_string, dumps(data))
+            self.assertEqual(loads(json_string), {'3': data[3], 'ratio': 0.5})
+            self.assertEqual({'merit': float(2 ** 64)}, loads('{"merit": 18446744073709551616}'))
+            with self.assertRaises(TypeError):
+                dumps(big)
+        finally:
+            records.orjson = orjson
+        if orjson is not None:
+            self.assertEqual({'merit': float(2 ** 64)}, loads('{"merit": 18446744073709551616}'))
+            with self.assertRaises(TypeError):
+                dumps(big)
+
+    def test_json_chunks(self):
+        participants = [('3', round_participant_dict()), (4, {'uid': 4})]
+        data = json.loads(''.join(json_chunks({'round_number': 1}, 'participants',
+                                              iter(participants))))
+        self.assertEqual({'round_number': 1, 'participants': {
+            '3': round_participant_dict(), '4': {'uid': 4}}}, data)
+        self.assertEqual({'participants': {}},
+                         json.loads(''.join(json_chunks({}, 'participants', []))))
@@ -0,0 +1,64 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+from snapshots import (take_snapshot, latest_snapshots, crawl_start_timestamp,
+                       merge_snapshot_posts, daily_curves, SNAPSHOT_OVERLAP_SECONDS)
+
+
+def post(msg_id, datetime_utc):
+    return {'datetime_utc': datetime_utc,
+            'link': f"https://bitcointalk.org/index.php?topic=1.msg{msg_id}#msg{msg_id}",
+            'content': {}}
+
+
+def profile(post_count):
+    return {'uid': 3, 'name': 'satoshi', 'post_count': post_count, 'activity': 1, 'merit': 2}
+
+
+class TestSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.round_folder = Path(self.tmp.name)
+        self.participants = {'3': {'uid': 3, 'start_time': 1000}}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def snapshot(self, now, posts, post_count):
+        requested = []
+        def crawl(tasks, evaluate):
+            requested.extend(tasks)
+            return [('3', profile(post_count), evaluate('3', iter(posts)))]
+        take_snapshot(self.participants, self.round_folder, now, crawl=crawl)
+        return requested
+
+    def test_snapshots_only_crawl_since_latest(self):
+        self.assertEqual([('3', 1000)], self.snapshot(
+            86400, [post(2, '1970-01-01T20:00:00Z'), post(1, '1970-01-01T10:00:00Z')], 2))
+        self.assertEqual([('3', 86400 - SNAPSHOT_OVERLAP_SECONDS)], self.snapshot(
+            2 * 86400, [post(3, '1970-01-02T10:00:00Z'), post(2, '1970-01-01T20:00:00Z')], 3))
+        latest = latest_snapshots(self.round_folder)
+        self.assertEqual(3, latest['3']['post_count'])
+        self.assertEqual(1, latest['3']['new_posts'])
+        self.assertEqual(
+            2 * 86400 - SNAPSHOT_OVERLAP_SECONDS,
+            crawl_start_timestamp(self.participants['3'], latest['3']))
+
+    def test_merge_snapshot_posts(self):
+        self.snapshot(86400, [post(2, '1970-01-01T20:00:00Z'), post(1, '1970-01-01T10:00:00Z')], 2)
+        merged = list(merge_snapshot_posts(
+            self.round_folder, '3', [post(3, '1970-01-02T10:00:00Z'), post(2, '1970-01-01T20:00:00Z')]))
+        self.assertEqual(3, len(merged))
+
+    def test_daily_curves(self):
+        self.snapshot(86400, [post(2, '1970-01-01T20:00:00Z'), post(1, '1970-01-01T10:00:00Z')], 2)
+        self.snapshot(2 * 86400, [post(3, '1970-01-02T10:00:00Z')], 3)
+        curves = daily_curves(self.round_folder)
+        self.assertEqual(2, curves['3']['1970-01-01']['posts'])
+        self.assertEqual(1, curves['3']['1970-01-02']['posts'])
+        self.assertEqual(3, curves['3']['1970-01-03']['post_count'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,28 +1,27 @@
 import unittest
-import time
-from json import JSONDecodeError
-from datetime import timedelta
 
-from utils import fetch_bitcointalk_profile, fetch_user_posts, InvalidUIDError
+from utils import (try_uid_to_int, post_count_from_items, post_from_item, InvalidUIDError,
+                   CrawlerResultError)
 
 class TestUtils(unittest.TestCase):
 
-    def test_fetch_bitcointalk_profile(self):
-        satoshi_profile = fetch_bitcointalk_profile(3)    
-        self.assertTrue(satoshi_profile.get('name') == 'satoshi')
-
-    def test_negative_uid_bitcointalk_profile(self):
+    def test_negative_uid(self):
         with self.assertRaises(InvalidUIDError):
-            fetch_bitcointalk_profile(-1)
+            try_uid_to_int(-1)
+        self.assertEqual(3, try_uid_to_int('3'))
 
-    def test_nonexistent_bitcointalk_profile(self):
-        self.assertEqual(None, fetch_bitcointalk_profile(57346864567435643875687563))
+    def test_post_count_from_items(self):
+        self.assertEqual(0, post_count_from_items([]))
+        self.assertEqual(5, post_count_from_items([{'posts_made': 5}]))
+        with self.assertRaises(CrawlerResultError):
+            post_count_from_items([{'posts_made': 5}, {'posts_made': 6}])
 
-    def test_fetch_posts(self):
-        week = timedelta(days=7)
-        now_minus_week = time.time() - week.total_seconds()
-        posts = fetch_user_posts(459836, int(now_minus_week))
-        self.assertTrue(isinstance(posts, list))
+    def test_post_from_item(self):
+        self.assertEqual(
+            {'datetime_utc': '2023-01-01T00:00:00Z', 'link': 'a', 'message_id': None,
+             'content': {}},
+            post_from_item({'datetime_utc': '2023-01-01T00:00:00Z', 'link': 'a',
+                            'content': {}, 'uid': 3}))
 
 if __name__ == '__main__':
     unittest.main()
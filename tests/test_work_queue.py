@@ -0,0 +1,125 @@
+import sqlite3
+import time
+import unittest
+import tempfile
+from argparse import Namespace
+from pathlib import Path
+
+from work_queue import (WorkQueue, LeaseHeartbeat, clear_queue_round,
+                        crawl_participants_via_queue, END_STAGE, DONE, FAILED, MAX_ATTEMPTS,
+                        POSTS_KEY)
+
+
+class TestWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue_path = Path(self.tmp.name) / 'queue.sqlite'
+        self.queue = WorkQueue(self.queue_path, lease_seconds=60)
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp.cleanup()
+
+    def test_enqueue_is_idempotent(self):
+        tasks = [(3, 1700000000), (5, 1700000000)]
+        self.assertEqual(2, self.queue.enqueue('test', 1, END_STAGE, tasks))
+        self.assertEqual(0, self.queue.enqueue('test', 1, END_STAGE, tasks))
+
+    def test_claim_and_complete(self):
+        self.queue.enqueue('test', 1, END_STAGE, [(3, 1700000000)])
+        task = self.queue.claim('worker-a', now=1000)
+        self.assertEqual(3, task['uid'])
+        self.assertIsNone(self.queue.claim('worker-b', now=1001))
+        self.assertTrue(self.queue.complete(task, {'profile': {'uid': 3}, 'posts_made': 4}))
+        self.assertEqual({DONE: 1}, self.queue.progress('test', 1, END_STAGE))
+        self.assertEqual(
+            [('3', {'profile': {'uid': 3}, 'posts_made': 4})],
+            list(self.queue.results('test', 1, END_STAGE)))
+
+    def test_expired_lease_is_claimed_again(self):
+        self.queue.enqueue('test', 1, END_STAGE, [(3, 1700000000)])
+        task = self.queue.claim('worker-a', now=1000)
+        other_queue = WorkQueue(self.queue_path, lease_seconds=60)
+        try:
+            stolen = other_queue.claim('worker-b', now=1061)
+            self.assertEqual(task['id'], stolen['id'])
+            self.assertFalse(self.queue.complete(task, {}))
+            self.assertTrue(other_queue.complete(stolen, {}))
+        finally:
+            other_queue.close()
+
+    def test_heartbeat_keeps_lease(self):
+        queue = WorkQueue(self.queue_path, lease_seconds=0.3)
+        self.addCleanup(queue.close)
+        queue.enqueue('test', 1, END_STAGE, [(3, 1700000000)])
+        task = queue.claim('worker-a')
+        with LeaseHeartbeat(self.queue_path, task, 0.3):
+            time.sleep(0.6)
+            self.assertIsNone(queue.claim('worker-b'))
+        self.assertTrue(queue.complete(task, {}))
+
+    def test_results_of_given_uids(self):
+        self.queue.enqueue('test', 1, END_STAGE, [(3, 1700000000), (5, 1700000000)])
+        for _ in range(2):
+            task = self.queue.claim('worker-a')
+            self.queue.complete(task, {'uid': task['uid']})
+        self.assertEqual({DONE: 1}, self.queue.progress('test', 1, END_STAGE, {5}))
+        self.assertEqual([('5', {'uid': 5})],
+                         list(self.queue.results('test', 1, END_STAGE, {5})))
+
+    def test_returned_posts_are_evaluated(self):
+        tasks = [(3, 1700000000), (5, None)]
+        self.queue.enqueue('test', 1, END_STAGE, tasks, return_posts=True)
+        for _ in tasks:
+            task = self.queue.claim('worker-a')
+            posts_result = ({'posts_made': 1, POSTS_KEY: [{'link': 'a'}]}
+                            if task['start_timestamp'] else None)
+            self.queue.complete(task, {'profile': {'uid': task['uid']},
+                                       'posts_result': posts_result})
+        results = crawl_participants_via_queue(
+            self.queue_path, 'test', 1, END_STAGE, tasks,
+            evaluate=lambda uid, posts: [post['link'] for post in posts])
+        self.assertEqual([('3', {'uid': 3}, ['a']), ('5', {'uid': 5}, None)],
+                         sorted(results))
+
+    def test_failed_task_is_retried(self):
+        self.queue.enqueue('test', 1, END_STAGE, [(3, 1700000000)])
+        for _ in range(MAX_ATTEMPTS):
+            task = self.queue.claim('worker-a')
+            self.queue.fail(task, 'timeout')
+        self.assertIsNone(self.queue.claim('worker-a'))
+        self.assertEqual({FAILED: 1}, self.queue.progress('test', 1, END_STAGE))
+
+    def test_failed_round_is_cleared(self):
+        self.queue.enqueue('test', 1, END_STAGE, [(3, 1700000000)], count_only=True,
+                           verify_count=True)
+        task = self.queue.claim('worker-a')
+        self.assertEqual((1, 1), (task['count_only'], task['verify_count']))
+        clear_queue_round(Namespace(queue=self.queue_path, clear=['test', '1', END_STAGE]))
+        self.assertEqual({}, self.queue.progress('test', 1, END_STAGE))
+
+    def test_queue_of_earlier_version_is_migrated(self):
+        path = Path(self.tmp.name) / 'old_queue.sqlite'
+        connection = sqlite3.connect(path)
+        connection.execute(
+            """CREATE TABLE tasks (
+                id INTEGER PRIMARY KEY, campaign_name TEXT NOT NULL,
+                round_number INTEGER NOT NULL, stage TEXT NOT NULL, uid INTEGER NOT NULL,
+                start_timestamp INTEGER, count_only INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL DEFAULT 'pending', worker TEXT, lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT,
+                UNIQUE (campaign_name, round_number, stage, uid))""")
+        connection.close()
+        queue = WorkQueue(path)
+        try:
+            queue.enqueue('test', 1, END_STAGE, [(3, 1700000000)],
+                          rules={'min_length': 10}, return_posts=True)
+            task = queue.claim('worker-a')
+            self.assertEqual('{"min_length": 10}', task['rules'])
+            self.assertEqual(1, task['return_posts'])
+        finally:
+            queue.close()
+
+if __name__ == '__main__':
+    unittest.main()
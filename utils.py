@@ -1,10 +1,8 @@
-import subprocess
 import logging
-import json
 import os
 import csv
-from pathlib import Path
-from json import JSONDecodeError
+
+from bitcointalk_scraper.bitcointalk.links import message_id_from_link
 
 logger = logging.getLogger(__name__)
 
@@ -37,96 +35,45 @@ def try_timestamp_to_int(timestamp):
     except ValueError as error:
         raise InvalidTimestampError("Timestamp could not be converted to int") from error
 
-def scrape_profile(uid):
-    try:
-        uid = try_uid_to_int(uid)
-        subprocess.run(
-            ["python3", "bitcointalk_scraper/profile_crawler.py", str(uid)], check=True)
-    except subprocess.CalledProcessError as error:
-        logger.error("Error when scraping bitcointalk profile, uid: %s, error: %s", uid, error)
-        raise ScrapingError("Something went wrong during Scraping") from error
-
-def scrape_posts(uid, start_timestamp):
-    try:
-        uid = try_uid_to_int(uid)
-        start_timestamp = try_timestamp_to_int(start_timestamp)
-        subprocess.run(
-            ["python3", "bitcointalk_scraper/posts_crawler.py",
-                str(uid), str(start_timestamp)], check=True)
-    except subprocess.CalledProcessError as error:
-        logger.error(
-            "Error when scraping bitcointalk user posts, uid: %s, timestamp: %s, error: %s",
-            uid, start_timestamp, error)
-        raise ScrapingError("Something went wrong during Scraping") from error
-
-def fetch_bitcointalk_profile(uid):
-    """Use a subprocess to crawl bitcointalk profile using scrapy"""
-    try:
-        print("Fetching user profile using scrapy...")
-        scrape_profile(uid)
-    except InvalidUIDError as error:
-        logger.error("Problem with UID when fetching profile: %s", error)
-        raise
-    except ScrapingError as error:
-        logger.error(error)
-        raise
-    profile_json_path = Path('scraper_outputs/profile.json')
-    if profile_json_path.is_file():
-        with profile_json_path.open('r') as f:
-            file_contents = f.read()
-            if not file_contents:
-                return None
-            profile_arr = json.loads(file_contents)
-            if isinstance(profile_arr, list) and len(profile_arr) == 1:
-                profile = profile_arr.pop()
-                if isinstance(profile, dict) and profile.get('uid') == int(uid):
-                    print(f"Profile with UID {uid} fetched")
-                    return profile
-                raise CrawlerResultError(
-                    "Crawler result did not have a profile with expected UID")
-            raise CrawlerResultError("Crawler result not an array containing a profile")
-    else:
-        raise FileNotFoundError(
-            "File with profile information was not found. Scraping may have failed.")
-
-
-def fetch_user_posts(uid, start_timestamp):
-    """Use a subprocess to crawl bitcointalk user posts that were made after a certain
-    point in time (start_timestamp)"""
-    try:
-        print(f"Fetching posts for user {uid} that were made after {start_timestamp}")
-        scrape_posts(uid, start_timestamp)
-    except InvalidUIDError as error:
-        logger.error("Invalid UID %s", error)
-        raise
-    except InvalidTimestampError as error:
-        logger.error("Invalid timestamp %s", error)
-        raise
-    except ScrapingError as error:
-        logger.error(error)
-        raise
-    posts_json_path = Path('scraper_outputs/posts.json')
-    if posts_json_path.is_file():
-        with posts_json_path.open('r') as f:
-            try:
-                file_contents = f.read()
-                if not file_contents:
-                    return []
-                posts_arr = json.loads(file_contents)
-            except JSONDecodeError as error:
-                logger.error(error)
-                raise
-            if isinstance(posts_arr, list):
-                result = []
-                for post in posts_arr:
-                    result.append({
-                        'datetime_utc': post.get('datetime_utc'),
-                        'link': post.get('link')
-                    })
-                return result
-            raise CrawlerResultError("Crawler reult not an array containing posts")
-    else:
-        raise FileNotFoundError("File with posts was not found. Scraping may have failed.")
+def post_message_id(post):
+    """Message ID of a post filled in by the item pipeline, or from the link of
+    a post saved before posts had one"""
+    if (message_id := post.get('message_id')) is not None:
+        return message_id
+    return message_id_from_link(post.get('link'))
+
+
+def profile_from_items(items, uid):
+    """Get the profile from items scraped by the profile spider, which the
+    item pipeline has validated. Returns None if spider found no profile."""
+    if not items:
+        return None
+    if len(items) == 1:
+        profile = items[0]
+        if profile['uid'] == int(uid):
+            print(f"Profile with UID {uid} fetched")
+            return profile
+        raise CrawlerResultError(
+            "Crawler result did not have a profile with expected UID")
+    raise CrawlerResultError("Crawler result not a single line containing a profile")
+
+
+def post_count_from_items(items):
+    """Get amount of posts from items scraped by the post count spider, which
+    the item pipeline has validated"""
+    if len(items) > 1:
+        raise CrawlerResultError("Crawler result not a single line containing a post count")
+    return items[0]['posts_made'] if items else 0
+
+
+def post_from_item(post):
+    """Get the post from an item scraped by the posts spider"""
+    return {
+        'datetime_utc': post['datetime_utc'],
+        'link': post['link'],
+        'message_id': post.get('message_id'),
+        'content': post.get('content')
+    }
 
 
 def validate_data_folder(path_arg):
@@ -0,0 +1,347 @@
+"""Distributed crawling of round participants through a shared work queue.
+
+The coordinator (round add/end with --queue) puts a crawl task for each participant
+into a SQLite database on a path shared by all machines. Workers (main.py worker)
+claim tasks with a lease, which they renew while crawling, crawl using the existing
+spiders and store results back into the database. Each worker crawls with round_crawler.py into an output folder of its
+own, so several workers can run on one machine. Tasks whose lease expires, e.g.
+because the worker died, are claimed again by another worker. The coordinator waits
+until all tasks are done and then updates the round as usual."""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from bitcointalk_scraper.bitcointalk.item_store import ItemStore, ITEM_STORE_FILE
+from crawl_pool import run_crawler, read_worker_result
+from post_rules import compile_rules, evaluate_posts, POSTS_MADE_KEY
+
+logger = logging.getLogger(__name__)
+
+START_STAGE = 'start'
+END_STAGE = 'end'
+SNAPSHOT_STAGE = 'snapshot'
+PENDING = 'pending'
+CLAIMED = 'claimed'
+DONE = 'done'
+FAILED = 'failed'
+
+DEFAULT_LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+QUEUE_WORKER_OUTPUT_PATH = Path('scraper_outputs/queue_workers')
+# Key of crawled posts in the posts result of a task returning posts
+POSTS_KEY = 'posts'
+# Columns added to the tasks table after queues were first created, with their types
+ADDED_COLUMNS = {
+    'rules': 'TEXT',
+    'return_posts': 'INTEGER NOT NULL DEFAULT 0',
+    'verify_count': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+
+class WorkQueueError(Exception):
+    """Represents errors regarding tasks in the work queue"""
+
+
+class WorkQueue:
+    """Queue of crawl tasks stored in a SQLite database"""
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                campaign_name TEXT NOT NULL,
+                round_number INTEGER NOT NULL,
+                stage TEXT NOT NULL,
+                uid INTEGER NOT NULL,
+                start_timestamp INTEGER,
+                count_only INTEGER NOT NULL DEFAULT 0,
+                verify_count INTEGER NOT NULL DEFAULT 0,
+                rules TEXT,
+                return_posts INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                UNIQUE (campaign_name, round_number, stage, uid)
+            )""")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_expires)")
+        self.add_missing_columns()
+
+
+    def add_missing_columns(self):
+        """Add columns missing from a queue created by an earlier version"""
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            columns = {row['name'] for row in
+                       self.connection.execute("PRAGMA table_info(tasks)")}
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in columns:
+                    self.connection.execute(
+                        f"ALTER TABLE tasks ADD COLUMN {column} {column_type}")
+
+
+    def close(self):
+        """Close database connection"""
+        self.connection.close()
+
+
+    def enqueue(self, campaign_name, round_number, stage, tasks, count_only=False,
+                rules=None, return_posts=False, verify_count=False):
+        """Add (uid, start_timestamp) tasks of a round to the queue. Tasks already in the
+        queue are kept as they are so an interrupted coordinator can continue.
+        Post rules of the campaign are stored with tasks so workers can evaluate posts.
+        If return_posts is True, workers return crawled posts instead.
+        Returns amount of tasks added."""
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            cursor = self.connection.executemany(
+                """INSERT OR IGNORE INTO tasks
+                (campaign_name, round_number, stage, uid, start_timestamp, count_only, rules,
+                return_posts, verify_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(campaign_name, round_number, stage, int(uid), start_timestamp, int(count_only),
+                  json.dumps(rules) if rules else None, int(return_posts), int(verify_count))
+                 for uid, start_timestamp in tasks])
+            return cursor.rowcount
+
+
+    def claim(self, worker_id, now=None):
+        """Claim the next pending task or a task whose lease has expired.
+        Returns the task as a dict or None if there is nothing to do."""
+        now = time.time() if now is None else now
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            row = self.connection.execute(
+                """SELECT * FROM tasks WHERE state = ? OR (state = ? AND lease_expires < ?)
+                ORDER BY id LIMIT 1""", (PENDING, CLAIMED, now)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                """UPDATE tasks SET state = ?, worker = ?, lease_expires = ?,
+                attempts = attempts + 1 WHERE id = ?""",
+                (CLAIMED, worker_id, now + self.lease_seconds, row['id']))
+        task = dict(row)
+        task['worker'] = worker_id
+        return task
+
+
+    def renew(self, task, now=None):
+        """Extend the lease of a claimed task. Returns False if it was lost to another
+        worker."""
+        now = time.time() if now is None else now
+        with self.connection:
+            cursor = self.connection.execute(
+                """UPDATE tasks SET lease_expires = ? WHERE id = ? AND state = ?
+                AND worker = ?""",
+                (now + self.lease_seconds, task['id'], CLAIMED, task['worker']))
+        return cursor.rowcount == 1
+
+
+    def complete(self, task, result):
+        """Store result of a task. Returns False if lease of the task was lost
+        to another worker in which case result is not stored."""
+        with self.connection:
+            cursor = self.connection.execute(
+                """UPDATE tasks SET state = ?, result = ?, lease_expires = NULL
+                WHERE id = ? AND state = ? AND worker = ?""",
+                (DONE, json.dumps(result), task['id'], CLAIMED, task['worker']))
+        return cursor.rowcount == 1
+
+
+    def fail(self, task, error):
+        """Mark task failed. It is tried again unless it has been tried too many times."""
+        with self.connection:
+            self.connection.execute(
+                """UPDATE tasks SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                error = ?, lease_expires = NULL WHERE id = ? AND state = ? AND worker = ?""",
+                (MAX_ATTEMPTS, FAILED, PENDING, str(error), task['id'], CLAIMED, task['worker']))
+
+
+    def progress(self, campaign_name, round_number, stage, uids=None):
+        """Amount of tasks of a round in each state. If uids is given, only tasks
+        of those UIDs are counted."""
+        if uids is None:
+            rows = self.connection.execute(
+                """SELECT state, COUNT(*) AS amount FROM tasks
+                WHERE campaign_name = ? AND round_number = ? AND stage = ? GROUP BY state""",
+                (campaign_name, round_number, stage))
+            return {row['state']: row['amount'] for row in rows}
+        progress = {}
+        for row in self.connection.execute(
+                """SELECT uid, state FROM tasks
+                WHERE campaign_name = ? AND round_number = ? AND stage = ?""",
+                (campaign_name, round_number, stage)):
+            if row['uid'] in uids:
+                progress[row['state']] = progress.get(row['state'], 0) + 1
+        return progress
+
+
+    def results(self, campaign_name, round_number, stage, uids=None):
+        """Yield uid and result of each finished task of a round. If uids is given,
+        only results of those UIDs are yielded."""
+        rows = self.connection.execute(
+            """SELECT uid, result FROM tasks WHERE campaign_name = ? AND round_number = ?
+            AND stage = ? AND state = ? ORDER BY id""",
+            (campaign_name, round_number, stage, DONE))
+        for row in rows:
+            if uids is None or row['uid'] in uids:
+                yield str(row['uid']), json.loads(row['result'])
+
+
+    def clear(self, campaign_name, round_number, stage):
+        """Remove tasks of a round from the queue"""
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM tasks WHERE campaign_name = ? AND round_number = ? AND stage = ?",
+                (campaign_name, round_number, stage))
+
+
+class LeaseHeartbeat:
+    """Renews the lease of a claimed task in a thread of its own while the task is
+    crawled, so that a crawl taking longer than the lease is not claimed again"""
+    def __init__(self, queue_path, task, lease_seconds):
+        self.queue_path = queue_path
+        self.task = task
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+    def run(self):
+        # SQLite connections can only be used in the thread which made them
+        queue = WorkQueue(self.queue_path, lease_seconds=self.lease_seconds)
+        try:
+            while not self.stopped.wait(self.lease_seconds / 3):
+                if not queue.renew(self.task):
+                    logger.warning("Lease of task %s was lost", self.task['id'])
+                    return
+        finally:
+            queue.close()
+
+
+def crawl_task(task, output_dir):
+    """Crawl profile and posts of a claimed task with round_crawler.py writing
+    into output_dir"""
+    uid, start_timestamp = task['uid'], task['start_timestamp']
+    count_only, verify_count = bool(task['count_only']), bool(task['verify_count'])
+    run_crawler(output_dir, [(uid, start_timestamp)], count_only, verify_count)
+    if task['return_posts']:
+        def evaluate(_, posts):
+            posts = list(posts)
+            return {POSTS_MADE_KEY: len(posts), POSTS_KEY: posts}
+    else:
+        rule_set = compile_rules(json.loads(task['rules'])) if task['rules'] else None
+        def evaluate(_, posts):
+            return evaluate_posts(posts, rule_set)
+    store = ItemStore(output_dir / ITEM_STORE_FILE)
+    try:
+        profile, posts_result = read_worker_result(
+            store, uid, start_timestamp, count_only, verify_count, evaluate)
+    finally:
+        store.close()
+    return {'profile': profile, 'posts_result': posts_result}
+
+
+def crawl_participants_via_queue(queue_path, campaign_name, round_number, stage, tasks,
+                                 count_only=False, verify_count=False, rules=None,
+                                 evaluate=None, poll_interval=10):
+    """Put tasks into the queue, wait for workers to crawl them and yield
+    (uid, profile, posts_result) for each task. If evaluate is given and posts are
+    walked, workers return crawled posts and posts_result is what evaluate(uid, posts)
+    returns."""
+    queue = WorkQueue(queue_path)
+    try:
+        tasks = list(tasks)
+        # Tasks of the stage left in the queue by an earlier call are not results of this one
+        uids = {int(uid) for uid, _ in tasks}
+        return_posts = evaluate is not None and (not count_only or verify_count)
+        added = queue.enqueue(
+            campaign_name, round_number, stage, tasks, count_only, rules,
+            return_posts=return_posts, verify_count=verify_count)
+        print(f"Added {added} crawl tasks to the queue, waiting for workers...")
+        while True:
+            progress = queue.progress(campaign_name, round_number, stage, uids)
+            if progress.get(FAILED):
+                raise WorkQueueError(
+                    f"{progress.get(FAILED)} crawl tasks failed. Errors are in the error "
+                    f"column of the tasks table of {queue_path}. To try again, remove tasks of "
+                    f"the round with: python3 main.py worker {queue_path} --clear "
+                    f"{campaign_name} {round_number} {stage}")
+            if progress.get(DONE, 0) >= len(tasks):
+                break
+            print(f"{progress.get(DONE, 0)}/{len(tasks)} crawl tasks done")
+            time.sleep(poll_interval)
+        for uid, result in queue.results(campaign_name, round_number, stage, uids):
+            posts_result = result['posts_result']
+            # Posts result is None for tasks crawling only the profile
+            if return_posts and posts_result is not None:
+                posts_result = evaluate(uid, iter(posts_result[POSTS_KEY]))
+            yield uid, result['profile'], posts_result
+        queue.clear(campaign_name, round_number, stage)
+    finally:
+        queue.close()
+
+
+def run_queue_worker(args):
+    """Claim tasks from the queue and crawl them until stopped"""
+    if args.clear:
+        clear_queue_round(args)
+        return
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    output_dir = QUEUE_WORKER_OUTPUT_PATH / worker_id
+    queue = WorkQueue(args.queue, lease_seconds=args.lease)
+    print(f"Worker {worker_id} waiting for tasks...")
+    try:
+        while True:
+            task = queue.claim(worker_id)
+            if task is None:
+                if args.exit_when_empty:
+                    print("No tasks left")
+                    return
+                time.sleep(args.poll_interval)
+                continue
+            print(f"Crawling uid {task['uid']} of {task['campaign_name']} "
+                  f"round {task['round_number']}...")
+            try:
+                with LeaseHeartbeat(args.queue, task, args.lease):
+                    result = crawl_task(task, output_dir)
+            except Exception as error:
+                logger.error("Crawl task %s failed: %s", task['id'], error)
+                queue.fail(task, error)
+                continue
+            if not queue.complete(task, result):
+                logger.warning("Lease of task %s was lost, result discarded", task['id'])
+    finally:
+        queue.close()
+
+
+def clear_queue_round(args):
+    """Remove tasks of a round from the queue, e.g. after some of them failed"""
+    campaign_name, round_number, stage = args.clear
+    queue = WorkQueue(args.queue)
+    try:
+        queue.clear(campaign_name, int(round_number), stage)
+    finally:
+        queue.close()
+    print(f"Tasks of {stage} of round {round_number} of {campaign_name} removed")